@@ -0,0 +1,265 @@
+"""Headless HTTP API over the same services as the Streamlit app.
+
+Run with ``python -m app.api.server`` (requires the ``api`` extra). Queries run
+on the SDK's async client, so one worker keeps many model calls in flight;
+ingestion reuses the thread-based ``IngestionQueue``.
+"""
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from google import genai
+from google.genai import types
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.config import Config
+from app.core.exceptions import FileUploadError, GeminiServiceError
+from app.core.telemetry import configure_exporters, telemetry
+from app.services.client_pool import ClientPool
+from app.services.document_brief import BriefStore
+from app.services.gemini_service import GeminiService
+from app.services.ingestion import IngestionQueue
+from app.services.page_index import PageIndexStore
+from app.services.pdf_service import PDFService
+from app.services.scheduler import is_busy, scheduler
+from app.services.store_cache import StoreCache
+from app.services.store_registry import StoreReaper, StoreRegistry
+from app.utils.conversation import ResponseStream, build_conversation_contents, merge_answers, parse_response
+
+
+class ChatTurn(BaseModel):
+    role: str
+    content: str
+
+
+class QueryRequest(BaseModel):
+    store_name: Optional[str] = None
+    # Search several stores at once; combined with ``store_name`` if both are set.
+    store_names: list[str] = Field(default_factory=list)
+    question: str
+    history: list[ChatTurn] = Field(default_factory=list)
+    model: str = Config.MODEL_OPTIONS[0]
+    # AIP-160 filter over upload metadata (filename, document_hash, tags,
+    # page_start/page_end), e.g. 'tags:"finance" AND filename = "q3.pdf"'
+    metadata_filter: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _require_store(self) -> "QueryRequest":
+        if not self.store_name and not self.store_names:
+            raise ValueError("store_name or store_names is required")
+        return self
+
+    @property
+    def all_store_names(self) -> list[str]:
+        return list(dict.fromkeys(([self.store_name] if self.store_name else []) + self.store_names))
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    sources: dict
+
+
+@dataclass(slots=True)
+class ApiServices:
+    client_pool: ClientPool
+    store_cache: StoreCache
+    ingestion: IngestionQueue
+    registry: Optional[StoreRegistry] = None
+
+
+def create_app(services: Optional[ApiServices] = None) -> FastAPI:
+    """Build the API; pass ``services`` to run against a fake backend in tests."""
+    if services is None:
+        # Briefs prepared by the app are dropped when the API deletes their store.
+        briefs = BriefStore(os.path.join(Config.CACHE_DIR, "document_briefs.sqlite3"))
+        registry = StoreRegistry(
+            os.path.join(Config.CACHE_DIR, "store_registry.sqlite3"), on_forget=briefs.forget_store
+        )
+        store_cache = StoreCache(os.path.join(Config.CACHE_DIR, "store_cache.sqlite3"), registry=registry)
+        page_index = PageIndexStore(os.path.join(Config.CACHE_DIR, "page_index"))
+        services = ApiServices(
+            ClientPool(), store_cache, IngestionQueue(store_cache, registry=registry, page_index=page_index), registry
+        )
+        StoreReaper(
+            registry,
+            services.client_pool.get,
+            on_deleted=lambda record: store_cache.invalidate(record.owner, record.store_name),
+        ).start()
+
+    api = FastAPI(title=Config.PAGE_TITLE)
+
+    def api_key(x_gemini_api_key: Optional[str] = Header(default=None)) -> str:
+        key = x_gemini_api_key or Config.get_api_key()
+        if not key:
+            raise HTTPException(status_code=401, detail="Missing X-Gemini-Api-Key header")
+        return key
+
+    def client(key: str = Depends(api_key)) -> genai.Client:
+        return services.client_pool.touch(key)
+
+    async def tenant(key: str = Depends(api_key)) -> None:
+        # Async so the binding lands in the request's own context rather than
+        # a worker thread's; every model call of the request queues as this key.
+        scheduler.bind(GeminiService.api_key_fingerprint(key))
+
+    @api.post("/stores", status_code=202, dependencies=[Depends(tenant)])
+    def upload(
+        files: list[UploadFile] = File(...),
+        tags: list[str] = Form(default=[]),
+        key: str = Depends(api_key),
+        gemini: genai.Client = Depends(client),
+    ) -> dict:
+        # Sync endpoint: FastAPI runs it in a worker thread, keeping disk I/O
+        # and the cache lookup off the event loop.
+        saved = []
+        try:
+            for upload_file in files:
+                saved.append(PDFService.save_stream(upload_file.file))
+        except FileUploadError as exc:
+            PDFService.cleanup_local_files(item.path for item in saved)
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+        owner = GeminiService.api_key_fingerprint(key)
+        digests = [item.sha256 for item in saved]
+        document_hash = PDFService.combine_hashes(digests + [f"tags:{','.join(sorted(tags))}"] if tags else digests)
+        cached_store = services.store_cache.lookup(gemini, owner, document_hash)
+        if cached_store:
+            PDFService.cleanup_local_files(item.path for item in saved)
+            return {"store_name": cached_store, "document_hash": document_hash, "reused": True}
+
+        job_id = services.ingestion.submit(
+            gemini,
+            owner,
+            document_hash,
+            [
+                (
+                    item.path,
+                    upload_file.filename or "document.pdf",
+                    GeminiService.build_document_metadata(upload_file.filename or "document.pdf", item.sha256, tags),
+                )
+                for item, upload_file in zip(saved, files)
+            ],
+            [item.path for item in saved],
+        )
+        return {"job_id": job_id, "document_hash": document_hash, "reused": False}
+
+    @api.get("/jobs/{job_id}")
+    def job_status(job_id: str, key: str = Depends(api_key)) -> dict:
+        job = services.ingestion.get(job_id)
+        if job is None or job.owner != GeminiService.api_key_fingerprint(key):
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return {
+            "job_id": job.id,
+            "status": job.status.value,
+            "indexed": job.indexed,
+            "total": job.total,
+            "store_name": job.store_name if job.status.finished else None,
+            "error": job.error,
+        }
+
+    def touch(store_names: list[str]) -> None:
+        if services.registry is not None:
+            for store_name in store_names:
+                services.registry.touch(store_name)
+
+    async def fan_out(request: QueryRequest, gemini: genai.Client, store_names: list[str]) -> QueryResponse:
+        try:
+            responses = await GeminiService.aquery_stores(
+                gemini, _conversation(request), store_names, request.model, metadata_filter=request.metadata_filter
+            )
+        except GeminiServiceError as exc:
+            raise _service_error(exc) from exc
+        for response in responses:
+            telemetry.record_usage(response.usage_metadata)
+        answer, sources = merge_answers(responses)
+        return QueryResponse(answer=answer, sources=sources.to_dict())
+
+    @api.post("/query", response_model=QueryResponse, dependencies=[Depends(tenant)])
+    async def query(request: QueryRequest, gemini: genai.Client = Depends(client)) -> QueryResponse:
+        store_names = request.all_store_names
+        touch(store_names)
+        return await fan_out(request, gemini, store_names)
+
+    @api.post("/query/stream", dependencies=[Depends(tenant)])
+    async def query_stream(request: QueryRequest, gemini: genai.Client = Depends(client)) -> StreamingResponse:
+        store_names = request.all_store_names
+        touch(store_names)
+        if len(GeminiService.partition_stores(store_names)) > 1:
+            # A fan-out has to be merged before anything can be sent, so it
+            # arrives as a single delta.
+            response = await fan_out(request, gemini, store_names)
+            return StreamingResponse(
+                iter([_sse("delta", {"text": response.answer}), _sse("done", response.model_dump())]),
+                media_type="text/event-stream",
+            )
+
+        async def events() -> AsyncIterator[str]:
+            stream = ResponseStream()
+            try:
+                async for chunk in GeminiService.astream_file_search(
+                    gemini, _conversation(request), store_names, request.model, request.metadata_filter
+                ):
+                    text = stream.add(chunk)
+                    if text:
+                        yield _sse("delta", {"text": text})
+            except GeminiServiceError as exc:
+                yield _sse("error", {"detail": str(exc), "busy": is_busy(exc)})
+                return
+            response = stream.final_response()
+            telemetry.record_usage(getattr(response, "usage_metadata", None))
+            answer, sources = parse_response(response)
+            yield _sse("done", {"answer": answer, "sources": sources.to_dict()})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @api.delete("/stores/{store_name:path}", status_code=204, dependencies=[Depends(tenant)])
+    async def delete_store(store_name: str, key: str = Depends(api_key), gemini: genai.Client = Depends(client)) -> Response:
+        try:
+            await GeminiService.acleanup_store(gemini, store_name)
+        except GeminiServiceError as exc:
+            raise _service_error(exc) from exc
+        services.store_cache.invalidate(GeminiService.api_key_fingerprint(key), store_name)
+        if services.registry is not None:
+            services.registry.forget(store_name)
+        return Response(status_code=204)
+
+    @api.get("/metrics", response_class=PlainTextResponse)
+    def metrics() -> str:
+        return telemetry.render_prometheus()
+
+    return api
+
+
+def _conversation(request: QueryRequest) -> list[types.Content]:
+    history = [turn.model_dump() for turn in request.history]
+    history.append({"role": "user", "content": request.question})
+    return build_conversation_contents(history, Config.HISTORY_TOKEN_BUDGET)
+
+
+def _service_error(exc: GeminiServiceError) -> HTTPException:
+    """502 for upstream failures; 503 with ``Retry-After`` when the scheduler shed the call."""
+    if is_busy(exc):
+        return HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(Config.SCHEDULER_RETRY_AFTER)}
+        )
+    return HTTPException(status_code=502, detail=str(exc))
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def main() -> None:
+    import uvicorn
+
+    configure_exporters()
+    uvicorn.run(create_app(), host=Config.API_HOST, port=Config.API_PORT)
+
+
+if __name__ == "__main__":
+    main()
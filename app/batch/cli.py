@@ -0,0 +1,250 @@
+"""Answer a file of questions against indexed stores, for offline evaluation.
+
+Run with::
+
+    python -m app.batch.cli --store fileSearchStores/abc --questions qa.jsonl --output answers.jsonl
+
+Each input line is ``{"id": ..., "question": ..., "metadata_filter": ...}``
+(only ``question`` is required; ``id`` defaults to the line number). Answers
+and parsed sources are appended to the output as each question completes, so
+an interrupted run resumes by repeating the same command: questions already
+answered in the output are skipped and failed ones are retried, replacing
+their earlier error records.
+"""
+from __future__ import annotations
+
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence, TextIO
+
+from google import genai
+from google.genai import types
+
+from app.core.config import Config
+from app.core.exceptions import AppError
+from app.core.telemetry import telemetry
+from app.services.gemini_service import GeminiService
+from app.services.scheduler import Priority, scheduler
+from app.utils.conversation import merge_answers
+
+
+@dataclass(frozen=True, slots=True)
+class BatchQuestion:
+    id: str
+    question: str
+    metadata_filter: Optional[str] = None
+
+
+@dataclass(slots=True)
+class BatchReport:
+    answered: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    tokens: int = 0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Questions completed (answered or failed) per second."""
+        return (self.answered + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[q - 1]
+
+    def summary(self) -> str:
+        return (
+            f"{self.answered} answered, {self.failed} failed, {self.skipped} skipped (already answered) "
+            f"in {self.elapsed:.1f}s: {self.throughput:.2f} questions/s, {self.tokens} tokens\n"
+            f"latency p50 {self.percentile(50):.2f}s, p95 {self.percentile(95):.2f}s, "
+            f"p99 {self.percentile(99):.2f}s, max {max(self.latencies, default=0.0):.2f}s"
+        )
+
+
+def load_questions(path: str) -> list[BatchQuestion]:
+    """Read questions from JSONL; a line may also be a bare JSON string."""
+    questions = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"question": record}
+            questions.append(
+                BatchQuestion(str(record.get("id", number)), record["question"], record.get("metadata_filter"))
+            )
+    return questions
+
+
+def answered_ids(path: str) -> set[str]:
+    """Ids answered without error in an earlier run's output."""
+    ids: set[str] = set()
+    try:
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by the interruption
+                if not record.get("error"):
+                    ids.add(str(record["id"]))
+    except FileNotFoundError:
+        pass
+    return ids
+
+
+def run_batch(
+    client: genai.Client,
+    store_names: Sequence[str],
+    questions: Sequence[BatchQuestion],
+    output: TextIO,
+    model: str = Config.MODEL_OPTIONS[0],
+    concurrency: int = Config.BATCH_CONCURRENCY,
+    metadata_filter: Optional[str] = None,
+    skip: frozenset[str] | set[str] = frozenset(),
+    on_result: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> BatchReport:
+    """Answer ``questions`` with at most ``concurrency`` in flight, writing each result as it completes.
+
+    Retries, fallback and rate limits come from the shared request policy, so
+    a large batch stays under the same quota as the interactive app; its calls
+    are scheduled for the caller's tenant (see ``FairScheduler.tenant``).
+    """
+    report = BatchReport(skipped=sum(1 for question in questions if question.id in skip))
+    pending = [question for question in questions if question.id not in skip]
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def answer(question: BatchQuestion) -> dict[str, Any]:
+        conversation = [types.Content(role="user", parts=[types.Part(text=question.question)])]
+        record: dict[str, Any] = {"id": question.id, "question": question.question, "model": model}
+        began = time.perf_counter()
+        try:
+            responses = GeminiService.query_stores(
+                client,
+                conversation,
+                store_names,
+                model,
+                metadata_filter=question.metadata_filter or metadata_filter,
+            )
+        except AppError as exc:
+            record.update(error=str(exc), latency=round(time.perf_counter() - began, 4))
+            return record
+        tokens = 0
+        for response in responses:
+            telemetry.record_usage(response.usage_metadata)
+            tokens += getattr(response.usage_metadata, "total_token_count", None) or 0
+        text, sources = merge_answers(responses)
+        record.update(
+            answer=text,
+            sources=sources.to_dict(),
+            tokens=tokens,
+            latency=round(time.perf_counter() - began, 4),
+        )
+        return record
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-qa")
+    try:
+        futures = [executor.submit(contextvars.copy_context().run, answer, question) for question in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            with lock:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if "error" in record:
+                    report.failed += 1
+                else:
+                    report.answered += 1
+                    report.tokens += record["tokens"]
+                    report.latencies.append(record["latency"])
+            if on_result is not None:
+                on_result(record)
+    except KeyboardInterrupt:
+        # Answers already written are kept; the next run resumes after them.
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        report.elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return report
+
+
+def _open_output(path: str, resume: bool) -> TextIO:
+    if not resume or not os.path.exists(path):
+        return open(path, "w", encoding="utf-8")
+    # Keep one answered record per id. Failed questions are retried and
+    # written again, and a line cut short by an interruption is unreadable.
+    kept: dict[str, str] = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("error"):
+                kept.setdefault(str(record["id"]), line)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        handle.writelines(kept.values())
+    os.replace(temp_path, path)
+    return open(path, "a", encoding="utf-8")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", action="append", required=True, help="store name; repeat to search several")
+    parser.add_argument("--questions", required=True, help="JSONL file of questions")
+    parser.add_argument("--output", required=True, help="JSONL file answers are appended to")
+    parser.add_argument("--model", default=Config.MODEL_OPTIONS[0], choices=Config.MODEL_OPTIONS)
+    parser.add_argument("--concurrency", type=int, default=Config.BATCH_CONCURRENCY)
+    parser.add_argument("--metadata-filter", default=None, help="default filter for questions without one")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of resuming")
+    args = parser.parse_args(argv)
+
+    api_key = Config.get_api_key()
+    if not api_key:
+        print("GEMINI_API_KEY is not set", file=sys.stderr)
+        return 2
+    questions = load_questions(args.questions)
+    skip = set() if args.no_resume else answered_ids(args.output)
+    client = GeminiService.create_client(api_key)
+    # A batch run yields to interactive traffic; its weight lets it use the
+    # requested concurrency rather than one session's share.
+    scheduler.bind("batch", Priority.BACKGROUND, max(1.0, args.concurrency / Config.SCHEDULER_MAX_PER_SESSION))
+    progress = {"done": 0}
+    total = sum(1 for question in questions if question.id not in skip)
+
+    def on_result(record: dict[str, Any]) -> None:
+        progress["done"] += 1
+        status = "error" if "error" in record else f"{record['latency']:.2f}s"
+        print(f"[{progress['done']}/{total}] {record['id']}: {status}", file=sys.stderr)
+
+    with _open_output(args.output, resume=not args.no_resume) as output:
+        report = run_batch(
+            client,
+            args.store,
+            questions,
+            output,
+            model=args.model,
+            concurrency=args.concurrency,
+            metadata_filter=args.metadata_filter,
+            skip=skip,
+            on_result=on_result,
+        )
+    print(report.summary(), file=sys.stderr)
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import tempfile
 from typing import Final
 
 from dotenv import load_dotenv
@@ -20,12 +21,180 @@ class Config:
         "gemini-2.5-pro"
     ]
     
+    # Render answers incrementally via generate_content_stream
+    STREAM_RESPONSES: Final[bool] = True
+
+    # Conversation history sent per turn (estimated tokens); older turns are
+    # dropped or, when enabled, folded into a rolling summary
+    HISTORY_TOKEN_BUDGET: Final[int] = 8000
+    HISTORY_SUMMARY_ENABLED: Final[bool] = False
+
+    # Chat rendering: messages shown live, page size for older ones,
+    # and characters of retrieved text previewed per source
+    HISTORY_RENDER_WINDOW: Final[int] = 12
+    HISTORY_PAGE_SIZE: Final[int] = 20
+    SOURCE_PREVIEW_CHARS: Final[int] = 160
+
     # Store Configuration
     STORE_NAME_PREFIX: Final[str] = "streams-pdf-chat"
     
     # Timeouts (in seconds)
     UPLOAD_TIMEOUT: Final[int] = 300
-    POLL_INTERVAL: Final[int] = 2
+
+    # Operation polling: exponential backoff with jitter, capped. Indexing takes
+    # seconds, so a low cap keeps detection lag near a fixed 2s poll's
+    # (python -m benchmarks.poll_latency).
+    POLL_INITIAL_INTERVAL: Final[float] = 1.0
+    POLL_BACKOFF_MULTIPLIER: Final[float] = 1.6
+    POLL_MAX_INTERVAL: Final[float] = 2.5
+    POLL_JITTER: Final[float] = 0.2
+
+    # Request policy: retries with backoff for 429/5xx, per-model circuit
+    # breakers with fallback, and process-wide rate limits (requests/minute;
+    # "admin" covers store and upload calls, "operations" status polls)
+    RETRY_MAX_ATTEMPTS: Final[int] = 4
+    RETRY_INITIAL_DELAY: Final[float] = 0.5
+    RETRY_BACKOFF_MULTIPLIER: Final[float] = 2.0
+    RETRY_MAX_DELAY: Final[float] = 8.0
+    RETRY_AFTER_CAP: Final[float] = 30.0
+    CIRCUIT_FAILURE_THRESHOLD: Final[int] = 5
+    CIRCUIT_RESET_TIMEOUT: Final[float] = 30.0
+    MODEL_FALLBACKS: Final[dict[str, str]] = {"gemini-2.5-pro": "gemini-2.5-flash"}
+    RATE_LIMITS: Final[dict[str, float]] = {
+        "gemini-2.5-flash": float(os.getenv("RATE_LIMIT_FLASH_RPM", "1000")),
+        "gemini-2.5-pro": float(os.getenv("RATE_LIMIT_PRO_RPM", "150")),
+        "admin": float(os.getenv("RATE_LIMIT_ADMIN_RPM", "600")),
+    }
+    # Send a duplicate query when the first is slower than this (0 disables)
+    QUERY_HEDGE_DELAY: Final[float] = float(os.getenv("QUERY_HEDGE_DELAY", "0"))
+
+    # Fair scheduling of API calls across sessions: process-wide and
+    # per-session concurrency, the share of slots background work may hold,
+    # and backpressure limits (calls queued per session, seconds a call may
+    # wait) past which callers are told the server is busy
+    SCHEDULER_MAX_CONCURRENT: Final[int] = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "32"))
+    SCHEDULER_MAX_PER_SESSION: Final[int] = 4
+    SCHEDULER_BACKGROUND_SHARE: Final[float] = 0.75
+    SCHEDULER_MAX_QUEUED_PER_SESSION: Final[int] = 64
+    SCHEDULER_MAX_WAIT: Final[float] = float(os.getenv("SCHEDULER_MAX_WAIT", "20"))
+    SCHEDULER_RETRY_AFTER: Final[int] = 5
+
+    # Multi-store queries: stores named in one request, and how many requests
+    # run at once when a query spans more stores than that
+    MAX_STORES_PER_QUERY: Final[int] = int(os.getenv("MAX_STORES_PER_QUERY", "5"))
+    MAX_QUERY_FANOUT: Final[int] = 4
+
+    # Background ingestion: jobs per process and status refresh cadence
+    MAX_CONCURRENT_INGESTIONS: Final[int] = 4
+    INGESTION_JOB_RETENTION: Final[int] = 60 * 60
+    INGESTION_STATUS_REFRESH: Final[float] = 1.0
+
+    # Upload straight from the in-memory upload buffer instead of a temp file
+    UPLOAD_FROM_MEMORY: Final[bool] = True
+    SAVE_CHUNK_SIZE: Final[int] = 1024 * 1024
+
+    # Optional PDF preprocessing before upload (needs the "pdf" extra): per-page
+    # text extraction, image downsampling and splitting into page ranges,
+    # run in a process pool. Forces the temp-file upload path when enabled.
+    PDF_PREPROCESSING: Final[bool] = os.getenv("PDF_PREPROCESSING", "0") == "1"
+    PDF_PREPROCESS_WORKERS: Final[int] = max(1, (os.cpu_count() or 2) // 2)
+    PDF_SPLIT_PAGES: Final[int] = 150
+    PDF_IMAGE_MAX_DIMENSION: Final[int] = 1600
+    PDF_IMAGE_QUALITY: Final[int] = 75
+
+    # Concurrent uploads when several PDFs go into one store
+    MAX_UPLOAD_WORKERS: Final[int] = 8
+
+    # Shared Gemini clients: one keep-alive HTTP pool for every session
+    CLIENT_IDLE_TIMEOUT: Final[int] = 15 * 60
+    CLIENT_LEASE_TIMEOUT: Final[int] = 2 * 60 * 60
+    HTTP_MAX_CONNECTIONS: Final[int] = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: Final[int] = 20
+    HTTP_KEEPALIVE_EXPIRY: Final[float] = 60.0
+
+    # Headless API (python -m app.api.server)
+    API_HOST: Final[str] = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT: Final[int] = int(os.getenv("API_PORT", "8000"))
+
+    # Batch question answering (python -m app.batch.cli): questions in flight
+    BATCH_CONCURRENCY: Final[int] = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+    # Instrumentation: Prometheus /metrics port (0 disables), OTLP-style JSON
+    # lines span file, and the in-app per-turn debug panel
+    TELEMETRY_ENABLED: Final[bool] = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+    TELEMETRY_PROMETHEUS_HOST: Final[str] = os.getenv("TELEMETRY_PROMETHEUS_HOST", "127.0.0.1")
+    TELEMETRY_PROMETHEUS_PORT: Final[int] = int(os.getenv("TELEMETRY_PROMETHEUS_PORT", "0"))
+    TELEMETRY_OTLP_FILE: Final[str | None] = os.getenv("TELEMETRY_OTLP_FILE") or None
+    DEBUG_PANEL_ENABLED: Final[bool] = os.getenv("DEBUG_PANEL", "0") == "1"
+    DEBUG_PANEL_TURNS: Final[int] = 10
+
+    # Local persistence
+    CACHE_DIR: Final[str] = os.getenv(
+        "APP_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "gemini-file-search-cache"),
+    )
+
+    # Upload cache: reuse indexed stores for byte-identical documents
+    STORE_CACHE_TTL: Final[int] = 6 * 60 * 60
+    STORE_CACHE_MAX_ENTRIES: Final[int] = 16
+
+    # Store registry: idle stores and stores whose ingestion never finished are
+    # force-deleted by a background reaper, in batches
+    STORE_IDLE_TTL: Final[int] = 6 * 60 * 60
+    STORE_ORPHAN_TTL: Final[int] = 60 * 60
+    REAPER_INTERVAL: Final[float] = 5 * 60
+    REAPER_BATCH_SIZE: Final[int] = 20
+    REAPER_MAX_WORKERS: Final[int] = 4
+
+    # Session state shared by app replicas: "memory" (this process only),
+    # "sqlite" (SESSION_STATE_PATH, default under CACHE_DIR) or "redis"
+    # (any server speaking the Redis protocol at SESSION_STATE_URL). Sessions
+    # idle for SESSION_STATE_TTL are dropped; turns above the threshold (bytes)
+    # are stored zlib-compressed
+    SESSION_STATE_BACKEND: Final[str] = os.getenv("SESSION_STATE_BACKEND", "memory")
+    SESSION_STATE_PATH: Final[str | None] = os.getenv("SESSION_STATE_PATH") or None
+    SESSION_STATE_URL: Final[str] = os.getenv("SESSION_STATE_URL", "redis://localhost:6379/0")
+    SESSION_STATE_TTL: Final[int] = int(os.getenv("SESSION_STATE_TTL", str(24 * 60 * 60)))
+    SESSION_STATE_COMPRESS_MIN: Final[int] = 512
+    SESSION_STATE_TIMEOUT: Final[float] = 2.0
+
+    # Local page index (needs the "pdf" extra): per-page text and a word
+    # 3-gram index written at ingestion, used to show the page each source
+    # came from. Passages are matched on a sample of their 3-grams and need
+    # PAGE_INDEX_MIN_OVERLAP of it to agree on a page
+    PAGE_INDEX_ENABLED: Final[bool] = os.getenv("PAGE_INDEX", "1") == "1"
+    PAGE_INDEX_SAMPLE: Final[int] = 48
+    PAGE_INDEX_MIN_OVERLAP: Final[float] = 0.2
+    PAGE_INDEX_EXCERPT_CONTEXT: Final[int] = 80
+    PAGE_INDEX_CACHE_SIZE: Final[int] = 1024
+    PAGE_INDEX_MAX_OPEN: Final[int] = 32
+    PAGE_INDEX_MAX_AGE: Final[int] = 7 * 24 * 60 * 60
+
+    # Document brief prepared in the background once a store is indexed (off
+    # by default: it costs a few model calls per document set and model). An
+    # outline, a summary and suggested questions with their answers are kept
+    # until the store is deleted and served without calling the model
+    DOCUMENT_BRIEF_ENABLED: Final[bool] = os.getenv("DOCUMENT_BRIEF", "0") == "1"
+    DOCUMENT_BRIEF_QUESTIONS: Final[int] = 4
+    DOCUMENT_BRIEF_OUTLINE_MAX: Final[int] = 12
+    DOCUMENT_BRIEF_CONCURRENCY: Final[int] = 3
+    # Briefs being prepared at once, on their own pool rather than the upload workers'
+    DOCUMENT_BRIEF_WORKERS: Final[int] = 1
+
+    # Explicit context caching of long conversations (off by default): the
+    # stable prefix and tool config are cached once they reach the token
+    # threshold, re-cached whenever the uncached tail grows by as much again,
+    # and the entry's TTL is extended as the conversation continues
+    CONTEXT_CACHE_ENABLED: Final[bool] = os.getenv("CONTEXT_CACHE", "0") == "1"
+    CONTEXT_CACHE_MIN_TOKENS: Final[int] = int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+    CONTEXT_CACHE_TTL: Final[int] = 10 * 60
+
+    # Answer cache: repeated questions against the same documents skip the model
+    ANSWER_CACHE_ENABLED: Final[bool] = True
+    ANSWER_CACHE_TTL: Final[int] = 24 * 60 * 60
+    ANSWER_CACHE_MAX_ENTRIES: Final[int] = 5000
+    # Scope cached answers to the preceding conversation (safer, fewer hits)
+    ANSWER_CACHE_INCLUDE_HISTORY: Final[bool] = True
     
     @staticmethod
     def get_api_key() -> str | None:
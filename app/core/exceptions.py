@@ -10,6 +10,18 @@ class FileUploadError(AppError):
     """Raised when file upload or processing fails."""
     pass
 
+class CircuitOpenError(GeminiServiceError):
+    """Raised when every candidate model's circuit breaker is open."""
+    pass
+
+class SchedulerBusyError(GeminiServiceError):
+    """Raised when the request scheduler sheds load instead of queueing a call."""
+    pass
+
+class SessionStateError(AppError):
+    """Raised when the session state backend cannot be read or written."""
+    pass
+
 class OperationTimeoutError(AppError):
     """Raised when an operation times out."""
     pass
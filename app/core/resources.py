@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+import streamlit as st
+from google import genai
+
+from app.core.config import Config
+from app.core.telemetry import Telemetry, configure_exporters, telemetry
+from app.services.answer_cache import AnswerCache
+from app.services.client_pool import ClientPool
+from app.services.document_brief import BriefStore
+from app.services.gemini_service import GeminiService
+from app.services.ingestion import IngestionQueue
+from app.services.page_index import PageIndexStore
+from app.services.session_store import SessionStore, create_session_store
+from app.services.store_cache import StoreCache
+from app.services.store_registry import StoreReaper, StoreRegistry
+
+
+@st.cache_resource
+def get_store_cache() -> StoreCache:
+    """Process-wide upload cache shared by every Streamlit session."""
+    return StoreCache(os.path.join(Config.CACHE_DIR, "store_cache.sqlite3"), registry=get_store_registry())
+
+
+@st.cache_resource
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache; persisted so it survives Streamlit restarts."""
+    return AnswerCache(os.path.join(Config.CACHE_DIR, "answer_cache.sqlite3"))
+
+
+@st.cache_resource
+def get_client_pool() -> ClientPool:
+    """Process-wide Gemini client registry shared by every Streamlit session."""
+    return ClientPool()
+
+
+@st.cache_resource
+def get_ingestion_queue() -> IngestionQueue:
+    """Process-wide background ingestion worker."""
+    return IngestionQueue(
+        get_store_cache(),
+        registry=get_store_registry(),
+        page_index=get_page_index_store(),
+        briefs=get_brief_store(),
+    )
+
+
+@st.cache_resource
+def get_brief_store() -> BriefStore:
+    """Process-wide document briefs; persisted so they survive Streamlit restarts."""
+    return BriefStore(os.path.join(Config.CACHE_DIR, "document_briefs.sqlite3"))
+
+
+@st.cache_resource
+def get_page_index_store() -> PageIndexStore:
+    """Process-wide page indexes, memory-mapped and shared by every session."""
+    return PageIndexStore(os.path.join(Config.CACHE_DIR, "page_index"))
+
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    """Process-wide handle on the session state backend (``SESSION_STATE_BACKEND``)."""
+    return create_session_store()
+
+
+@st.cache_resource
+def get_telemetry() -> Telemetry:
+    """Process-wide instrumentation, with exporters attached once."""
+    configure_exporters()
+    return telemetry
+
+
+@st.cache_resource
+def get_store_registry() -> StoreRegistry:
+    """Process-wide record of every store created, persisted across restarts."""
+    return StoreRegistry(
+        os.path.join(Config.CACHE_DIR, "store_registry.sqlite3"), on_forget=get_brief_store().forget_store
+    )
+
+
+@st.cache_resource
+def get_store_reaper() -> StoreReaper:
+    """Background deletion of idle and orphaned stores, started once per process."""
+    pool = get_client_pool()
+    store_cache = get_store_cache()
+    server_key = Config.get_api_key()
+    server_owner = GeminiService.api_key_fingerprint(server_key) if server_key else None
+
+    def client_for(owner: str) -> Optional[genai.Client]:
+        client = pool.get(owner)
+        if client is None and owner == server_owner:
+            client = pool.touch(server_key)
+        return client
+
+    return StoreReaper(
+        get_store_registry(),
+        client_for,
+        on_deleted=lambda record: store_cache.invalidate(record.owner, record.store_name),
+    ).start()
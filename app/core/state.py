@@ -1,16 +1,36 @@
-from app.core.config import Config
-from app.utils.localization import get_text
+from app.core.exceptions import SessionStateError
+from app.core.resources import get_session_store
+from app.core.telemetry import telemetry
+from app.utils.sources import SourceSet
 
-from typing import Any
+import uuid
+from typing import Any, Callable, Optional
 
 import streamlit as st
 
 SESSION_DEFAULTS: dict[str, Any] = {
     "language": "en",
+    "session_id": None,
+    "state_restored": False,
+    "persisted_fields": {},
+    "reattach_checked": False,
+    "owner": None,
     "chat_history": [],
+    "conversation_window": None,
+    "context_cache": None,
     "store_name": None,
-    "uploaded_filename": None,
-    "uploaded_path": None,
+    "search_all_stores": False,
+    "document_tags": [],
+    "pending_tags": [],
+    "filter_filenames": [],
+    "filter_tags": [],
+    "document_hash": None,
+    "ingestion_job": None,
+    "briefs_requested": set(),
+    "suggested_prompt": None,
+    "uploaded_filenames": [],
+    "requested_filenames": [],
+    "turn_metrics": [],
     "client": None,
     "client_api_key": None,
     "model": "gemini-2.5-flash",
@@ -18,6 +38,25 @@ SESSION_DEFAULTS: dict[str, Any] = {
 }
 
 
+# Plain values saved to the session state backend so another replica, or the
+# same one after a reconnect, can pick the session up. The chat history is
+# saved turn by turn; clients, caches and in-flight jobs are process-local
+# and rebuilt (or dropped) instead.
+PERSISTED_KEYS: tuple[str, ...] = (
+    "owner",
+    "language",
+    "model",
+    "store_name",
+    "document_hash",
+    "uploaded_filenames",
+    "requested_filenames",
+    "document_tags",
+    "search_all_stores",
+    "filter_filenames",
+    "filter_tags",
+)
+
+
 def init_session_state() -> None:
     """Populate Streamlit's session state with predictable defaults."""
     for key, value in SESSION_DEFAULTS.items():
@@ -29,15 +68,102 @@ def init_session_state() -> None:
             st.session_state[key] = value
 
 
+def ensure_session_id() -> str:
+    """Stable id for this browser session, kept in the ``?session=`` query parameter.
+
+    Reopening the same URL after a closed tab or a server restart yields the
+    same id, which lets the session reattach to its stores.
+    """
+    return _use_session_id(st.session_state.get("session_id") or st.query_params.get("session") or uuid.uuid4().hex)
+
+
+def _use_session_id(session_id: str) -> str:
+    if st.query_params.get("session") != session_id:
+        st.query_params["session"] = session_id
+    st.session_state["session_id"] = session_id
+    return session_id
+
+
+def restore_session_state(owner: Optional[str]) -> bool:
+    """Once per browser session, load the fields and chat history saved under its id.
+
+    Saved state belongs to the API key that wrote it (``owner``, a key
+    fingerprint), so nothing is restored or saved until a key is known. A
+    ``?session=`` URL opened with another key does not restore that state:
+    the browser gets a new session id instead. Returns True if fields were
+    restored.
+    """
+    if st.session_state.get("state_restored") or not owner:
+        return False
+    st.session_state["state_restored"] = True
+    st.session_state["owner"] = owner
+    try:
+        snapshot = get_session_store().load(st.session_state["session_id"])
+    except SessionStateError:
+        telemetry.increment("app_session_state_errors_total", operation="load")
+        return False
+    if (snapshot.fields or snapshot.history) and snapshot.fields.get("owner") != owner:
+        telemetry.increment("app_session_state_rejected_total")
+        _use_session_id(uuid.uuid4().hex)
+        return False
+    fields = {key: value for key, value in snapshot.fields.items() if key in PERSISTED_KEYS}
+    st.session_state.update(fields)
+    if snapshot.history:
+        st.session_state["chat_history"] = snapshot.history
+    st.session_state["persisted_fields"] = _copy(fields)
+    return bool(fields)
+
+
+def save_session_state() -> None:
+    """Write the persisted fields that changed during this run."""
+    saved = st.session_state.get("persisted_fields", {})
+    changed = {
+        key: st.session_state[key]
+        for key in PERSISTED_KEYS
+        if key in st.session_state and (key not in saved or saved[key] != st.session_state[key])
+    }
+    if changed and _persist("save_fields", lambda store, session_id: store.save_fields(session_id, changed)):
+        saved.update(_copy(changed))
+        st.session_state["persisted_fields"] = saved
+
+
+def _copy(fields: dict[str, Any]) -> dict[str, Any]:
+    # Copies, so later in-place edits of session lists still show up as changes.
+    return {key: list(value) if isinstance(value, list) else value for key, value in fields.items()}
+
+
+def _persist(operation: str, write: Callable[[Any, str], None]) -> bool:
+    """Apply ``write`` to the backend; a failing backend leaves the session working in memory."""
+    session_id = st.session_state.get("session_id")
+    if not session_id or not st.session_state.get("state_restored"):
+        return False  # not bound to an owner yet
+    try:
+        write(get_session_store(), session_id)
+    except SessionStateError:
+        telemetry.increment("app_session_state_errors_total", operation=operation)
+        return False
+    return True
+
+
+def clear_chat_history() -> None:
+    st.session_state["chat_history"] = []
+    _persist("clear_history", lambda store, session_id: store.clear_history(session_id))
+
+
 def reset_uploaded_pdf_state() -> None:
     """Clear file-related session state keys after cleanup."""
     st.session_state["store_name"] = None
-    st.session_state["uploaded_filename"] = None
-    st.session_state["uploaded_path"] = None
-    st.session_state["chat_history"] = []
+    st.session_state["document_hash"] = None
+    st.session_state["ingestion_job"] = None
+    st.session_state["uploaded_filenames"] = []
+    st.session_state["requested_filenames"] = []
+    st.session_state["document_tags"] = []
+    st.session_state["filter_filenames"] = []
+    st.session_state["filter_tags"] = []
+    clear_chat_history()
 
 
-def append_chat_message(role: str, content: str, sources: list[Any] | None = None) -> None:
+def append_chat_message(role: str, content: str, sources: SourceSet | None = None) -> None:
     """Persist the latest chat turn so the UI can replay it."""
     if "chat_history" not in st.session_state:
         st.session_state["chat_history"] = []
@@ -45,3 +171,4 @@ def append_chat_message(role: str, content: str, sources: list[Any] | None = Non
     if sources:
         record["sources"] = sources
     st.session_state["chat_history"].append(record)
+    _persist("append_turn", lambda store, session_id: store.append_turn(session_id, record))
@@ -0,0 +1,339 @@
+"""Lightweight, dependency-free instrumentation: spans, counters and histograms.
+
+Every finished span is observed into the ``app_span_duration_seconds``
+histogram and handed to the configured exporters. Metrics are exposed in
+Prometheus text format (``render_prometheus`` / ``start_prometheus_server``)
+and spans can be appended to a file as OTLP-style JSON lines.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator, Optional, Protocol, TypeVar
+
+from app.core.config import Config
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+DURATION_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+@dataclass(slots=True)
+class TurnMetrics:
+    """Spans and token usage collected while a ``collect()`` block is active."""
+
+    spans: list[Span] = field(default_factory=list)
+    usage: dict[str, int] = field(default_factory=dict)
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class JsonLinesSpanExporter:
+    """Append each span as one OTLP-JSON-shaped line to ``path``."""
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        record = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "parentSpanId": span.parent_id or "",
+            "name": span.name,
+            "startTimeUnixNano": span.start_ns,
+            "endTimeUnixNano": span.end_ns,
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in span.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": span.error} if span.error else {"code": "STATUS_CODE_OK"},
+        }
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock, open(self._path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_collectors: contextvars.ContextVar[tuple[TurnMetrics, ...]] = contextvars.ContextVar("collectors", default=())
+
+
+class Telemetry:
+    """Process-wide metric registry and span tracer."""
+
+    def __init__(self, enabled: bool = Config.TELEMETRY_ENABLED) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[LabelKey, float]] = {}
+        self._histograms: dict[str, dict[LabelKey, _Histogram]] = {}
+        self._gauges: dict[str, dict[LabelKey, float]] = {}
+        self._exporters: list[SpanExporter] = []
+
+    def add_exporter(self, exporter: SpanExporter) -> None:
+        self._exporters.append(exporter)
+
+    def increment(self, name: str, value: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._histograms.setdefault(name, {}).setdefault(key, _Histogram()).observe(value)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time a block; nested spans share the trace of the enclosing one."""
+        span = self._start(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+
+    @contextlib.contextmanager
+    def collect(self) -> Iterator[TurnMetrics]:
+        """Gather every span and token count finished inside the block (e.g. one chat turn)."""
+        metrics = TurnMetrics()
+        token = _collectors.set(_collectors.get() + (metrics,))
+        try:
+            yield metrics
+        finally:
+            _collectors.reset(token)
+
+    def record_usage(self, usage_metadata: Any) -> None:
+        """Count tokens from a response's ``usage_metadata``."""
+        if usage_metadata is None:
+            return
+        usage = {
+            "prompt": getattr(usage_metadata, "prompt_token_count", None),
+            "candidates": getattr(usage_metadata, "candidates_token_count", None),
+            "cached": getattr(usage_metadata, "cached_content_token_count", None),
+            "thoughts": getattr(usage_metadata, "thoughts_token_count", None),
+            "total": getattr(usage_metadata, "total_token_count", None),
+        }
+        for kind, count in usage.items():
+            if not count:
+                continue
+            self.increment("app_tokens_total", count, kind=kind)
+            for metrics in _collectors.get():
+                metrics.usage[kind] = metrics.usage.get(kind, 0) + count
+
+    def traced(self, name: str) -> Callable[[F], F]:
+        """Decorator wrapping a function, generator or coroutine in a span."""
+
+        def decorate(func: F) -> F:
+            if inspect.isasyncgenfunction(func):
+
+                @functools.wraps(func)
+                async def async_gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    # Generator spans time until exhaustion but never become the
+                    # current span, since their frames interleave with the caller's.
+                    span = self._start(name, {})
+                    try:
+                        async for item in func(*args, **kwargs):
+                            yield item
+                    except BaseException as exc:
+                        span.error = type(exc).__name__
+                        raise
+                    finally:
+                        self._finish(span)
+
+                return async_gen_wrapper  # type: ignore[return-value]
+
+            if inspect.isgeneratorfunction(func):
+
+                @functools.wraps(func)
+                def gen_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    span = self._start(name, {})
+                    try:
+                        yield from func(*args, **kwargs)
+                    except BaseException as exc:
+                        span.error = type(exc).__name__
+                        raise
+                    finally:
+                        self._finish(span)
+
+                return gen_wrapper  # type: ignore[return-value]
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    with self.span(name):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper  # type: ignore[return-value]
+
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorate
+
+    def _start(self, name: str, attributes: dict[str, Any]) -> Span:
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=dict(attributes),
+        )
+
+    def _finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if not self.enabled:
+            return
+        self.observe("app_span_duration_seconds", span.duration, span=span.name)
+        if span.error:
+            self.increment("app_span_errors_total", span=span.name, error=span.error)
+        for metrics in _collectors.get():
+            metrics.spans.append(span)
+        for exporter in self._exporters:
+            try:
+                exporter.export(span)
+            except OSError:
+                pass  # telemetry must never break the request path
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def start_prometheus_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        """Serve ``/metrics`` from a daemon thread."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server naming
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+telemetry = Telemetry()
+traced = telemetry.traced
+
+
+def configure_exporters() -> None:
+    """Attach the exporters selected in ``Config``; call once per process."""
+    if Config.TELEMETRY_OTLP_FILE:
+        telemetry.add_exporter(JsonLinesSpanExporter(Config.TELEMETRY_OTLP_FILE))
+    if Config.TELEMETRY_PROMETHEUS_PORT:
+        try:
+            telemetry.start_prometheus_server(Config.TELEMETRY_PROMETHEUS_HOST, Config.TELEMETRY_PROMETHEUS_PORT)
+        except OSError:
+            pass  # another process (e.g. a second Streamlit worker) already serves it
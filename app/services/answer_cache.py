@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Callable, Optional, Sequence
+
+from google.genai import types
+
+from app.core.config import Config
+from app.utils.caching import CacheStats
+from app.utils.sources import SourceSet
+from app.utils.sqlite import open_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_cache (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse case, whitespace and trailing punctuation so trivial rewordings match."""
+    return _WHITESPACE.sub(" ", prompt).strip().rstrip("?!. ").lower()
+
+
+def history_fingerprint(contents: Sequence[types.Content]) -> str:
+    """Digest of the conversation that precedes a prompt."""
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update((content.role or "").encode("utf-8"))
+        for part in content.parts or []:
+            digest.update(b"\x00")
+            digest.update((part.text or "").encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """SQLite-backed LRU + TTL cache of parsed answers, shared across sessions and restarts."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = Config.ANSWER_CACHE_TTL,
+        max_entries: int = Config.ANSWER_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = open_database(path)
+        self._db.execute(_SCHEMA)
+        self.stats = CacheStats("answer")
+
+    @staticmethod
+    def make_key(
+        document_hash: str,
+        model: str,
+        prompt: str,
+        history: Optional[Sequence[types.Content]] = None,
+        metadata_filter: Optional[str] = None,
+    ) -> str:
+        """Build a cache key; pass ``history`` to scope answers to the preceding turns."""
+        fingerprint = history_fingerprint(history) if history else ""
+        parts = [document_hash, model, normalize_prompt(prompt), fingerprint]
+        if metadata_filter:
+            parts.append(metadata_filter)
+        material = json.dumps(parts)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple[str, SourceSet]]:
+        """Return ``(answer, sources)`` for a fresh entry, or None."""
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT answer, sources, created_at FROM answer_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and row[2] < now - self._ttl:
+                self._db.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                self.stats.evict()
+                row = None
+            if row is None:
+                self.stats.miss()
+                return None
+            self._db.execute("UPDATE answer_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.stats.hit()
+        return row[0], SourceSet.from_dict(json.loads(row[1]))
+
+    def put(self, key: str, answer: str, sources: SourceSet) -> None:
+        now = self._clock()
+        payload = json.dumps(sources.to_dict())
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+                (key, answer, payload, now, now),
+            )
+            evicted = self._db.execute(
+                "DELETE FROM answer_cache WHERE created_at < ?",
+                (now - self._ttl,),
+            ).rowcount
+            evicted += self._db.execute(
+                "DELETE FROM answer_cache WHERE key IN ("
+                "SELECT key FROM answer_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            ).rowcount
+            self.stats.evict(evicted)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import httpx
+from google import genai
+
+from app.core.config import Config
+from app.services.gemini_service import GeminiService
+
+
+@dataclass(slots=True)
+class _PooledClient:
+    client: genai.Client
+    refs: int
+    last_used: float
+
+
+class ClientPool:
+    """Process-wide registry of ``genai.Client`` objects keyed by API-key fingerprint.
+
+    All clients share one ``httpx.Client`` so sessions reuse warm keep-alive
+    connections. Sessions hold a lease (``acquire``/``release``); entries are
+    evicted once unleased and idle, or when a lease was abandoned for longer
+    than ``lease_timeout`` (Streamlit never reports closed tabs).
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = Config.CLIENT_IDLE_TIMEOUT,
+        lease_timeout: float = Config.CLIENT_LEASE_TIMEOUT,
+        http_client: Optional[httpx.Client] = None,
+        factory: Optional[Callable[[str, httpx.Client], genai.Client]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._idle_timeout = idle_timeout
+        self._lease_timeout = lease_timeout
+        self._http = http_client or httpx.Client(
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=None,  # the SDK sets a timeout per request
+        )
+        self._factory = factory or (lambda api_key, http: GeminiService.create_client(api_key, http))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients: dict[str, _PooledClient] = {}
+
+    def acquire(self, api_key: str) -> genai.Client:
+        """Lease the shared client for ``api_key``, creating it on first use."""
+        with self._lock:
+            entry = self._entry(api_key)
+            entry.refs += 1
+            return entry.client
+
+    def touch(self, api_key: str) -> genai.Client:
+        """Return the client for an existing lease, recreating it if it was evicted."""
+        with self._lock:
+            entry = self._entry(api_key)
+            entry.refs = max(entry.refs, 1)
+            return entry.client
+
+    def release(self, api_key: str) -> None:
+        with self._lock:
+            entry = self._clients.get(GeminiService.api_key_fingerprint(api_key))
+            if entry is not None:
+                entry.refs = max(0, entry.refs - 1)
+                entry.last_used = self._clock()
+
+    def get(self, fingerprint: str) -> Optional[genai.Client]:
+        """Look up a live client by API-key fingerprint without leasing it."""
+        with self._lock:
+            entry = self._clients.get(fingerprint)
+            return entry.client if entry else None
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            return self._evict_idle()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _entry(self, api_key: str) -> _PooledClient:
+        self._evict_idle()
+        fingerprint = GeminiService.api_key_fingerprint(api_key)
+        entry = self._clients.get(fingerprint)
+        if entry is None:
+            entry = _PooledClient(self._factory(api_key, self._http), refs=0, last_used=self._clock())
+            self._clients[fingerprint] = entry
+        entry.last_used = self._clock()
+        return entry
+
+    def _evict_idle(self) -> int:
+        now = self._clock()
+        stale = [
+            fingerprint
+            for fingerprint, entry in self._clients.items()
+            if now - entry.last_used > (self._lease_timeout if entry.refs else self._idle_timeout)
+        ]
+        for fingerprint in stale:
+            # Sessions still holding the object keep working; the shared
+            # httpx.Client is owned by the pool and stays open.
+            del self._clients[fingerprint]
+        return len(stale)
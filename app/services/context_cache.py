@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional, Sequence
+
+from google import genai
+from google.genai import types
+
+from app.core.config import Config
+from app.core.exceptions import GeminiServiceError
+from app.core.telemetry import telemetry
+from app.services.answer_cache import history_fingerprint
+from app.services.gemini_service import CachedPrefix, GeminiService
+from app.utils.conversation import estimate_tokens
+
+# Treat an entry as gone this long before its TTL runs out, so a request never
+# references a cache that expires in flight.
+_EXPIRY_MARGIN = 30.0
+
+
+@dataclass(slots=True)
+class _Entry:
+    prefix: CachedPrefix
+    scope: Hashable
+    fingerprint: str
+    tokens: int
+    expires_at: float
+
+
+class ContextCache:
+    """One session's cached-content entry for the stable prefix of its conversation.
+
+    ``prefix_for`` returns the entry while the conversation still starts with
+    the cached contents and the scope (model, stores, filter) is unchanged;
+    otherwise the stale entry is deleted. ``update`` runs after each answered
+    turn: it caches the conversation once it reaches ``min_tokens``, replaces
+    the entry when the uncached tail has grown by as much again, and otherwise
+    extends the entry's TTL once half of it has elapsed.
+
+    A token-budgeted ``ConversationWindow`` drops its oldest turns as the chat
+    grows, which would change the prefix on every turn. While ``holds(scope)``
+    the window is built pinned to the cached prefix, and ``update`` is given a
+    ``rebase`` callback returning the window as the budget would cut it, which
+    is what a replacement entry caches.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int = Config.CONTEXT_CACHE_MIN_TOKENS,
+        ttl: int = Config.CONTEXT_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self._clock = clock
+        self._entry: Optional[_Entry] = None
+
+    def holds(self, scope: Hashable) -> bool:
+        """Whether a live entry exists for ``scope``; its prefix should then be kept in the window."""
+        entry = self._entry
+        return entry is not None and entry.scope == scope and self._clock() < entry.expires_at - _EXPIRY_MARGIN
+
+    def prefix_for(
+        self,
+        client: genai.Client,
+        conversation: Sequence[types.Content],
+        scope: Hashable,
+    ) -> Optional[CachedPrefix]:
+        entry = self._entry
+        if entry is None:
+            return None
+        length = entry.prefix.length
+        if (
+            entry.scope != scope
+            or self._clock() >= entry.expires_at - _EXPIRY_MARGIN
+            or len(conversation) <= length
+            or history_fingerprint(conversation[:length]) != entry.fingerprint
+        ):
+            self.clear(client)
+            return None
+        return entry.prefix
+
+    def update(
+        self,
+        client: genai.Client,
+        contents: Sequence[types.Content],
+        scope: Hashable,
+        model: str,
+        store_names: Sequence[str],
+        metadata_filter: Optional[str] = None,
+        rebase: Optional[Callable[[], Sequence[types.Content]]] = None,
+    ) -> None:
+        """Cache or refresh after a turn; ``contents`` is the conversation just answered plus the answer.
+
+        A new entry caches ``rebase()`` instead of ``contents`` when given.
+        """
+        entry = self._entry if self._entry is not None and self._entry.scope == scope else None
+        tokens = _count_tokens(contents)
+        try:
+            if tokens - (entry.tokens if entry else 0) >= self.min_tokens:
+                if rebase is not None:
+                    contents = rebase()
+                    tokens = _count_tokens(contents)
+                prefix = GeminiService.create_context_cache(
+                    client, model, contents, store_names, metadata_filter, self.ttl
+                )
+                self.clear(client)
+                self._entry = _Entry(
+                    prefix, scope, history_fingerprint(contents), tokens, self._clock() + self.ttl
+                )
+                telemetry.increment("app_context_cache_events_total", event="created")
+            elif entry is not None and entry.expires_at - self._clock() < self.ttl / 2:
+                GeminiService.refresh_context_cache(client, entry.prefix.name, self.ttl)
+                entry.expires_at = self._clock() + self.ttl
+                telemetry.increment("app_context_cache_events_total", event="refreshed")
+        except GeminiServiceError:
+            # e.g. below the model's minimum cacheable size; the turn is unaffected
+            telemetry.increment("app_context_cache_events_total", event="failed")
+
+    def clear(self, client: Optional[genai.Client]) -> None:
+        """Delete the current entry, if any; it expires on its own if deletion fails."""
+        entry, self._entry = self._entry, None
+        if entry is None or client is None:
+            return
+        try:
+            GeminiService.delete_context_cache(client, entry.prefix.name)
+        except GeminiServiceError:
+            pass
+        telemetry.increment("app_context_cache_events_total", event="deleted")
+
+
+def _count_tokens(contents: Sequence[types.Content]) -> int:
+    return sum(estimate_tokens(part.text or "") for content in contents for part in content.parts or [])
@@ -0,0 +1,225 @@
+"""Summary, outline and suggested questions prepared for a document set in the background.
+
+Once a store is indexed, ``prepare_brief`` asks the model (with File Search
+over the store) for an outline and a few self-contained questions, then
+answers those questions and a summary request. ``BriefStore`` keeps the
+result per document hash and model until the store is deleted. A session's
+first questions, whether the summary or a suggested question clicked as a
+chip, are then answered without a model call.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from google import genai
+from google.genai import types
+
+from app.core.config import Config
+from app.core.exceptions import GeminiServiceError
+from app.core.telemetry import traced
+from app.services.answer_cache import normalize_prompt
+from app.services.gemini_service import GeminiService
+from app.utils.conversation import parse_response
+from app.utils.sources import SourceSet
+from app.utils.sqlite import open_database
+
+SUMMARY_PROMPT = "Summarize this document."
+
+_PLAN_PROMPT = (
+    "Using only the documents in the file search store, reply with a JSON object and nothing else: "
+    '{{"outline": [the main sections or topics, in document order, at most {outline}], '
+    '"questions": [{questions} questions a reader is likely to ask first, each answerable from the documents '
+    "and understandable without any earlier conversation]}}"
+)
+
+# Requests for a summary of the whole document set, after normalize_prompt.
+_SUMMARY_REQUEST = re.compile(
+    r"(?:please |can you |could you )?"
+    r"(?:summari[sz]e|give (?:me )?(?:a |an )?(?:summary|overview) of|what(?:'s| is) in|what(?:'s| is|'re| are))"
+    r" (?:this|the|these|my) (?:documents?|pdfs?|files?|papers?|reports?)(?: about)?"
+    r"|summari[sz]e|summary|overview|tl ?;? ?dr"
+)
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS document_briefs (
+    owner TEXT NOT NULL,
+    document_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    store_name TEXT NOT NULL,
+    brief TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (owner, document_hash, model)
+)
+"""
+_INDEXES = ("CREATE INDEX IF NOT EXISTS document_briefs_by_store ON document_briefs (owner, store_name)",)
+
+
+@dataclass(slots=True)
+class PreparedAnswer:
+    prompt: str
+    answer: str
+    sources: SourceSet
+
+
+@dataclass(slots=True)
+class DocumentBrief:
+    store_name: str
+    outline: list[str] = field(default_factory=list)
+    # The summary first, when it succeeded, then the suggested questions.
+    answers: list[PreparedAnswer] = field(default_factory=list)
+
+    @property
+    def suggestions(self) -> list[str]:
+        return [prepared.prompt for prepared in self.answers]
+
+    def answer_for(self, prompt: str) -> Optional[PreparedAnswer]:
+        """The prepared answer to ``prompt``, also matching rewordings of the summary request."""
+        normalized = normalize_prompt(prompt)
+        for prepared in self.answers:
+            if normalize_prompt(prepared.prompt) == normalized:
+                return prepared
+        if self.answers and self.answers[0].prompt == SUMMARY_PROMPT and _SUMMARY_REQUEST.fullmatch(normalized):
+            return self.answers[0]
+        return None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "outline": self.outline,
+            "answers": [
+                {"prompt": prepared.prompt, "answer": prepared.answer, "sources": prepared.sources.to_dict()}
+                for prepared in self.answers
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, store_name: str, payload: dict[str, Any]) -> "DocumentBrief":
+        return cls(
+            store_name,
+            list(payload.get("outline", [])),
+            [
+                PreparedAnswer(item["prompt"], item["answer"], SourceSet.from_dict(item["sources"]))
+                for item in payload.get("answers", [])
+            ],
+        )
+
+
+class BriefStore:
+    """SQLite-backed briefs keyed by owner, document hash and model, kept across sessions and restarts.
+
+    Like stores, briefs are scoped by owner (an API key fingerprint): each
+    owner's brief is prepared from, and deleted with, that owner's store.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = open_database(path)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(document_briefs)")}
+        if columns and "owner" not in columns:
+            self._db.execute("DROP TABLE document_briefs")  # unscoped briefs; they are prepared again on first use
+        self._db.execute(_SCHEMA)
+        for statement in _INDEXES:
+            self._db.execute(statement)
+
+    def get(self, owner: str, document_hash: str, model: str) -> Optional[DocumentBrief]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT store_name, brief FROM document_briefs WHERE owner = ? AND document_hash = ? AND model = ?",
+                (owner, document_hash, model),
+            ).fetchone()
+        return DocumentBrief.from_dict(row[0], json.loads(row[1])) if row else None
+
+    def has(self, owner: str, document_hash: str, model: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM document_briefs WHERE owner = ? AND document_hash = ? AND model = ?",
+                (owner, document_hash, model),
+            ).fetchone()
+        return row is not None
+
+    def put(self, owner: str, document_hash: str, model: str, brief: DocumentBrief) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO document_briefs VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, document_hash, model, brief.store_name, json.dumps(brief.to_dict()), self._clock()),
+            )
+
+    def forget_store(self, owner: str, store_name: str) -> None:
+        """Drop ``owner``'s briefs prepared from ``store_name``; called when the store is deleted."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM document_briefs WHERE owner = ? AND store_name = ?", (owner, store_name)
+            )
+
+
+def parse_plan(text: str) -> tuple[list[str], list[str]]:
+    """``(outline, questions)`` from the model's JSON reply; empty lists if it is not usable.
+
+    Questions that only differ after ``normalize_prompt`` are kept once, as
+    they share a prepared answer and a suggestion chip.
+    """
+    try:
+        payload = json.loads(_FENCE.sub("", text.strip()))
+    except ValueError:
+        return [], []
+    if not isinstance(payload, dict):
+        return [], []
+
+    def strings(key: str, limit: int, identity: Callable[[str], str]) -> list[str]:
+        values = payload.get(key)
+        if not isinstance(values, list):
+            return []
+        unique: dict[str, str] = {}
+        for value in values:
+            if isinstance(value, str) and (item := " ".join(value.split())):
+                unique.setdefault(identity(item), item)
+        return list(unique.values())[:limit]
+
+    return (
+        strings("outline", Config.DOCUMENT_BRIEF_OUTLINE_MAX, str),
+        strings("questions", Config.DOCUMENT_BRIEF_QUESTIONS, normalize_prompt),
+    )
+
+
+@traced("brief.prepare")
+def prepare_brief(client: genai.Client, store_name: str, model: str) -> DocumentBrief:
+    """Plan the outline and questions, then answer them and the summary request concurrently.
+
+    Raises ``GeminiServiceError`` if the plan fails; a question whose answer
+    fails is left out.
+    """
+    plan = _PLAN_PROMPT.format(outline=Config.DOCUMENT_BRIEF_OUTLINE_MAX, questions=Config.DOCUMENT_BRIEF_QUESTIONS)
+    response = GeminiService.query_file_search(client, [_user(plan)], store_name, model)
+    outline, questions = parse_plan(parse_response(response)[0])
+    summary = normalize_prompt(SUMMARY_PROMPT)
+    prompts = [SUMMARY_PROMPT] + [question for question in questions if normalize_prompt(question) != summary]
+    workers = max(1, min(Config.DOCUMENT_BRIEF_CONCURRENCY, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="document-brief") as executor:
+        # Each answer runs in a copy of the caller's context, keeping its scheduler tenant.
+        futures = [
+            executor.submit(contextvars.copy_context().run, _answer, client, store_name, model, prompt)
+            for prompt in prompts
+        ]
+        answers = [prepared for future in futures if (prepared := future.result()) is not None]
+    return DocumentBrief(store_name, outline, answers)
+
+
+def _answer(client: genai.Client, store_name: str, model: str, prompt: str) -> Optional[PreparedAnswer]:
+    try:
+        response = GeminiService.query_file_search(client, [_user(prompt)], store_name, model)
+    except GeminiServiceError:
+        return None
+    answer, sources = parse_response(response)
+    return PreparedAnswer(prompt, answer, sources) if answer else None
+
+
+def _user(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
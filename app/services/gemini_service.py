@@ -1,15 +1,45 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import hashlib
+import io
+import json
 import random
 import string
 import time
-from typing import Optional
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterator, Mapping, Optional, Sequence, Union
 
+import httpx
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
 from app.core.config import Config
-from app.core.exceptions import GeminiServiceError, OperationTimeoutError
+from app.core.exceptions import GeminiServiceError
+from app.core.telemetry import traced
+from app.services.operation_poller import BackoffPolicy, OperationPoller
+from app.services.request_policy import OPERATIONS_BUCKET, request_policy
+
+# A path on disk, or a seekable binary buffer such as a Streamlit UploadedFile.
+UploadSource = Union[str, io.IOBase]
+# Extra custom_metadata for one upload; strings, numbers and string lists map to
+# string_value, numeric_value and string_list_value.
+UploadMetadata = Mapping[str, Union[str, int, float, Sequence[str]]]
+# ``(file, display_name)`` or ``(file, display_name, metadata)``.
+UploadItem = Union[tuple[UploadSource, str], tuple[UploadSource, str, UploadMetadata]]
+# One store name, or several searched together.
+StoreNames = Union[str, Sequence[str]]
+
+
+@dataclass(frozen=True, slots=True)
+class CachedPrefix:
+    """A cached-content entry holding the first ``length`` contents of a conversation and its tools."""
+
+    name: str
+    model: str
+    length: int
 
 
 class GeminiService:
@@ -26,6 +56,27 @@ class GeminiService:
         return f"{prefix}-{GeminiService.generate_random_id()}"
 
     @staticmethod
+    def api_key_fingerprint(api_key: str) -> str:
+        """Return a stable, non-reversible identifier for an API key."""
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    @traced("gemini.create_client")
+    def create_client(
+        api_key: str,
+        http_client: Optional[httpx.Client] = None,
+        base_url: Optional[str] = None,
+    ) -> genai.Client:
+        """Create a Gemini client, optionally on a shared HTTP connection pool."""
+        if http_client is None and base_url is None:
+            return genai.Client(api_key=api_key)
+        return genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(httpx_client=http_client, base_url=base_url),
+        )
+
+    @staticmethod
+    @traced("gemini.ensure_client")
     def ensure_client(
         api_key: str,
         existing_client: Optional[genai.Client] = None,
@@ -34,92 +85,479 @@ class GeminiService:
         """Ensure a valid Gemini client exists."""
         if existing_client is not None and existing_api_key == api_key:
             return existing_client
-        return genai.Client(api_key=api_key)
+        return GeminiService.create_client(api_key)
 
     @staticmethod
+    @traced("gemini.wait_for_operation")
     def wait_for_operation(
-        client: genai.Client, 
-        operation: types.Operation, 
-        poll_interval: int = Config.POLL_INTERVAL, 
-        timeout: int = Config.UPLOAD_TIMEOUT
+        client: genai.Client,
+        operation: types.Operation,
+        timeout: float = Config.UPLOAD_TIMEOUT,
+        policy: BackoffPolicy = BackoffPolicy(),
     ) -> types.Operation:
         """Wait for a long-running operation to complete."""
-        start = time.time()
-        current = operation
-        while not getattr(current, "done", False):
-            if time.time() - start > timeout:
-                raise OperationTimeoutError("Operation timed out")
-            time.sleep(poll_interval)
-            current = client.operations.get(current)
-        
-        error = getattr(current, "error", None)
-        if error:
-            message = getattr(error, "message", "Operation failed")
-            raise GeminiServiceError(message)
-        return current
+        return GeminiService.wait_for_operations(client, [operation], timeout, policy)[0]
+
+    @staticmethod
+    @traced("gemini.wait_for_operations")
+    def wait_for_operations(
+        client: genai.Client,
+        operations: Sequence[types.Operation],
+        timeout: float = Config.UPLOAD_TIMEOUT,
+        policy: BackoffPolicy = BackoffPolicy(),
+        executor: Optional[Executor] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> list[types.Operation]:
+        """Wait for several long-running operations with one shared adaptive poller."""
+        poller = OperationPoller(
+            client,
+            policy=policy,
+            timeout=timeout,
+            executor=executor,
+            fetch=lambda op: request_policy.call(lambda: client.operations.get(op), OPERATIONS_BUCKET),
+        )
+        completed = poller.wait(operations, on_progress)
+        for op in completed:
+            error = getattr(op, "error", None)
+            if error:
+                raise GeminiServiceError(getattr(error, "message", "Operation failed"))
+        return completed
 
     @staticmethod
+    @traced("gemini.create_file_search_store")
     def create_file_search_store(client: genai.Client, display_name: str) -> types.FileSearchStore:
         """Create a new file search store."""
         try:
-            return client.file_search_stores.create(config={"display_name": display_name})
+            return request_policy.call(
+                lambda: client.file_search_stores.create(config={"display_name": display_name})
+            )
         except Exception as e:
             raise GeminiServiceError(f"Failed to create store: {e}") from e
 
     @staticmethod
+    @traced("gemini.start_upload")
+    def start_upload(
+        client: genai.Client,
+        store_name: str,
+        file: UploadSource,
+        display_name: str,
+        metadata: Optional[UploadMetadata] = None,
+    ) -> types.UploadToFileSearchStoreOperation:
+        """Send a file path or seekable binary buffer to the store without waiting for indexing."""
+        custom_metadata = [
+            {"key": "source", "string_value": "streamlit_upload"},
+            {"key": "timestamp", "numeric_value": int(time.time())},
+        ]
+        for key, value in (metadata or {}).items():
+            if isinstance(value, str):
+                custom_metadata.append({"key": key, "string_value": value})
+            elif isinstance(value, (int, float)):
+                custom_metadata.append({"key": key, "numeric_value": value})
+            else:
+                custom_metadata.append({"key": key, "string_list_value": {"values": list(value)}})
+        config = {
+            "display_name": display_name,
+            "mime_type": "application/pdf",
+            "custom_metadata": custom_metadata,
+        }
+
+        def upload() -> types.UploadToFileSearchStoreOperation:
+            # Rewind on every attempt: a failed try may have consumed the buffer.
+            if isinstance(file, io.IOBase):
+                file.seek(0)
+            return client.file_search_stores.upload_to_file_search_store(
+                file=file,
+                file_search_store_name=store_name,
+                config=config,
+            )
+
+        return request_policy.call(upload)
+
+    @staticmethod
+    @traced("gemini.upload_file_to_store")
     def upload_file_to_store(
         client: genai.Client,
         store_name: str,
-        file_path: str,
+        file_path: UploadSource,
         display_name: str,
     ) -> types.File:
         """Upload a file to the search store."""
         try:
-            upload_operation = client.file_search_stores.upload_to_file_search_store(
-                file=file_path,
-                file_search_store_name=store_name,
-                config={
-                    "display_name": display_name,
-                    "custom_metadata": [
-                        {"key": "source", "string_value": "streamlit_upload"},
-                        {"key": "timestamp", "numeric_value": int(time.time())},
-                    ],
-                },
-            )
+            upload_operation = GeminiService.start_upload(client, store_name, file_path, display_name)
             completed = GeminiService.wait_for_operation(client, upload_operation)
             return completed.response
         except Exception as e:
             raise GeminiServiceError(f"Failed to upload file: {e}") from e
 
     @staticmethod
+    @traced("gemini.upload_files_to_store")
+    def upload_files_to_store(
+        client: genai.Client,
+        store_name: str,
+        files: Sequence[UploadItem],
+        max_workers: int = Config.MAX_UPLOAD_WORKERS,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> list[types.Operation]:
+        """Upload ``(file, display_name[, metadata])`` items concurrently and wait for all to index.
+
+        ``on_progress(done, total)`` reports indexing progress once all uploads are sent.
+        """
+        if not files:
+            return []
+        workers = max(1, min(max_workers, len(files)))
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="store-upload") as executor:
+                # Each upload runs in a copy of the caller's context, keeping its scheduler tenant.
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run, GeminiService.start_upload, client, store_name, *item
+                    )
+                    for item in files
+                ]
+                operations = [future.result() for future in futures]
+                return GeminiService.wait_for_operations(
+                    client, operations, executor=executor, on_progress=on_progress
+                )
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to upload files: {e}") from e
+
+    @staticmethod
+    def build_document_metadata(
+        filename: str,
+        document_hash: str,
+        tags: Sequence[str] = (),
+    ) -> dict[str, Union[str, list[str]]]:
+        """Per-document custom_metadata that ``build_metadata_filter`` can select on."""
+        metadata: dict[str, Union[str, list[str]]] = {"filename": filename, "document_hash": document_hash}
+        if tags:
+            metadata["tags"] = sorted(set(tags))
+        return metadata
+
+    @staticmethod
+    def build_metadata_filter(filenames: Sequence[str] = (), tags: Sequence[str] = ()) -> Optional[str]:
+        """AIP-160 filter restricting retrieval to any of ``filenames`` carrying any of ``tags``.
+
+        Returns None when nothing is selected, so the whole store is searched.
+        Values are double-quoted with quotes and backslashes escaped; non-ASCII
+        characters are kept as they are rather than turned into JSON ``\\u`` escapes.
+        """
+        clauses = []
+        if filenames:
+            clauses.append(" OR ".join(f"filename = {json.dumps(name, ensure_ascii=False)}" for name in filenames))
+        if tags:
+            clauses.append(" OR ".join(f"tags:{json.dumps(tag, ensure_ascii=False)}" for tag in tags))
+        if len(clauses) > 1:
+            clauses = [f"({clause})" for clause in clauses]
+        return " AND ".join(clauses) or None
+
+    @staticmethod
+    def build_query_config(
+        store_names: StoreNames,
+        metadata_filter: Optional[str] = None,
+    ) -> types.GenerateContentConfig:
+        """Build the generation config that enables File Search over one or more stores."""
+        names = [store_names] if isinstance(store_names, str) else list(store_names)
+        return types.GenerateContentConfig(
+            tools=[
+                types.Tool(
+                    file_search=types.FileSearch(
+                        file_search_store_names=names,
+                        metadata_filter=metadata_filter,
+                    )
+                )
+            ]
+        )
+
+    @staticmethod
+    def _request(
+        conversation: list[types.Content],
+        config: types.GenerateContentConfig,
+        cached_prefix: Optional[CachedPrefix],
+        model: str,
+    ) -> dict:
+        """Request arguments, sending only the uncached tail when ``cached_prefix`` was built for ``model``.
+
+        The cache already holds the tool config, which may not be repeated
+        alongside ``cached_content``; fallback models get the full request.
+        """
+        if cached_prefix is None or cached_prefix.model != model:
+            return {"contents": conversation, "config": config}
+        return {
+            "contents": conversation[cached_prefix.length:],
+            "config": types.GenerateContentConfig(cached_content=cached_prefix.name),
+        }
+
+    @staticmethod
+    def partition_stores(
+        store_names: Sequence[str],
+        per_request: int = Config.MAX_STORES_PER_QUERY,
+    ) -> list[list[str]]:
+        """Split stores into groups small enough to search in a single request."""
+        names = list(dict.fromkeys(store_names))
+        size = max(1, per_request)
+        return [names[i:i + size] for i in range(0, len(names), size)]
+
+    @staticmethod
+    @traced("gemini.query_stores")
+    def query_stores(
+        client: genai.Client,
+        conversation: list[types.Content],
+        store_names: Sequence[str],
+        model: str,
+        max_concurrency: int = Config.MAX_QUERY_FANOUT,
+        per_request: int = Config.MAX_STORES_PER_QUERY,
+        metadata_filter: Optional[str] = None,
+        cached_prefix: Optional[CachedPrefix] = None,
+    ) -> list[types.GenerateContentResponse]:
+        """Query many stores, one request per ``partition_stores`` group, run concurrently.
+
+        Returns the responses of the groups that answered, in group order;
+        raises only if every group failed. Merge them with ``merge_answers``.
+        ``cached_prefix`` is only used when all stores fit in one request.
+        """
+        groups = GeminiService.partition_stores(store_names, per_request)
+        if len(groups) <= 1:
+            return [
+                GeminiService.query_file_search(
+                    client, conversation, groups[0] if groups else [], model, metadata_filter, cached_prefix
+                )
+            ]
+        results: dict[int, types.GenerateContentResponse] = {}
+        failures: list[Exception] = []
+        workers = max(1, min(max_concurrency, len(groups)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-fanout") as executor:
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    GeminiService.query_file_search,
+                    client,
+                    conversation,
+                    group,
+                    model,
+                    metadata_filter,
+                ): index
+                for index, group in enumerate(groups)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except GeminiServiceError as exc:
+                    failures.append(exc)
+        if not results:
+            raise failures[0]
+        return [results[index] for index in sorted(results)]
+
+    @staticmethod
+    @traced("gemini.aquery_stores")
+    async def aquery_stores(
+        client: genai.Client,
+        conversation: list[types.Content],
+        store_names: Sequence[str],
+        model: str,
+        max_concurrency: int = Config.MAX_QUERY_FANOUT,
+        per_request: int = Config.MAX_STORES_PER_QUERY,
+        metadata_filter: Optional[str] = None,
+    ) -> list[types.GenerateContentResponse]:
+        """Async variant of ``query_stores``."""
+        limit = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def query(group: list[str]) -> types.GenerateContentResponse:
+            async with limit:
+                return await GeminiService.aquery_file_search(client, conversation, group, model, metadata_filter)
+
+        groups = GeminiService.partition_stores(store_names, per_request) or [[]]
+        outcomes = await asyncio.gather(*(query(group) for group in groups), return_exceptions=True)
+        responses = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+        if not responses:
+            raise outcomes[0]
+        return responses
+
+    @staticmethod
+    @traced("gemini.query_file_search")
     def query_file_search(
         client: genai.Client,
         conversation: list[types.Content],
-        store_name: str,
+        store_name: StoreNames,
         model: str,
+        metadata_filter: Optional[str] = None,
+        cached_prefix: Optional[CachedPrefix] = None,
     ) -> types.GenerateContentResponse:
-        """Query the file search store."""
+        """Query the file search store, with retries, model fallback and optional hedging."""
+        config = GeminiService.build_query_config(store_name, metadata_filter)
         try:
-            return client.models.generate_content(
-                model=model,
-                contents=conversation,
-                config=types.GenerateContentConfig(
-                    tools=[
-                        types.Tool(
-                            file_search=types.FileSearch(
-                                file_search_store_names=[store_name],
-                            )
-                        )
-                    ]
+            return request_policy.call_model(
+                model,
+                lambda name: client.models.generate_content(
+                    model=name, **GeminiService._request(conversation, config, cached_prefix, name)
                 ),
+                hedge=True,
             )
         except Exception as e:
             raise GeminiServiceError(f"Failed to query model: {e}") from e
 
     @staticmethod
+    @traced("gemini.stream_file_search")
+    def stream_file_search(
+        client: genai.Client,
+        conversation: list[types.Content],
+        store_name: StoreNames,
+        model: str,
+        metadata_filter: Optional[str] = None,
+        cached_prefix: Optional[CachedPrefix] = None,
+    ) -> Iterator[types.GenerateContentResponse]:
+        """Query the file search store, yielding response chunks as they arrive."""
+        config = GeminiService.build_query_config(store_name, metadata_filter)
+        try:
+            yield from request_policy.stream_model(
+                model,
+                lambda name: client.models.generate_content_stream(
+                    model=name, **GeminiService._request(conversation, config, cached_prefix, name)
+                ),
+            )
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to query model: {e}") from e
+
+    @staticmethod
+    @traced("gemini.aquery_file_search")
+    async def aquery_file_search(
+        client: genai.Client,
+        conversation: list[types.Content],
+        store_name: StoreNames,
+        model: str,
+        metadata_filter: Optional[str] = None,
+    ) -> types.GenerateContentResponse:
+        """Query the file search store on the SDK's async client."""
+        config = GeminiService.build_query_config(store_name, metadata_filter)
+        try:
+            return await request_policy.acall_model(
+                model,
+                lambda name: client.aio.models.generate_content(model=name, contents=conversation, config=config),
+                hedge=True,
+            )
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to query model: {e}") from e
+
+    @staticmethod
+    @traced("gemini.astream_file_search")
+    async def astream_file_search(
+        client: genai.Client,
+        conversation: list[types.Content],
+        store_name: StoreNames,
+        model: str,
+        metadata_filter: Optional[str] = None,
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        """Async variant of ``stream_file_search``."""
+        config = GeminiService.build_query_config(store_name, metadata_filter)
+        try:
+            async for chunk in request_policy.astream_model(
+                model,
+                lambda name: client.aio.models.generate_content_stream(model=name, contents=conversation, config=config),
+            ):
+                yield chunk
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to query model: {e}") from e
+
+    @staticmethod
+    @traced("gemini.summarize_conversation")
+    def summarize_conversation(
+        client: genai.Client,
+        model: str,
+        previous_summary: str,
+        turns: list[types.Content],
+    ) -> str:
+        """Fold older conversation turns into a short rolling summary."""
+        transcript = "\n".join(
+            f"{content.role}: {''.join(part.text or '' for part in content.parts or [])}"
+            for content in turns
+        )
+        prompt = (
+            "Update the running summary of this conversation about the user's documents. "
+            "Keep facts, names and open questions; stay under 200 words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        try:
+            response = request_policy.call_model(
+                model, lambda name: client.models.generate_content(model=name, contents=prompt)
+            )
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to summarize conversation: {e}") from e
+        return (response.text or previous_summary).strip()
+
+    @staticmethod
+    @traced("gemini.create_context_cache")
+    def create_context_cache(
+        client: genai.Client,
+        model: str,
+        contents: Sequence[types.Content],
+        store_names: StoreNames,
+        metadata_filter: Optional[str] = None,
+        ttl: int = Config.CONTEXT_CACHE_TTL,
+    ) -> CachedPrefix:
+        """Cache a conversation prefix together with the File Search tool config."""
+        config = types.CreateCachedContentConfig(
+            contents=list(contents),
+            tools=GeminiService.build_query_config(store_names, metadata_filter).tools,
+            ttl=f"{ttl}s",
+        )
+        try:
+            cache = request_policy.call(lambda: client.caches.create(model=model, config=config))
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to create context cache: {e}") from e
+        return CachedPrefix(cache.name, model, len(contents))
+
+    @staticmethod
+    @traced("gemini.refresh_context_cache")
+    def refresh_context_cache(client: genai.Client, name: str, ttl: int = Config.CONTEXT_CACHE_TTL) -> None:
+        """Extend a context cache's expiry to ``ttl`` seconds from now."""
+        try:
+            request_policy.call(
+                lambda: client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+            )
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to refresh context cache: {e}") from e
+
+    @staticmethod
+    @traced("gemini.delete_context_cache")
+    def delete_context_cache(client: genai.Client, name: str) -> None:
+        """Delete a context cache."""
+        try:
+            request_policy.call(lambda: client.caches.delete(name=name))
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to delete context cache: {e}") from e
+
+    @staticmethod
+    @traced("gemini.store_exists")
+    def store_exists(client: genai.Client, store_name: str) -> Optional[bool]:
+        """Check whether a file search store is still available remotely.
+
+        Only a 404 means the store is gone (``False``). ``None`` means it could
+        not be told, e.g. the API is down or throttling, and callers must keep
+        the store rather than forget it.
+        """
+        try:
+            request_policy.call(lambda: client.file_search_stores.get(name=store_name))
+        except errors.APIError as e:
+            return False if e.code == 404 else None
+        except Exception:
+            return None
+        return True
+
+    @staticmethod
+    @traced("gemini.cleanup_store")
     def cleanup_store(client: genai.Client, store_name: str) -> None:
         """Delete the file search store."""
         try:
-            client.file_search_stores.delete(name=store_name, config={"force": True})
+            request_policy.call(lambda: client.file_search_stores.delete(name=store_name, config={"force": True}))
+        except Exception as e:
+            raise GeminiServiceError(f"Failed to cleanup store: {e}") from e
+
+    @staticmethod
+    @traced("gemini.acleanup_store")
+    async def acleanup_store(client: genai.Client, store_name: str) -> None:
+        """Delete the file search store on the SDK's async client."""
+        try:
+            await request_policy.acall(
+                lambda: client.aio.file_search_stores.delete(name=store_name, config={"force": True})
+            )
         except Exception as e:
             raise GeminiServiceError(f"Failed to cleanup store: {e}") from e
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Optional, Sequence
+
+from google import genai
+
+from app.core.config import Config
+from app.core.exceptions import GeminiServiceError
+from app.core.telemetry import telemetry
+from app.services.document_brief import BriefStore, prepare_brief
+from app.services.gemini_service import GeminiService, UploadItem, UploadSource
+from app.services.page_index import PageIndexStore
+from app.services.pdf_preprocessor import PreprocessedDocument
+from app.services.pdf_service import PDFService
+from app.services.scheduler import Priority, scheduler
+from app.services.store_cache import StoreCache
+from app.services.store_registry import StoreRegistry
+
+
+class JobStatus(str, Enum):
+    SAVED = "saved"
+    PREPROCESSING = "preprocessing"
+    UPLOADING = "uploading"
+    INDEXING = "indexing"
+    DONE = "done"
+    FAILED = "failed"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobStatus.DONE, JobStatus.FAILED)
+
+
+@dataclass(slots=True)
+class IngestionJob:
+    id: str
+    owner: str
+    document_hash: str
+    filenames: list[str]
+    session_id: Optional[str] = None
+    model: Optional[str] = None
+    status: JobStatus = JobStatus.SAVED
+    indexed: int = 0
+    total: int = 0
+    store_name: Optional[str] = None
+    error: Optional[str] = None
+    warnings: list[str] = field(default_factory=list)
+    bytes_saved: int = 0
+    cancelled: bool = False
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def progress(self) -> float:
+        return self.indexed / self.total if self.total else 0.0
+
+
+class IngestionQueue:
+    """Background ingestion worker with a bounded number of concurrent jobs.
+
+    ``submit`` returns a job id immediately; the job creates a store, uploads
+    every document and waits for indexing on a worker thread. Sessions read
+    status snapshots on each rerun via ``get``. Finished jobs are kept for
+    ``Config.INGESTION_JOB_RETENTION`` seconds. With a ``page_index``, the
+    worker also writes the documents' page index once the job is done, and
+    with ``briefs`` it then queues the document brief for the job's model.
+    Briefs are prepared on a pool of their own, so they never hold up uploads.
+    """
+
+    def __init__(
+        self,
+        store_cache: StoreCache,
+        max_concurrent_jobs: int = Config.MAX_CONCURRENT_INGESTIONS,
+        registry: Optional[StoreRegistry] = None,
+        page_index: Optional[PageIndexStore] = None,
+        briefs: Optional[BriefStore] = None,
+    ) -> None:
+        self._store_cache = store_cache
+        self._registry = registry
+        self._page_index = page_index
+        self._briefs = briefs
+        self._briefing: set[tuple[str, str, str]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="ingestion")
+        self._brief_executor = ThreadPoolExecutor(
+            max_workers=Config.DOCUMENT_BRIEF_WORKERS, thread_name_prefix="ingestion-brief"
+        )
+        self._lock = threading.Lock()
+        self._jobs: dict[str, IngestionJob] = {}
+        self._preprocess_pool: Optional[ProcessPoolExecutor] = None
+
+    def submit(
+        self,
+        client: genai.Client,
+        owner: str,
+        document_hash: str,
+        files: Sequence[UploadItem],
+        saved_paths: Sequence[str] = (),
+        session_id: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> str:
+        job = IngestionJob(
+            id=uuid.uuid4().hex,
+            owner=owner,
+            document_hash=document_hash,
+            filenames=[item[1] for item in files],
+            session_id=session_id,
+            model=model,
+            total=len(files),
+        )
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job.id, client, list(files), list(saved_paths))
+        return job.id
+
+    def get(self, job_id: Optional[str]) -> Optional[IngestionJob]:
+        """Return a snapshot of the job, safe to read outside the queue's lock."""
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job, filenames=list(job.filenames), warnings=list(job.warnings)) if job else None
+
+    def prepare_brief(
+        self,
+        client: genai.Client,
+        tenant: str,
+        owner: str,
+        document_hash: str,
+        store_name: str,
+        model: str,
+    ) -> None:
+        """Prepare the brief of ``owner``'s indexed store in the background, unless it exists or is underway."""
+        if not self._brief_needed(owner, document_hash, model):
+            return
+
+        def run() -> None:
+            with scheduler.tenant(tenant, Priority.BACKGROUND):
+                self._prepare_brief(client, owner, document_hash, store_name, model)
+
+        self._brief_executor.submit(run)
+
+    def cancel(self, job_id: Optional[str]) -> None:
+        """Mark a job as abandoned; its store is deleted once the worker notices."""
+        with self._lock:
+            job = self._jobs.get(job_id or "")
+            if job is not None:
+                job.cancelled = True
+
+    def _update(self, job_id: str, **changes: object) -> IngestionJob:
+        with self._lock:
+            job = self._jobs[job_id]
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+            return job
+
+    def _run(
+        self,
+        job_id: str,
+        client: genai.Client,
+        files: list[UploadItem],
+        saved_paths: list[str],
+    ) -> None:
+        job = self.get(job_id)
+        tenant = job.session_id or job.owner
+        # Ingestion yields to interactive queries and counts against its own session's share.
+        with scheduler.tenant(tenant, Priority.BACKGROUND):
+            self._ingest(job_id, client, files, saved_paths)
+        job = self.get(job_id)
+        # After the uploads' temp files are gone; the brief only needs the store.
+        if job.status is JobStatus.DONE and job.model:
+            self.prepare_brief(client, tenant, job.owner, job.document_hash, job.store_name, job.model)
+
+    def _ingest(
+        self,
+        job_id: str,
+        client: genai.Client,
+        files: list[UploadItem],
+        saved_paths: list[str],
+    ) -> None:
+        store_name: Optional[str] = None
+        documents: list[PreprocessedDocument] = []
+        try:
+            items: Sequence[UploadItem] = files
+            if PDFService.preprocessing_enabled():
+                self._update(job_id, status=JobStatus.PREPROCESSING)
+                prepared = PDFService.preprocess_files(files, self._preprocess_executor())
+                # Temp files from preprocessing are removed with the saved uploads.
+                saved_paths.extend(prepared.temp_paths)
+                items = prepared.items
+                documents = prepared.documents
+                self._update(
+                    job_id,
+                    bytes_saved=prepared.bytes_saved,
+                    warnings=[f"{doc.display_name}: {doc.error}" for doc in prepared.documents if doc.error],
+                )
+            self._update(job_id, status=JobStatus.UPLOADING)
+            store = GeminiService.create_file_search_store(client, GeminiService.build_store_name())
+            store_name = store.name
+            job = self._update(job_id, store_name=store_name)
+            if self._registry is not None:
+                # Registered before uploading so a crash mid-job leaves a reapable record.
+                self._registry.register(store_name, job.owner, job.document_hash, list(job.filenames), job.session_id)
+            GeminiService.upload_files_to_store(
+                client,
+                store_name,
+                items,
+                on_progress=lambda done, total: self._update(
+                    job_id, status=JobStatus.INDEXING, indexed=done, total=total
+                ),
+            )
+            job = self._update(job_id)
+            if job.cancelled:
+                GeminiService.cleanup_store(client, store_name)
+                self._forget(store_name)
+                self._update(job_id, status=JobStatus.FAILED, error="cancelled")
+                return
+            self._store_cache.remember(client, job.owner, job.document_hash, store_name)
+            if self._registry is not None:
+                self._registry.mark_ready(store_name, sum(_source_size(source) for source, *_ in items))
+            self._update(job_id, status=JobStatus.DONE)
+            # After DONE, so the session can start asking while pages are indexed.
+            self._index_pages(job.document_hash, files, documents)
+        except Exception as exc:  # any failure must leave the job in a terminal state
+            if store_name:
+                try:
+                    GeminiService.cleanup_store(client, store_name)
+                    self._forget(store_name)
+                except GeminiServiceError:
+                    pass  # left in the registry for the reaper
+            self._update(job_id, status=JobStatus.FAILED, error=str(exc))
+        finally:
+            PDFService.cleanup_local_files(saved_paths)
+
+    def _index_pages(
+        self,
+        document_hash: str,
+        files: list[UploadItem],
+        documents: list[PreprocessedDocument],
+    ) -> None:
+        if self._page_index is None or not Config.PAGE_INDEX_ENABLED or self._page_index.exists(document_hash):
+            return
+        try:
+            pages = PDFService.extract_document_pages(files, documents, self._preprocess_executor)
+            if pages:
+                self._page_index.write(document_hash, pages)
+        except Exception:  # sources are still shown, just without page numbers
+            telemetry.increment("app_page_index_failures_total")
+
+    def _brief_needed(self, owner: str, document_hash: str, model: str) -> bool:
+        if self._briefs is None or not Config.DOCUMENT_BRIEF_ENABLED:
+            return False
+        with self._lock:
+            if (owner, document_hash, model) in self._briefing:
+                return False
+        return not self._briefs.has(owner, document_hash, model)
+
+    def _prepare_brief(
+        self, client: genai.Client, owner: str, document_hash: str, store_name: str, model: str
+    ) -> None:
+        key = (owner, document_hash, model)
+        with self._lock:
+            if key in self._briefing:
+                return
+            self._briefing.add(key)
+        try:
+            brief = prepare_brief(client, store_name, model)
+            # The store may have been deleted while the brief was prepared.
+            if self._registry is None or self._registry.get(store_name) is not None:
+                self._briefs.put(owner, document_hash, model, brief)
+        except Exception:  # the chat works without a brief, just not instantly
+            telemetry.increment("app_document_brief_failures_total")
+        finally:
+            with self._lock:
+                self._briefing.discard(key)
+
+    def _forget(self, store_name: str) -> None:
+        if self._registry is not None:
+            self._registry.forget(store_name)
+
+    def _preprocess_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._preprocess_pool is None:
+                self._preprocess_pool = PDFService.create_preprocess_pool()
+            return self._preprocess_pool
+
+    def _prune(self) -> None:
+        cutoff = time.time() - Config.INGESTION_JOB_RETENTION
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status.finished and job.updated_at < cutoff
+        ]:
+            del self._jobs[job_id]
+
+
+def _source_size(source: UploadSource) -> int:
+    if isinstance(source, str):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return 0
+    if isinstance(source, io.IOBase) and source.seekable():
+        return source.seek(0, io.SEEK_END)
+    return 0
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import random
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence
+
+from app.core.config import Config
+from app.core.exceptions import OperationTimeoutError
+from app.core.telemetry import telemetry
+
+
+@dataclass(frozen=True, slots=True)
+class BackoffPolicy:
+    """Exponential backoff with multiplicative jitter for status polling."""
+
+    initial: float = Config.POLL_INITIAL_INTERVAL
+    multiplier: float = Config.POLL_BACKOFF_MULTIPLIER
+    maximum: float = Config.POLL_MAX_INTERVAL
+    jitter: float = Config.POLL_JITTER
+
+    def delay(self, attempt: int, rng: Callable[[], float] = random.random) -> float:
+        base = min(self.maximum, self.initial * (self.multiplier ** attempt))
+        if self.jitter:
+            base *= 1 + self.jitter * (2 * rng() - 1)
+        return max(0.0, min(self.maximum, base))
+
+
+@dataclass(slots=True)
+class _Tracked:
+    operation: Any
+    attempt: int = 0
+    next_due: float = 0.0
+
+
+class OperationPoller:
+    """Track many long-running operations and poll each on its own backoff schedule.
+
+    Every round only the operations whose next check is due are refreshed, and
+    those checks are issued together (concurrently when an executor is given).
+    The poller never sleeps past the overall deadline.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        policy: BackoffPolicy = BackoffPolicy(),
+        timeout: float = Config.UPLOAD_TIMEOUT,
+        executor: Optional[Executor] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Callable[[], float] = random.random,
+        fetch: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        self._client = client
+        self._fetch = fetch or client.operations.get
+        self._policy = policy
+        self._timeout = timeout
+        self._executor = executor
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+        self.poll_calls = 0
+
+    def wait(
+        self,
+        operations: Sequence[Any],
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> list[Any]:
+        """Block until every operation is done and return their final states in order.
+
+        ``on_progress(done, total)`` is called whenever the number of completed
+        operations changes.
+        """
+        start = self._clock()
+        deadline = start + self._timeout
+        tracked = [
+            _Tracked(op, next_due=start + self._policy.delay(0, self._rng)) for op in operations
+        ]
+
+        reported = -1
+        while True:
+            pending = [item for item in tracked if not getattr(item.operation, "done", False)]
+            if on_progress is not None and len(tracked) - len(pending) != reported:
+                reported = len(tracked) - len(pending)
+                on_progress(reported, len(tracked))
+            if not pending:
+                return [item.operation for item in tracked]
+
+            now = self._clock()
+            if now >= deadline:
+                raise OperationTimeoutError("Operation timed out")
+
+            next_due = min(item.next_due for item in pending)
+            if next_due > now:
+                self._sleep(min(next_due, deadline) - now)
+                continue
+
+            due = [item for item in pending if item.next_due <= now]
+            for item, refreshed in zip(due, self._refresh([item.operation for item in due])):
+                item.operation = refreshed
+                item.attempt += 1
+                item.next_due = self._clock() + self._policy.delay(item.attempt, self._rng)
+
+    def _refresh(self, operations: list[Any]) -> list[Any]:
+        self.poll_calls += len(operations)
+        telemetry.increment("app_operation_polls_total", len(operations))
+        with telemetry.span("gemini.poll", operations=len(operations)):
+            if self._executor is None or len(operations) == 1:
+                return [self._fetch(op) for op in operations]
+            return list(self._executor.map(self._fetch, operations))
@@ -0,0 +1,343 @@
+"""Offline mapping of retrieved passages back to the PDF pages they came from.
+
+At ingestion time each document set gets one index file, keyed by its
+document hash. The file holds every page's extracted text and an inverted
+index from word 3-gram hashes to the pages (and the place on each page)
+they occur. It is memory-mapped when read, so resolving a grounding chunk
+takes a few binary searches over shared pages instead of re-reading the
+PDF or calling the API.
+
+File layout (little-endian, sections 4-byte aligned)::
+
+    magic | header (n_keys, n_postings, n_pages, text_bytes, meta_bytes)
+    keys[n_keys] u32          sorted unique 3-gram hashes
+    offsets[n_keys + 1] u32   each key's slice of postings
+    postings[n_postings] u32  page ids, ascending per key
+    positions[n_postings] u32 character offset of the key's first occurrence on that page
+    text_offsets[n_pages + 1] u32
+    text                      UTF-8 page texts, back to back
+    meta                      JSON: documents and their page ranges
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional, Sequence
+
+from app.core.config import Config
+from app.core.telemetry import telemetry
+from app.utils.sources import SourceChunk
+
+_MAGIC = b"PGIDX\x00\x02\x00"
+_HEADER = struct.Struct("<5I")
+_WORD = re.compile(r"\w+")
+_TRIGRAM = re.compile(r"\w+\W+\w+\W+\w+")
+
+
+@dataclass(frozen=True, slots=True)
+class DocumentPages:
+    """Extracted text of one uploaded document, and the names its parts were uploaded under."""
+
+    name: str
+    page_texts: Sequence[str]
+    # (display name, first page, last page), 1-based, for documents uploaded in page ranges
+    parts: Sequence[tuple[str, int, int]] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class PageMatch:
+    document: str
+    pages: tuple[int, ...]
+    # Page text around the passage; ``highlight`` is the part that matched it.
+    before: str = ""
+    highlight: str = ""
+    after: str = ""
+
+
+PageLocator = Callable[[SourceChunk], Optional[PageMatch]]
+
+
+def _shingles(words: Sequence[str]) -> list[int]:
+    """Hash of every word 3-gram: one CRC per word, combined order-sensitively."""
+    hashes = [zlib.crc32(word.encode("utf-8")) for word in words]
+    return [
+        (a * 0x9E3779B1 + b * 0x85EBCA77 + c) & 0xFFFFFFFF for a, b, c in zip(hashes, hashes[1:], hashes[2:])
+    ]
+
+
+def _words(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def _first_positions(text: str) -> dict[int, int]:
+    """Each 3-gram on a page, mapped to the character offset where it first starts."""
+    matches = list(_WORD.finditer(text))
+    positions: dict[int, int] = {}
+    for match, key in zip(matches, _shingles([match.group().lower() for match in matches])):
+        positions.setdefault(key, match.start())
+    return positions
+
+
+def write_page_index(path: str, documents: Sequence[DocumentPages]) -> None:
+    """Build the index for ``documents`` and write it atomically to ``path``."""
+    postings: dict[int, list[tuple[int, int]]] = {}
+    texts: list[bytes] = []
+    meta: dict[str, list] = {"documents": [], "ranges": []}
+    page_id = 0
+    for document in documents:
+        first = page_id
+        for text in document.page_texts:
+            for key, position in _first_positions(text).items():
+                postings.setdefault(key, []).append((page_id, position))
+            texts.append(text.encode("utf-8", "replace"))
+            page_id += 1
+        meta["documents"].append([document.name, first, len(document.page_texts)])
+        # Whole-document and per-part names resolve a chunk's title to a page range.
+        meta["ranges"].append([document.name, first, page_id])
+        for part_name, start, end in document.parts:
+            meta["ranges"].append([part_name, first + start - 1, first + end])
+
+    keys = array("I", sorted(postings))
+    offsets = array("I", [0])
+    flat = array("I")
+    positions = array("I")
+    for key in keys:
+        for page, position in postings[key]:
+            flat.append(page)
+            positions.append(position)
+        offsets.append(len(flat))
+    text_offsets = array("I", [0])
+    for blob in texts:
+        text_offsets.append(text_offsets[-1] + len(blob))
+    meta_blob = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    text_blob = b"".join(texts)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(_MAGIC)
+        handle.write(_HEADER.pack(len(keys), len(flat), len(texts), len(text_blob), len(meta_blob)))
+        for section in (keys, offsets, flat, positions, text_offsets):
+            handle.write(section.tobytes())
+        handle.write(_padded(text_blob))
+        handle.write(meta_blob)
+    os.replace(temp_path, path)
+
+
+def _padded(blob: bytes) -> bytes:
+    return blob + b"\x00" * (-len(blob) % 4)
+
+
+class PageIndex:
+    """Read-only view of one index file; safe to share across threads."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[: len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"Not a page index: {path}")
+        n_keys, n_postings, n_pages, text_bytes, meta_bytes = _HEADER.unpack_from(view, len(_MAGIC))
+        position = len(_MAGIC) + _HEADER.size
+
+        def section(count: int) -> memoryview:
+            nonlocal position
+            start, position = position, position + 4 * count
+            return view[start:position].cast("I")
+
+        self._keys = section(n_keys)
+        self._offsets = section(n_keys + 1)
+        self._postings = section(n_postings)
+        self._positions = section(n_postings)
+        self._text_offsets = section(n_pages + 1)
+        self._text_start = position
+        meta_start = position + text_bytes + (-text_bytes % 4)
+        meta = json.loads(bytes(view[meta_start : meta_start + meta_bytes]))
+        self.page_count = n_pages
+        self._documents: list[tuple[str, int, int]] = [tuple(item) for item in meta["documents"]]
+        self._firsts = [first for _, first, _ in self._documents]
+        self._ranges: dict[str, tuple[int, int]] = {name: (start, end) for name, start, end in meta["ranges"]}
+        self._cache: OrderedDict[tuple[str, str], Optional[PageMatch]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def locate(self, title: str, text: str) -> Optional[PageMatch]:
+        """The page(s) a retrieved passage came from, or None if it is not in these documents."""
+        key = (title, text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        match = self._locate(title, text)
+        with self._lock:
+            self._cache[key] = match
+            if len(self._cache) > Config.PAGE_INDEX_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return match
+
+    def page_text(self, page_id: int) -> str:
+        start = self._text_start + self._text_offsets[page_id]
+        end = self._text_start + self._text_offsets[page_id + 1]
+        return self._map[start:end].decode("utf-8", "replace")
+
+    def _locate(self, title: str, text: str) -> Optional[PageMatch]:
+        shingles = _shingles(_words(text))
+        if not shingles:
+            return None
+        low, high = self._ranges.get(title, (0, self.page_count))
+        # An even sample of the passage is enough to vote; boilerplate repeated
+        # on many pages (headers, footers) carries no signal and is skipped.
+        step = max(1, len(shingles) // Config.PAGE_INDEX_SAMPLE)
+        sample = shingles[::step]
+        common = max(8, (high - low) // 4)
+        votes: Counter[int] = Counter()
+        hits: dict[int, list[int]] = {}
+        for key in sample:
+            position = bisect.bisect_left(self._keys, key)
+            if position == len(self._keys) or self._keys[position] != key:
+                continue
+            begin, end = self._offsets[position], self._offsets[position + 1]
+            if end - begin > common:
+                continue
+            for page, offset in zip(self._postings[begin:end], self._positions[begin:end]):
+                if low <= page < high:
+                    votes[page] += 1
+                    hits.setdefault(page, []).append(offset)
+        if not votes:
+            return None
+        best, best_votes = votes.most_common(1)[0]
+        if best_votes < max(2, len(sample) * Config.PAGE_INDEX_MIN_OVERLAP):
+            return None
+        # A passage that runs over a page break votes for both pages.
+        first = last = best
+        while votes.get(first - 1, 0) * 3 >= best_votes:
+            first -= 1
+        while votes.get(last + 1, 0) * 3 >= best_votes:
+            last += 1
+        document_index = bisect.bisect_right(self._firsts, best) - 1
+        name, start, count = self._documents[document_index]
+        pages = tuple(page - start + 1 for page in range(max(first, start), min(last, start + count - 1) + 1))
+        return PageMatch(name, pages, *self._excerpt(best, hits[best], len(text)))
+
+    def _excerpt(self, page_id: int, offsets: list[int], length: int) -> tuple[str, str, str]:
+        """Page text around the densest cluster of matched 3-grams, split for highlighting."""
+        page = self.page_text(page_id)
+        # Offsets are each 3-gram's first occurrence on the page, so a phrase
+        # repeated elsewhere can point away from the passage: keep the most
+        # hits that fit in a passage-sized window.
+        offsets = sorted(offsets)
+        best_start = best_end = 0
+        low = 0
+        for high, offset in enumerate(offsets):
+            while offset - offsets[low] > length:
+                low += 1
+            if high - low > best_end - best_start:
+                best_start, best_end = low, high
+        start = offsets[best_start]
+        trigram = _TRIGRAM.match(page, offsets[best_end])
+        end = trigram.end() if trigram else offsets[best_end]
+        end = min(end, start + Config.SOURCE_PREVIEW_CHARS)
+        context = Config.PAGE_INDEX_EXCERPT_CONTEXT
+        before = page[max(0, start - context) : start]
+        after = page[end : end + context]
+        return (
+            ("…" if start > context else "") + " ".join(before.split()),
+            " ".join(page[start:end].split()),
+            " ".join(after.split()) + ("…" if end + context < len(page) else ""),
+        )
+
+
+class PageIndexStore:
+    """Index files under one directory, opened on demand and kept mapped (LRU).
+
+    Evicted or rebuilt indexes are dropped rather than closed, so a thread
+    still reading one is unaffected; the mapping goes away with the last
+    reference.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_open: int = Config.PAGE_INDEX_MAX_OPEN,
+        max_age: float = Config.PAGE_INDEX_MAX_AGE,
+    ) -> None:
+        self._directory = directory
+        self._max_open = max_open
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._open: OrderedDict[str, PageIndex] = OrderedDict()
+
+    def path(self, document_hash: str) -> str:
+        return os.path.join(self._directory, f"{document_hash}.pgidx")
+
+    def exists(self, document_hash: str) -> bool:
+        return os.path.exists(self.path(document_hash))
+
+    def write(self, document_hash: str, documents: Sequence[DocumentPages]) -> None:
+        start = time.perf_counter()
+        write_page_index(self.path(document_hash), documents)
+        telemetry.observe("app_page_index_build_seconds", time.perf_counter() - start)
+        with self._lock:
+            self._open.pop(document_hash, None)
+        self._prune()
+
+    def get(self, document_hash: str) -> Optional[PageIndex]:
+        with self._lock:
+            index = self._open.get(document_hash)
+            if index is not None:
+                self._open.move_to_end(document_hash)
+                return index
+        path = self.path(document_hash)
+        try:
+            index = PageIndex(path)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)  # in use: keep it past the age limit
+        except OSError:
+            pass  # e.g. a read-only cache dir; the index is still usable
+        with self._lock:
+            self._open[document_hash] = index
+            if len(self._open) > self._max_open:
+                self._open.popitem(last=False)
+        return index
+
+    def locator(self, document_hashes: Iterable[Optional[str]]) -> PageLocator:
+        """Resolve chunks against the indexes of ``document_hashes``, in order."""
+        hashes = [document_hash for document_hash in dict.fromkeys(document_hashes) if document_hash]
+
+        def locate(chunk: SourceChunk) -> Optional[PageMatch]:
+            for document_hash in hashes:
+                index = self.get(document_hash)
+                if index is None:
+                    continue
+                match = index.locate(chunk.title, chunk.text)
+                if match is not None:
+                    return match
+            return None
+
+        return locate
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self._max_age
+        try:
+            entries = list(os.scandir(self._directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.name.endswith(".pgidx") and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,197 @@
+"""Client-side PDF preprocessing, run in worker processes.
+
+Kept free of Streamlit imports so spawned workers start quickly. Requires the
+optional ``pdf`` extra (``pypdf`` and ``pillow``); ``AVAILABLE`` is False
+without it and callers upload the original files unchanged.
+"""
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.core.config import Config
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # optional dependency
+    PdfReader = PdfWriter = None  # type: ignore[assignment,misc]
+
+AVAILABLE = PdfReader is not None
+
+
+@dataclass(frozen=True, slots=True)
+class PreprocessOptions:
+    split_pages: int = Config.PDF_SPLIT_PAGES
+    image_max_dimension: int = Config.PDF_IMAGE_MAX_DIMENSION
+    image_quality: int = Config.PDF_IMAGE_QUALITY
+    extract_text: bool = True
+
+
+@dataclass(slots=True)
+class PdfPart:
+    """One file to upload: the whole document or a contiguous page range of it."""
+
+    path: str
+    display_name: str
+    page_start: int
+    page_end: int
+    size: int
+
+
+@dataclass(slots=True)
+class PreprocessedDocument:
+    source_path: str
+    display_name: str
+    original_size: int
+    total_pages: int = 0
+    page_texts: list[str] = field(default_factory=list)
+    parts: list[PdfPart] = field(default_factory=list)
+    images_resampled: int = 0
+    error: Optional[str] = None
+
+    @property
+    def processed_size(self) -> int:
+        return sum(part.size for part in self.parts)
+
+    @property
+    def temp_paths(self) -> list[str]:
+        """Files created by preprocessing that the caller must clean up."""
+        return [part.path for part in self.parts if part.path != self.source_path]
+
+
+def page_count(path: str) -> int:
+    """Number of pages, or 0 when the file cannot be parsed."""
+    try:
+        return len(_open(path).pages)
+    except Exception:
+        return 0
+
+
+def page_ranges(total_pages: int, split_pages: int) -> list[tuple[int, int]]:
+    """Zero-based ``[start, end)`` ranges of at most ``split_pages`` pages."""
+    if not split_pages or total_pages <= split_pages:
+        return [(0, total_pages)]
+    return [(start, min(start + split_pages, total_pages)) for start in range(0, total_pages, split_pages)]
+
+
+@dataclass(slots=True)
+class RangeResult:
+    part: Optional[PdfPart]
+    page_texts: list[str]
+    images_resampled: int = 0
+    error: Optional[str] = None
+
+
+def preprocess_range(
+    path: str,
+    display_name: str,
+    start: int,
+    end: int,
+    total_pages: int,
+    options: PreprocessOptions = PreprocessOptions(),
+) -> RangeResult:
+    """Extract text from and rewrite one page range; the unit of work for the process pool."""
+    try:
+        reader = _open(path)
+        texts = [_page_text(reader.pages[i]) for i in range(start, end)] if options.extract_text else []
+        resampled, part = _write_part(reader, display_name, start, end, total_pages, options)
+        return RangeResult(part, texts, resampled)
+    except Exception as exc:
+        return RangeResult(None, [], error=str(exc) or type(exc).__name__)
+
+
+def extract_page_texts(source: str | bytes) -> list[str]:
+    """Text of every page of a PDF path or in-memory PDF; empty if it cannot be parsed."""
+    try:
+        reader = _open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        return [_page_text(page) for page in reader.pages]
+    except Exception:
+        return []
+
+
+def assemble(path: str, display_name: str, total_pages: int, results: list[RangeResult]) -> PreprocessedDocument:
+    """Combine per-range results; fall back to the original file if anything failed or nothing was saved."""
+    original_size = os.path.getsize(path)
+    document = PreprocessedDocument(path, display_name, original_size, total_pages)
+    document.parts = [result.part for result in results if result.part is not None]
+    document.page_texts = [text for result in results for text in result.page_texts]
+    document.images_resampled = sum(result.images_resampled for result in results)
+    document.error = next((result.error for result in results if result.error), None)
+    if not total_pages:
+        document.error = document.error or "unreadable PDF"
+
+    whole = len(document.parts) == 1 and document.parts[0].size >= original_size
+    if document.error or not document.parts or whole:
+        for temp_path in document.temp_paths:
+            _remove(temp_path)
+        document.parts = [PdfPart(path, display_name, 1, total_pages, original_size)]
+    return document
+
+
+def _open(path: str | io.BytesIO) -> "PdfReader":
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        reader.decrypt("")
+    return reader
+
+
+def _write_part(
+    reader: "PdfReader",
+    display_name: str,
+    start: int,
+    end: int,
+    total_pages: int,
+    options: PreprocessOptions,
+) -> tuple[int, PdfPart]:
+    writer = PdfWriter()
+    for index in range(start, end):
+        writer.add_page(reader.pages[index])
+    resampled = 0
+    for page in writer.pages:
+        if options.image_max_dimension:
+            resampled += _resample_images(page, options)
+        page.compress_content_streams()
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        writer.write(temp_file)
+    name = display_name
+    if (start, end) != (0, total_pages):
+        stem, ext = os.path.splitext(name)
+        name = f"{stem} (pages {start + 1}-{end}){ext or '.pdf'}"
+    return resampled, PdfPart(temp_file.name, name, start + 1, end, os.path.getsize(temp_file.name))
+
+
+def _resample_images(page: object, options: PreprocessOptions) -> int:
+    resampled = 0
+    for image in getattr(page, "images", []):
+        try:
+            picture = image.image
+            if picture is None:
+                continue
+            if max(picture.size) > options.image_max_dimension:
+                picture.thumbnail((options.image_max_dimension, options.image_max_dimension))
+            if picture.mode not in ("RGB", "L"):
+                picture = picture.convert("RGB")
+            image.replace(picture, quality=options.image_quality)
+            resampled += 1
+        except Exception:
+            continue  # unsupported encodings keep their original stream
+    return resampled
+
+
+def _page_text(page: object) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -1,28 +1,110 @@
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
 import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, Iterable, Optional, Sequence
 
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+from app.core.config import Config
 from app.core.exceptions import FileUploadError
+from app.core.telemetry import telemetry, traced
+from app.services import pdf_preprocessor
+from app.services.gemini_service import UploadItem
+from app.services.page_index import DocumentPages
+from app.services.pdf_preprocessor import PreprocessedDocument, PreprocessOptions
+
+
+@dataclass(slots=True)
+class SavedFile:
+    path: str
+    sha256: str
+    size: int
+
+
+@dataclass(slots=True)
+class PreparedUploads:
+    """Upload items after preprocessing, plus the temp files it created."""
+
+    items: list[UploadItem]
+    temp_paths: list[str] = field(default_factory=list)
+    documents: list[PreprocessedDocument] = field(default_factory=list)
+
+    @property
+    def bytes_saved(self) -> int:
+        return sum(doc.original_size - doc.processed_size for doc in self.documents)
 
 
 class PDFService:
     """Service for handling PDF file operations."""
 
     @staticmethod
+    @traced("pdf.save_uploaded_file")
     def save_uploaded_file(uploaded_file: UploadedFile) -> str:
         """Persist the uploaded PDF to a temp file and return the path."""
+        return PDFService.save_and_hash(uploaded_file).path
+
+    @staticmethod
+    @traced("pdf.save_and_hash")
+    def save_and_hash(uploaded_file: UploadedFile, chunk_size: int = Config.SAVE_CHUNK_SIZE) -> SavedFile:
+        """Stream the upload buffer to a temp file in fixed blocks, hashing in the same pass.
+
+        Blocks are memoryview slices of the upload's own buffer, so no full-size
+        copy of the document is made.
+        """
+        digest = hashlib.sha256()
+        try:
+            with uploaded_file.getbuffer() as view, tempfile.NamedTemporaryFile(
+                delete=False, suffix=".pdf"
+            ) as temp_file:
+                for offset in range(0, len(view), chunk_size):
+                    block = view[offset:offset + chunk_size]
+                    digest.update(block)
+                    temp_file.write(block)
+                size = len(view)
+            return SavedFile(temp_file.name, digest.hexdigest(), size)
+        except Exception as exc:
+            raise FileUploadError(f"Failed to save file: {exc}") from exc
+
+    @staticmethod
+    @traced("pdf.save_stream")
+    def save_stream(stream: BinaryIO, chunk_size: int = Config.SAVE_CHUNK_SIZE) -> SavedFile:
+        """Copy any readable binary stream to a temp file through one reused block buffer."""
+        digest = hashlib.sha256()
+        block = bytearray(chunk_size)
+        view = memoryview(block)
+        size = 0
         try:
             with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-                temp_file.write(uploaded_file.getvalue())
-            return temp_file.name
+                while True:
+                    read = stream.readinto(view)
+                    if not read:
+                        break
+                    digest.update(view[:read])
+                    temp_file.write(view[:read])
+                    size += read
+            return SavedFile(temp_file.name, digest.hexdigest(), size)
         except Exception as exc:
             raise FileUploadError(f"Failed to save file: {exc}") from exc
 
     @staticmethod
+    @traced("pdf.compute_sha256")
+    def compute_sha256(uploaded_file: UploadedFile) -> str:
+        """Return the hex SHA-256 digest of the uploaded file's bytes without copying them."""
+        with uploaded_file.getbuffer() as view:
+            return hashlib.sha256(view).hexdigest()
+
+    @staticmethod
+    def combine_hashes(digests: Iterable[str]) -> str:
+        """Derive an order-independent digest for a set of documents."""
+        return hashlib.sha256("\n".join(sorted(digests)).encode("ascii")).hexdigest()
+
+    @staticmethod
+    @traced("pdf.cleanup_local_file")
     def cleanup_local_file(path: Optional[str]) -> None:
         """Remove stale temp files without surfacing errors to the UI."""
         if not path:
@@ -33,3 +115,118 @@ class PDFService:
                 target.unlink()
             except OSError:
                 pass
+
+    @staticmethod
+    @traced("pdf.cleanup_local_files")
+    def cleanup_local_files(paths: Optional[Iterable[str]]) -> None:
+        """Remove several temp files, ignoring any that are already gone."""
+        for path in paths or ():
+            PDFService.cleanup_local_file(path)
+
+    @staticmethod
+    def preprocessing_enabled() -> bool:
+        return Config.PDF_PREPROCESSING and pdf_preprocessor.AVAILABLE
+
+    @staticmethod
+    def create_preprocess_pool(workers: int = Config.PDF_PREPROCESS_WORKERS) -> ProcessPoolExecutor:
+        """Process pool for preprocessing; spawned so workers never inherit Streamlit's threads."""
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @staticmethod
+    @traced("pdf.preprocess_files")
+    def preprocess_files(
+        files: Sequence[UploadItem],
+        executor: Executor,
+        options: PreprocessOptions = PreprocessOptions(),
+    ) -> PreparedUploads:
+        """Preprocess on-disk PDFs in ``executor``; in-memory buffers pass through unchanged.
+
+        Every page range of every document is a separate task, so one large
+        PDF keeps all workers busy. Documents split into ranges become several
+        upload items, each tagged with its ``page_start``/``page_end`` so
+        citations can be mapped back to pages of the original file. Metadata
+        already on an item is kept on every part.
+        """
+        on_disk = {index: item[0] for index, item in enumerate(files) if isinstance(item[0], str)}
+        totals = dict(zip(on_disk, executor.map(pdf_preprocessor.page_count, on_disk.values())))
+        ranges = {
+            index: [
+                executor.submit(
+                    pdf_preprocessor.preprocess_range, files[index][0], files[index][1], start, end, total, options
+                )
+                for start, end in (pdf_preprocessor.page_ranges(total, options.split_pages) if total else [])
+            ]
+            for index, total in totals.items()
+        }
+        prepared = PreparedUploads(items=[])
+        for index, (source, display_name, *rest) in enumerate(files):
+            if index not in ranges:
+                prepared.items.append(files[index])
+                continue
+            document = pdf_preprocessor.assemble(
+                source, display_name, totals[index], [future.result() for future in ranges[index]]
+            )
+            prepared.documents.append(document)
+            prepared.temp_paths.extend(document.temp_paths)
+            if not document.total_pages:
+                prepared.items.append(files[index])
+                continue
+            base = rest[0] if rest else {}
+            for part in document.parts:
+                metadata = {
+                    **base,
+                    "page_start": part.page_start,
+                    "page_end": part.page_end,
+                    "total_pages": document.total_pages,
+                }
+                prepared.items.append((part.path, part.display_name, metadata))
+        telemetry.increment("app_pdf_bytes_saved_total", max(0, prepared.bytes_saved))
+        return prepared
+
+    @staticmethod
+    @traced("pdf.extract_document_pages")
+    def extract_document_pages(
+        files: Sequence[UploadItem],
+        documents: Sequence[PreprocessedDocument],
+        executor: Callable[[], Executor],
+    ) -> list[DocumentPages]:
+        """Per-page text of each upload, for the page index.
+
+        Text already extracted by preprocessing is reused. Other files on disk
+        are parsed in the pool returned by ``executor()``, which is only called
+        if there are any. Uploads still in memory are parsed in this thread:
+        sending them to a process pool would copy and pickle the whole PDF.
+        Documents without any text (scans, unreadable files) are left out.
+        """
+        if not pdf_preprocessor.AVAILABLE:
+            return []
+        preprocessed = {document.source_path: document for document in documents if document.page_texts}
+        pending = {
+            index: executor().submit(pdf_preprocessor.extract_page_texts, source)
+            for index, (source, *_rest) in enumerate(files)
+            if isinstance(source, str) and source not in preprocessed
+        }
+
+        pages = []
+        for index, (source, display_name, *_rest) in enumerate(files):
+            document = preprocessed.get(source) if isinstance(source, str) else None
+            if document is not None:
+                parts = [(part.display_name, part.page_start, part.page_end) for part in document.parts]
+                texts = document.page_texts
+            elif index in pending:
+                parts, texts = [], pending[index].result()
+            elif data := _read_buffer(source):
+                parts, texts = [], pdf_preprocessor.extract_page_texts(data)
+            else:
+                continue
+            if any(text.strip() for text in texts):
+                pages.append(DocumentPages(display_name, texts, parts if len(parts) > 1 else ()))
+        return pages
+
+
+def _read_buffer(source: object) -> bytes:
+    # BytesIO.getvalue() returns the buffer itself, not a copy, while it is not exported.
+    getvalue = getattr(source, "getvalue", None)
+    if callable(getvalue):
+        return getvalue()
+    return b""
@@ -0,0 +1,432 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeout, wait
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Mapping, Optional, TypeVar
+
+import httpx
+from google.genai import errors
+
+from app.core.config import Config
+from app.core.exceptions import CircuitOpenError
+from app.core.telemetry import telemetry
+from app.services.operation_poller import BackoffPolicy
+from app.services.scheduler import FairScheduler, scheduler as default_scheduler
+
+T = TypeVar("T")
+
+ADMIN_BUCKET = "admin"
+# Status polls already back off on their own; they are retried but not rate limited by default.
+OPERATIONS_BUCKET = "operations"
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient failures worth another attempt: throttling, 5xx and transport errors."""
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds requested by the server's ``Retry-After`` header, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class RetryPolicy:
+    attempts: int = Config.RETRY_MAX_ATTEMPTS
+    backoff: BackoffPolicy = BackoffPolicy(
+        initial=Config.RETRY_INITIAL_DELAY,
+        multiplier=Config.RETRY_BACKOFF_MULTIPLIER,
+        maximum=Config.RETRY_MAX_DELAY,
+        jitter=Config.POLL_JITTER,
+    )
+
+    def delay(self, attempt: int, exc: BaseException) -> float:
+        hinted = retry_after(exc)
+        delay = self.backoff.delay(attempt)
+        return max(delay, min(hinted, Config.RETRY_AFTER_CAP)) if hinted is not None else delay
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token if available and return 0, else the seconds until one is."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, sleep: Callable[[float], None] = time.sleep) -> None:
+        while (delay := self._reserve()) > 0:
+            sleep(delay)
+
+    async def aacquire(self) -> None:
+        while (delay := self._reserve()) > 0:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one probe through per reset window."""
+
+    def __init__(
+        self,
+        failure_threshold: int = Config.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = Config.CIRCUIT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half_open" if self._clock() - self._opened_at >= self._reset_timeout else "open"
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def admit(self) -> Optional[bool]:
+        """None if the call is rejected, else whether it is the half-open probe."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._clock() - self._opened_at < self._reset_timeout or self._probing:
+                return None
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+    def end_probe(self) -> None:
+        """Let the next call probe again, e.g. after a probe that never reached the model."""
+        with self._lock:
+            self._probing = False
+
+
+class RequestPolicy:
+    """Retries, rate limiting, circuit breaking, model fallback and hedging for API calls.
+
+    One instance is shared by every session in the process, so the token
+    buckets keep the whole process under quota. Model calls go through
+    ``call_model``/``acall_model``: each candidate model (the requested one,
+    then its ``MODEL_FALLBACKS`` chain) is skipped while its breaker is open,
+    retried with backoff on transient errors, and abandoned for the next one
+    once retries are exhausted. Other calls use ``call``/``acall``. Every
+    attempt except status polls also takes a ``FairScheduler`` slot, after
+    its rate-limit token, so throttled calls never hold a slot.
+    """
+
+    def __init__(
+        self,
+        retry: RetryPolicy = RetryPolicy(),
+        rate_limits: Mapping[str, float] = Config.RATE_LIMITS,
+        fallbacks: Mapping[str, str] = Config.MODEL_FALLBACKS,
+        hedge_delay: float = Config.QUERY_HEDGE_DELAY,
+        breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+        sleep: Callable[[float], None] = time.sleep,
+        scheduler: Optional[FairScheduler] = default_scheduler,
+    ) -> None:
+        self.retry = retry
+        self.hedge_delay = hedge_delay
+        self._fallbacks = dict(fallbacks)
+        self._buckets = {name: TokenBucket(rpm / 60.0) for name, rpm in rate_limits.items() if rpm}
+        self._breaker_factory = breaker_factory
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._sleep = sleep
+        self._scheduler = scheduler
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = self._breaker_factory()
+            return self._breakers[model]
+
+    def candidate_models(self, model: str) -> list[str]:
+        chain = [model]
+        while (fallback := self._fallbacks.get(chain[-1])) and fallback not in chain:
+            chain.append(fallback)
+        return chain
+
+    def call(self, func: Callable[[], T], bucket: str = ADMIN_BUCKET) -> T:
+        """Run ``func`` under the bucket's rate limit, retrying transient errors."""
+        limiter = self._buckets.get(bucket)
+        for attempt in range(self.retry.attempts):
+            if limiter is not None:
+                limiter.acquire(self._sleep)
+            try:
+                with contextlib.ExitStack() as stack:
+                    stack.enter_context(self._slot(bucket))
+                    result = func()
+                    if isinstance(result, _OpenStream):
+                        # A stream keeps its slot until it is exhausted or closed.
+                        result.slot = stack.pop_all()
+                    return result
+            except Exception as exc:
+                if not is_retryable(exc) or attempt + 1 >= self.retry.attempts:
+                    raise
+                telemetry.increment("app_request_retries_total", bucket=bucket)
+                self._sleep(self.retry.delay(attempt, exc))
+        raise AssertionError("unreachable")
+
+    async def acall(self, func: Callable[[], Awaitable[T]], bucket: str = ADMIN_BUCKET) -> T:
+        """Async variant of ``call``; ``func`` must return a fresh awaitable per attempt."""
+        limiter = self._buckets.get(bucket)
+        for attempt in range(self.retry.attempts):
+            if limiter is not None:
+                await limiter.aacquire()
+            try:
+                async with contextlib.AsyncExitStack() as stack:
+                    await stack.enter_async_context(self._aslot(bucket))
+                    result = await func()
+                    if isinstance(result, _OpenAsyncStream):
+                        result.slot = stack.pop_all()
+                    return result
+            except Exception as exc:
+                if not is_retryable(exc) or attempt + 1 >= self.retry.attempts:
+                    raise
+                telemetry.increment("app_request_retries_total", bucket=bucket)
+                await asyncio.sleep(self.retry.delay(attempt, exc))
+        raise AssertionError("unreachable")
+
+    def _slot(self, bucket: str) -> contextlib.AbstractContextManager:
+        # Status polls already back off on their own and run on poller threads.
+        if self._scheduler is None or bucket == OPERATIONS_BUCKET:
+            return contextlib.nullcontext()
+        return self._scheduler.slot()
+
+    def _aslot(self, bucket: str) -> contextlib.AbstractAsyncContextManager:
+        if self._scheduler is None or bucket == OPERATIONS_BUCKET:
+            return contextlib.nullcontext()
+        return self._scheduler.aslot()
+
+    def call_model(self, model: str, func: Callable[[str], T], hedge: bool = False) -> T:
+        """Call ``func(model_name)`` with breaker-guarded fallback across models."""
+        last_error: Optional[Exception] = None
+        for candidate in self.candidate_models(model):
+            breaker = self.breaker(candidate)
+            probe = breaker.admit()
+            if probe is None:
+                telemetry.increment("app_circuit_rejections_total", model=candidate)
+                continue
+            if candidate != model:
+                telemetry.increment("app_model_fallbacks_total", model=model, fallback=candidate)
+            try:
+                if hedge and self.hedge_delay > 0:
+                    result = self._hedged(lambda: self.call(lambda: func(candidate), candidate))
+                else:
+                    result = self.call(lambda: func(candidate), candidate)
+            except Exception as exc:
+                if not is_retryable(exc):
+                    _record_final(breaker, exc, probe)
+                    raise
+                breaker.record_failure()
+                last_error = exc
+                continue
+            finally:
+                # However the probe ended, the breaker must not stay stuck waiting for it.
+                if probe:
+                    breaker.end_probe()
+            breaker.record_success()
+            return result
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"All candidate models are temporarily unavailable: {', '.join(self.candidate_models(model))}")
+
+    async def acall_model(self, model: str, func: Callable[[str], Awaitable[T]], hedge: bool = False) -> T:
+        """Async variant of ``call_model``."""
+        last_error: Optional[Exception] = None
+        for candidate in self.candidate_models(model):
+            breaker = self.breaker(candidate)
+            probe = breaker.admit()
+            if probe is None:
+                telemetry.increment("app_circuit_rejections_total", model=candidate)
+                continue
+            if candidate != model:
+                telemetry.increment("app_model_fallbacks_total", model=model, fallback=candidate)
+            attempt = lambda: self.acall(lambda: func(candidate), candidate)  # noqa: E731
+            try:
+                result = await (self._ahedged(attempt) if hedge and self.hedge_delay > 0 else attempt())
+            except Exception as exc:
+                if not is_retryable(exc):
+                    _record_final(breaker, exc, probe)
+                    raise
+                breaker.record_failure()
+                last_error = exc
+                continue
+            finally:
+                if probe:
+                    breaker.end_probe()
+            breaker.record_success()
+            return result
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"All candidate models are temporarily unavailable: {', '.join(self.candidate_models(model))}")
+
+    def stream_model(self, model: str, func: Callable[[str], Iterator[T]]) -> Iterator[T]:
+        """Open a stream with retries and fallback; only the wait for the first chunk is retried.
+
+        The scheduler slot taken to open the stream is held until the stream
+        is exhausted, fails or is closed, so concurrency limits cover the
+        whole response.
+        """
+        stream = self.call_model(model, lambda name: _prime(func(name)))
+        try:
+            yield from stream.head
+            yield from stream.rest
+        finally:
+            stream.slot.close()
+
+    async def astream_model(self, model: str, func: Callable[[str], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """Async variant of ``stream_model``."""
+
+        async def open_stream(name: str) -> _OpenAsyncStream:
+            return await _aprime(await func(name))
+
+        stream = await self.acall_model(model, open_stream)
+        try:
+            for item in stream.head:
+                yield item
+            async for item in stream.rest:
+                yield item
+        finally:
+            await stream.slot.aclose()
+
+    def _hedged(self, func: Callable[[], T]) -> T:
+        """Start a second identical request if the first is slower than ``hedge_delay``."""
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(thread_name_prefix="hedged-request")
+            executor = self._hedge_executor
+        # Hedges run on their own threads but on behalf of the caller's tenant.
+        primary = executor.submit(contextvars.copy_context().run, func)
+        try:
+            return primary.result(timeout=self.hedge_delay)
+        except FuturesTimeout:
+            pass
+        telemetry.increment("app_hedged_requests_total")
+        pending = {primary, executor.submit(contextvars.copy_context().run, func)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error  # type: ignore[misc]
+
+    async def _ahedged(self, func: Callable[[], Awaitable[T]]) -> T:
+        primary = asyncio.ensure_future(func())
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+        telemetry.increment("app_hedged_requests_total")
+        pending = {primary, asyncio.ensure_future(func())}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error  # type: ignore[misc]
+
+
+def _record_final(breaker: CircuitBreaker, exc: BaseException, probe: bool) -> None:
+    """Settle the breaker for an error that is not retried.
+
+    An API error such as a 400 means the model answered, so it counts as a
+    success. Anything else (a busy scheduler, a bug in the caller) may never
+    have reached the model; it fails a probe, which reopens the breaker for
+    another window, but does not count against a closed breaker, so local
+    backpressure alone cannot open it.
+    """
+    if isinstance(exc, errors.APIError):
+        breaker.record_success()
+    elif probe:
+        breaker.record_failure()
+
+
+@dataclass(slots=True)
+class _OpenStream:
+    head: list
+    rest: Iterator
+    # Set by ``call`` to the still-open scheduler slot.
+    slot: contextlib.ExitStack = field(default_factory=contextlib.ExitStack)
+
+
+@dataclass(slots=True)
+class _OpenAsyncStream:
+    head: list
+    rest: AsyncIterator
+    slot: contextlib.AsyncExitStack = field(default_factory=contextlib.AsyncExitStack)
+
+
+def _prime(stream: Iterator[T]) -> _OpenStream:
+    # Pull the first chunk so connection and quota errors surface inside the retry loop.
+    iterator = iter(stream)
+    return _OpenStream(list(itertools.islice(iterator, 1)), iterator)
+
+
+async def _aprime(stream: AsyncIterator[T]) -> _OpenAsyncStream:
+    try:
+        return _OpenAsyncStream([await stream.__anext__()], stream)
+    except StopAsyncIteration:
+        return _OpenAsyncStream([], stream)
+
+
+request_policy = RequestPolicy()
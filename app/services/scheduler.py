@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from app.core.config import Config
+from app.core.exceptions import SchedulerBusyError
+from app.core.telemetry import telemetry
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclass(frozen=True, slots=True)
+class Tenant:
+    """Who a call is made for: a session, an API key owner or a background worker."""
+
+    id: str
+    priority: Priority = Priority.INTERACTIVE
+    weight: float = 1.0
+
+
+_current_tenant: contextvars.ContextVar[Tenant] = contextvars.ContextVar(
+    "scheduler_tenant", default=Tenant("default")
+)
+
+
+@dataclass(slots=True, eq=False)
+class _Waiter:
+    tenant: Tenant
+    wake: Callable[[], None]
+    enqueued_at: float
+    granted: bool = False
+
+
+@dataclass(slots=True)
+class _Queue:
+    """Waiting and running calls of one tenant at one priority."""
+
+    waiters: deque[_Waiter] = field(default_factory=deque)
+    running: int = 0
+    finish: float = 0.0  # virtual finish time of the tenant's last dispatched call
+
+
+class FairScheduler:
+    """Process-wide admission control for API calls, shared by every session.
+
+    Calls run inside ``slot()``/``aslot()`` on behalf of the tenant bound to
+    the current context (``tenant()``/``bind()``). At most ``max_concurrent``
+    calls run at once and at most ``max_per_session`` (scaled by the tenant's
+    weight) per tenant and priority.
+    Interactive calls are always dispatched before background ones, and
+    background work never holds more than ``background_share`` of the slots.
+    Within a priority, tenants are served by start-time fair queuing, so a
+    tenant with many queued calls cannot starve one with few. Instead of
+    letting callers time out, a call is rejected with ``SchedulerBusyError``
+    when its tenant already has ``max_queued_per_session`` calls waiting or,
+    for interactive calls, when it has waited ``max_wait`` seconds; background
+    calls wait as long as it takes.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = Config.SCHEDULER_MAX_CONCURRENT,
+        max_per_session: int = Config.SCHEDULER_MAX_PER_SESSION,
+        background_share: float = Config.SCHEDULER_BACKGROUND_SHARE,
+        max_queued_per_session: int = Config.SCHEDULER_MAX_QUEUED_PER_SESSION,
+        max_wait: float = Config.SCHEDULER_MAX_WAIT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_background = max(1, int(max_concurrent * background_share))
+        self.max_queued_per_session = max_queued_per_session
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queues: dict[tuple[str, Priority], _Queue] = {}
+        self._running = {priority: 0 for priority in Priority}
+        self._virtual_time = 0.0
+
+    @staticmethod
+    @contextlib.contextmanager
+    def tenant(tenant_id: str, priority: Priority = Priority.INTERACTIVE, weight: float = 1.0) -> Iterator[Tenant]:
+        """Run the block's calls on behalf of ``tenant_id``."""
+        tenant = Tenant(tenant_id, priority, weight)
+        token = _current_tenant.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current_tenant.reset(token)
+
+    @staticmethod
+    def bind(tenant_id: str, priority: Priority = Priority.INTERACTIVE, weight: float = 1.0) -> None:
+        """Bind the current context to ``tenant_id`` for the rest of its life (e.g. a script run)."""
+        _current_tenant.set(Tenant(tenant_id, priority, weight))
+
+    @property
+    def in_flight(self) -> int:
+        """Calls currently holding a slot, across priorities."""
+        with self._lock:
+            return sum(self._running.values())
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        event = threading.Event()
+        waiter = self._enqueue(event.set)
+        if not event.wait(self._wait_limit(waiter.tenant)):
+            self._give_up(waiter)
+        try:
+            yield
+        finally:
+            self._release(waiter.tenant)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        waiter = self._enqueue(lambda: loop.call_soon_threadsafe(_resolve, granted))
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), self._wait_limit(waiter.tenant))
+        except asyncio.TimeoutError:
+            self._give_up(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._remove(waiter)
+                    raise
+            self._release(waiter.tenant)
+            raise
+        try:
+            yield
+        finally:
+            self._release(waiter.tenant)
+
+    def _wait_limit(self, tenant: Tenant) -> Optional[float]:
+        return self.max_wait if tenant.priority is Priority.INTERACTIVE else None
+
+    def _enqueue(self, wake: Callable[[], None]) -> _Waiter:
+        tenant = _current_tenant.get()
+        waiter = _Waiter(tenant, wake, self._clock())
+        with self._lock:
+            queue = self._queues.setdefault((tenant.id, tenant.priority), _Queue())
+            if len(queue.waiters) >= self.max_queued_per_session:
+                telemetry.increment("app_scheduler_rejections_total", reason="queue_full")
+                raise SchedulerBusyError("Too many requests queued for this session; try again shortly")
+            queue.waiters.append(waiter)
+            self._dispatch()
+            self._publish()
+        return waiter
+
+    def _give_up(self, waiter: _Waiter) -> None:
+        """Reject a call that waited too long, unless it was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return
+            self._remove(waiter)
+        telemetry.increment("app_scheduler_rejections_total", reason="wait_timeout")
+        raise SchedulerBusyError("The server is busy; try again shortly")
+
+    def _remove(self, waiter: _Waiter) -> None:
+        key = (waiter.tenant.id, waiter.tenant.priority)
+        queue = self._queues.get(key)
+        if queue is not None and waiter in queue.waiters:
+            queue.waiters.remove(waiter)
+            if not queue.waiters and not queue.running:
+                del self._queues[key]
+        self._publish()
+
+    def _release(self, tenant: Tenant) -> None:
+        with self._lock:
+            key = (tenant.id, tenant.priority)
+            queue = self._queues[key]
+            queue.running -= 1
+            self._running[tenant.priority] -= 1
+            if not queue.waiters and not queue.running:
+                # Idle tenants restart from the current virtual time rather than banking credit.
+                del self._queues[key]
+            self._dispatch()
+            self._publish()
+
+    def _dispatch(self) -> None:
+        while sum(self._running.values()) < self.max_concurrent:
+            choice = self._next_queue()
+            if choice is None:
+                return
+            start, queue = choice
+            waiter = queue.waiters.popleft()
+            queue.running += 1
+            self._running[waiter.tenant.priority] += 1
+            self._virtual_time = start
+            queue.finish = start + 1.0 / max(waiter.tenant.weight, 1e-6)
+            waiter.granted = True
+            telemetry.observe(
+                "app_scheduler_wait_seconds", self._clock() - waiter.enqueued_at, priority=waiter.tenant.priority.name
+            )
+            waiter.wake()
+
+    def _next_queue(self) -> Optional[tuple[float, _Queue]]:
+        best: Optional[tuple[Priority, float, _Queue]] = None
+        for (_, priority), queue in self._queues.items():
+            if not queue.waiters or queue.running >= self._cap(queue.waiters[0].tenant):
+                continue
+            if priority is Priority.BACKGROUND and self._running[priority] >= self.max_background:
+                continue
+            start = max(queue.finish, self._virtual_time)
+            if best is None or (priority, start) < (best[0], best[1]):
+                best = (priority, start, queue)
+        return (best[1], best[2]) if best else None
+
+    def _cap(self, tenant: Tenant) -> int:
+        return max(1, round(self.max_per_session * tenant.weight))
+
+    def _publish(self) -> None:
+        for priority in Priority:
+            depth = sum(len(q.waiters) for (_, p), q in self._queues.items() if p is priority)
+            telemetry.set_gauge("app_scheduler_queue_depth", depth, priority=priority.name)
+            telemetry.set_gauge("app_scheduler_in_flight", self._running[priority], priority=priority.name)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def is_busy(exc: BaseException) -> bool:
+    """True if ``exc`` is, or was caused by, the scheduler shedding load."""
+    return isinstance(exc, SchedulerBusyError) or isinstance(exc.__cause__, SchedulerBusyError)
+
+
+scheduler = FairScheduler()
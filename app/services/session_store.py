@@ -0,0 +1,396 @@
+"""Session state kept outside the Streamlit process, so any replica can serve a session.
+
+A session is a small set of named fields (active store, filters, model, ...)
+plus its chat history. Fields are written as a diff of what changed; each
+chat turn is appended as one compact record instead of rewriting the
+history. Live objects such as the Gemini client are never stored; callers
+rebuild them from the process-wide pools.
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Protocol, Sequence, Union
+
+from app.core.config import Config
+from app.core.exceptions import SessionStateError
+from app.utils.sources import SourceSet
+from app.utils.sqlite import open_database
+
+_JSON = b"j"
+_ZLIB = b"z"
+
+
+def encode_turn(turn: dict[str, Any], compress_min: int = Config.SESSION_STATE_COMPRESS_MIN) -> bytes:
+    """Serialize a chat record with short keys; long turns are zlib-compressed if that helps."""
+    record: dict[str, Any] = {"r": turn["role"], "c": turn["content"]}
+    if turn.get("sources"):
+        record["s"] = turn["sources"].to_dict()
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(payload) >= compress_min:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            return _ZLIB + compressed
+    return _JSON + payload
+
+
+def decode_turn(blob: bytes) -> dict[str, Any]:
+    payload = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    record = json.loads(payload)
+    turn: dict[str, Any] = {"role": record["r"], "content": record["c"]}
+    if "s" in record:
+        turn["sources"] = SourceSet.from_dict(record["s"])
+    return turn
+
+
+@dataclass(slots=True)
+class SessionSnapshot:
+    fields: dict[str, Any] = field(default_factory=dict)
+    history: list[dict[str, Any]] = field(default_factory=list)
+
+
+class SessionStore(Protocol):
+    def load(self, session_id: str) -> SessionSnapshot: ...
+
+    def save_fields(self, session_id: str, fields: dict[str, Any]) -> None: ...
+
+    def append_turn(self, session_id: str, turn: dict[str, Any]) -> None: ...
+
+    def clear_history(self, session_id: str) -> None: ...
+
+
+@dataclass(slots=True)
+class _MemorySession:
+    fields: dict[str, str] = field(default_factory=dict)
+    turns: list[bytes] = field(default_factory=list)
+    updated_at: float = 0.0
+
+
+class MemorySessionStore:
+    """Sessions in this process only: survives reconnects, not restarts or a second replica."""
+
+    def __init__(self, ttl: int = Config.SESSION_STATE_TTL, clock: Callable[[], float] = time.time) -> None:
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: dict[str, _MemorySession] = {}
+
+    def load(self, session_id: str) -> SessionSnapshot:
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id)
+            if session is None:
+                return SessionSnapshot()
+            fields, turns = dict(session.fields), list(session.turns)
+        return SessionSnapshot(
+            {name: json.loads(value) for name, value in fields.items()}, [decode_turn(blob) for blob in turns]
+        )
+
+    def save_fields(self, session_id: str, fields: dict[str, Any]) -> None:
+        encoded = {name: json.dumps(value) for name, value in fields.items()}
+        with self._lock:
+            self._session(session_id).fields.update(encoded)
+
+    def append_turn(self, session_id: str, turn: dict[str, Any]) -> None:
+        blob = encode_turn(turn)
+        with self._lock:
+            self._session(session_id).turns.append(blob)
+
+    def clear_history(self, session_id: str) -> None:
+        with self._lock:
+            self._session(session_id).turns.clear()
+
+    def _session(self, session_id: str) -> _MemorySession:
+        session = self._sessions.setdefault(session_id, _MemorySession())
+        session.updated_at = self._clock()
+        return session
+
+    def _prune(self) -> None:
+        cutoff = self._clock() - self._ttl
+        for session_id in [key for key, session in self._sessions.items() if session.updated_at < cutoff]:
+            del self._sessions[session_id]
+
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS session_fields (
+        session_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (session_id, name)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS session_turns (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        payload BLOB NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS sessions_by_update ON sessions (updated_at)",
+)
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file; replicas on one host (or a shared volume) see the same state."""
+
+    def __init__(self, path: str, ttl: int = Config.SESSION_STATE_TTL, clock: Callable[[], float] = time.time) -> None:
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = open_database(path)
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._prune()
+
+    def load(self, session_id: str) -> SessionSnapshot:
+        with self._lock, _wrap_errors():
+            row = self._db.execute("SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or row[0] < self._clock() - self._ttl:
+                return SessionSnapshot()
+            fields = self._db.execute(
+                "SELECT name, value FROM session_fields WHERE session_id = ?", (session_id,)
+            ).fetchall()
+            turns = self._db.execute(
+                "SELECT payload FROM session_turns WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return SessionSnapshot(
+            {name: json.loads(value) for name, value in fields}, [decode_turn(bytes(blob)) for blob, in turns]
+        )
+
+    def save_fields(self, session_id: str, fields: dict[str, Any]) -> None:
+        rows = [(session_id, name, json.dumps(value)) for name, value in fields.items()]
+        with self._write(session_id):
+            self._db.executemany("INSERT OR REPLACE INTO session_fields VALUES (?, ?, ?)", rows)
+
+    def append_turn(self, session_id: str, turn: dict[str, Any]) -> None:
+        blob = encode_turn(turn)
+        with self._write(session_id):
+            self._db.execute(
+                "INSERT INTO session_turns VALUES "
+                "(?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM session_turns WHERE session_id = ?), ?)",
+                (session_id, session_id, blob),
+            )
+
+    def clear_history(self, session_id: str) -> None:
+        with self._write(session_id):
+            self._db.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+
+    @contextlib.contextmanager
+    def _write(self, session_id: Optional[str]) -> Iterator[None]:
+        """One transaction that also refreshes the session's expiry."""
+        with self._lock, _wrap_errors():
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if session_id is not None:
+                    self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (session_id, self._clock()))
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _prune(self) -> None:
+        cutoff = self._clock() - self._ttl
+        expired = "SELECT session_id FROM sessions WHERE updated_at < ?"
+        with self._write(None):
+            self._db.execute(f"DELETE FROM session_fields WHERE session_id IN ({expired})", (cutoff,))
+            self._db.execute(f"DELETE FROM session_turns WHERE session_id IN ({expired})", (cutoff,))
+            self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+
+
+@contextlib.contextmanager
+def _wrap_errors() -> Iterator[None]:
+    try:
+        yield
+    except sqlite3.Error as exc:
+        raise SessionStateError(f"Session state database error: {exc}") from exc
+
+
+RespValue = Union[None, int, bytes, list]
+
+
+class _RespError(Exception):
+    pass
+
+
+class RespClient:
+    """Minimal client for the Redis serialization protocol (RESP2), with pipelining.
+
+    Enough for the handful of commands the session store sends; works with
+    Redis, Valkey, KeyDB or any stand-in that speaks the protocol.
+    """
+
+    def __init__(self, url: str, timeout: float = Config.SESSION_STATE_TIMEOUT) -> None:
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("redis", ""):
+            raise ValueError(f"Unsupported session state URL: {url}")
+        self._address = (parsed.hostname or "localhost", parsed.port or 6379)
+        self._password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self._username = urllib.parse.unquote(parsed.username) if parsed.username else None
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader: Any = None
+
+    def execute(self, *commands: Sequence[Any]) -> list[RespValue]:
+        """Send ``commands`` in one round trip and return their replies in order."""
+        with self._lock:
+            try:
+                if self._sock is not None and self._dropped():
+                    self._close()
+                if self._sock is None:
+                    self._connect()
+                return self._roundtrip(commands)
+            except (OSError, _RespError) as exc:
+                # Never resent: a command that reached the server must not be applied twice.
+                self._close()
+                raise SessionStateError(f"Session state server error: {exc}") from exc
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection(self._address, timeout=self._timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        setup: list[Sequence[Any]] = []
+        if self._password is not None:
+            setup.append(("AUTH", self._username, self._password) if self._username else ("AUTH", self._password))
+        if self._db:
+            setup.append(("SELECT", self._db))
+        if setup:
+            self._roundtrip(setup)
+
+    def _dropped(self) -> bool:
+        """True if the idle connection was closed by the server (e.g. its ``timeout``).
+
+        No reply is outstanding between round trips, so a readable socket can
+        only mean EOF or garbage; reconnecting then sends nothing twice.
+        """
+        try:
+            readable, _, _ = select.select([self._sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(readable)
+
+    def _roundtrip(self, commands: Sequence[Sequence[Any]]) -> list[RespValue]:
+        self._sock.sendall(b"".join(_encode_command(command) for command in commands))
+        replies = [self._read_reply() for _ in commands]
+        errors = [reply for reply in replies if isinstance(reply, _RespError)]
+        if errors:
+            raise errors[0]
+        return replies
+
+    def _read_reply(self) -> Union[RespValue, _RespError]:
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed mid-reply")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            return _RespError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            if len(data) != size + 2:
+                raise ConnectionError("connection closed mid-reply")
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self._read_reply() for _ in range(size)]
+        raise _RespError(f"unexpected reply {line[:32]!r}")
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+
+def _encode_command(command: Sequence[Any]) -> bytes:
+    parts = [f"*{len(command)}\r\n".encode()]
+    for arg in command:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RedisSessionStore:
+    """Sessions on a Redis-protocol server, shared by replicas on any host.
+
+    Each session is a hash of JSON fields and a list of encoded turns, both
+    expiring ``ttl`` seconds after the last write. Every operation is a single
+    pipelined round trip.
+    """
+
+    def __init__(
+        self,
+        url: str = Config.SESSION_STATE_URL,
+        ttl: int = Config.SESSION_STATE_TTL,
+        prefix: str = "gemini-file-search:session:",
+        client: Optional[RespClient] = None,
+    ) -> None:
+        self._client = client or RespClient(url)
+        self._ttl = ttl
+        self._prefix = prefix
+
+    def load(self, session_id: str) -> SessionSnapshot:
+        fields_key, turns_key = self._keys(session_id)
+        flat, turns = self._client.execute(("HGETALL", fields_key), ("LRANGE", turns_key, 0, -1))
+        flat = flat or []
+        fields = {flat[i].decode("utf-8"): json.loads(flat[i + 1]) for i in range(0, len(flat), 2)}
+        return SessionSnapshot(fields, [decode_turn(blob) for blob in turns or []])
+
+    def save_fields(self, session_id: str, fields: dict[str, Any]) -> None:
+        if not fields:
+            return
+        fields_key, turns_key = self._keys(session_id)
+        pairs = [item for name, value in fields.items() for item in (name, json.dumps(value))]
+        self._client.execute(
+            ("HSET", fields_key, *pairs), ("EXPIRE", fields_key, self._ttl), ("EXPIRE", turns_key, self._ttl)
+        )
+
+    def append_turn(self, session_id: str, turn: dict[str, Any]) -> None:
+        fields_key, turns_key = self._keys(session_id)
+        self._client.execute(
+            ("RPUSH", turns_key, encode_turn(turn)), ("EXPIRE", turns_key, self._ttl), ("EXPIRE", fields_key, self._ttl)
+        )
+
+    def clear_history(self, session_id: str) -> None:
+        self._client.execute(("DEL", self._keys(session_id)[1]))
+
+    def _keys(self, session_id: str) -> tuple[str, str]:
+        return f"{self._prefix}{session_id}:fields", f"{self._prefix}{session_id}:turns"
+
+
+def create_session_store(backend: str = Config.SESSION_STATE_BACKEND) -> SessionStore:
+    """Build the backend named by ``SESSION_STATE_BACKEND``."""
+    if backend == "memory":
+        return MemorySessionStore()
+    if backend == "sqlite":
+        return SQLiteSessionStore(Config.SESSION_STATE_PATH or os.path.join(Config.CACHE_DIR, "session_state.sqlite3"))
+    if backend == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown SESSION_STATE_BACKEND: {backend!r} (expected memory, sqlite or redis)")
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Optional
+
+from google import genai
+
+from app.core.config import Config
+from app.core.exceptions import GeminiServiceError
+from app.services.gemini_service import GeminiService
+from app.services.store_registry import StoreRegistry
+from app.utils.caching import CacheStats
+from app.utils.sqlite import open_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_cache (
+    owner TEXT NOT NULL,
+    document_hash TEXT NOT NULL,
+    store_name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (owner, document_hash)
+)
+"""
+
+
+class StoreCache:
+    """Persistent map from document SHA-256 to an indexed File Search store.
+
+    Entries are scoped by owner (an API key fingerprint) because stores are only
+    reachable with the key that created them. Eviction happens lazily during an
+    owner's own calls so the evicted stores can be deleted with their client.
+    Queries record their use in the ``registry`` rather than here, so with a
+    registry an entry counts as used at its store's last access there too.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = Config.STORE_CACHE_TTL,
+        max_entries: int = Config.STORE_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+        registry: Optional[StoreRegistry] = None,
+    ) -> None:
+        self._registry = registry
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = open_database(path)
+        self._db.execute(_SCHEMA)
+        self.stats = CacheStats("store")
+
+    def lookup(self, client: genai.Client, owner: str, document_hash: str) -> Optional[str]:
+        """Return a live store for the document, or None on a cache miss."""
+        self._evict(client, owner)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT store_name FROM store_cache WHERE owner = ? AND document_hash = ?",
+                (owner, document_hash),
+            ).fetchone()
+        if row is not None and GeminiService.store_exists(client, row[0]) is False:
+            self._delete_row(owner, document_hash)
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.stats.miss()
+                return None
+            self._db.execute(
+                "UPDATE store_cache SET last_access = ? WHERE owner = ? AND document_hash = ?",
+                (self._clock(), owner, document_hash),
+            )
+            self.stats.hit()
+        return row[0]
+
+    def remember(self, client: genai.Client, owner: str, document_hash: str, store_name: str) -> None:
+        """Record a freshly indexed store, evicting old entries if over capacity."""
+        now = self._clock()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO store_cache VALUES (?, ?, ?, ?, ?)",
+                (owner, document_hash, store_name, now, now),
+            )
+        self._evict(client, owner)
+
+    def invalidate(self, owner: str, store_name: str) -> None:
+        """Forget a store that was deleted outside the cache."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM store_cache WHERE owner = ? AND store_name = ?",
+                (owner, store_name),
+            )
+
+    def _evict(self, client: genai.Client, owner: str) -> None:
+        cutoff = self._clock() - self._ttl
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT document_hash, store_name, last_access FROM store_cache "
+                "WHERE owner = ? ORDER BY last_access DESC",
+                (owner,),
+            ).fetchall()
+        rows = sorted(
+            ((document_hash, name, self._last_access(name, cached)) for document_hash, name, cached in rows),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+        stale = [
+            (document_hash, store_name)
+            for index, (document_hash, store_name, last_access) in enumerate(rows)
+            if index >= self._max_entries or last_access < cutoff
+        ]
+        for document_hash, store_name in stale:
+            try:
+                GeminiService.cleanup_store(client, store_name)
+            except GeminiServiceError:
+                if GeminiService.store_exists(client, store_name) is not False:
+                    continue  # still there, or unknown: kept so the next eviction or reap retries
+            self._delete_row(owner, document_hash)
+            if self._registry is not None:
+                self._registry.forget(store_name)
+            with self._lock:
+                self.stats.evict()
+
+    def _last_access(self, store_name: str, cached: float) -> float:
+        record = self._registry.get(store_name) if self._registry is not None else None
+        return max(cached, record.last_access) if record is not None else cached
+
+    def _delete_row(self, owner: str, document_hash: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM store_cache WHERE owner = ? AND document_hash = ?",
+                (owner, document_hash),
+            )
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Collection, Optional
+
+from google import genai
+
+from app.core.config import Config
+from app.core.exceptions import GeminiServiceError
+from app.core.telemetry import telemetry
+from app.services.gemini_service import GeminiService
+from app.services.scheduler import Priority, scheduler
+from app.utils.sqlite import open_database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stores (
+    store_name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    session_id TEXT,
+    document_hash TEXT NOT NULL,
+    filenames TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    ready INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS stores_by_session ON stores (session_id, last_access)",
+    "CREATE INDEX IF NOT EXISTS stores_by_access ON stores (last_access)",
+)
+
+
+@dataclass(slots=True)
+class StoreRecord:
+    store_name: str
+    owner: str
+    session_id: Optional[str]
+    document_hash: str
+    filenames: list[str]
+    size_bytes: int
+    ready: bool
+    created_at: float
+    last_access: float
+
+
+class StoreRegistry:
+    """Persistent record of every File Search store this app creates.
+
+    A store is registered as soon as it exists remotely and marked ready once
+    indexed, so stores left behind by closed tabs, crashed jobs or restarts
+    can still be found and deleted by ``StoreReaper``. Returning sessions use
+    ``latest_for_session`` to reattach instead of re-indexing. ``on_forget``
+    is called with the owner and name of every store forgotten, so state
+    derived from a store can go with it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        clock: Callable[[], float] = time.time,
+        on_forget: Optional[Callable[[str, str], None]] = None,
+    ) -> None:
+        self._clock = clock
+        self._on_forget = on_forget
+        self._lock = threading.Lock()
+        self._db = open_database(path)
+        self._db.execute(_SCHEMA)
+        for statement in _INDEXES:
+            self._db.execute(statement)
+
+    def register(
+        self,
+        store_name: str,
+        owner: str,
+        document_hash: str,
+        filenames: list[str],
+        session_id: Optional[str] = None,
+    ) -> None:
+        now = self._clock()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stores VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)",
+                (store_name, owner, session_id, document_hash, json.dumps(filenames), now, now),
+            )
+
+    def mark_ready(self, store_name: str, size_bytes: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE stores SET ready = 1, size_bytes = ?, last_access = ? WHERE store_name = ?",
+                (size_bytes, self._clock(), store_name),
+            )
+
+    def touch(self, store_name: str, session_id: Optional[str] = None) -> None:
+        """Record use of a store, optionally moving it to ``session_id``."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE stores SET last_access = ?, session_id = COALESCE(?, session_id) WHERE store_name = ?",
+                (self._clock(), session_id, store_name),
+            )
+
+    def forget(self, store_name: str) -> None:
+        with self._lock:
+            row = self._db.execute("SELECT owner FROM stores WHERE store_name = ?", (store_name,)).fetchone()
+            self._db.execute("DELETE FROM stores WHERE store_name = ?", (store_name,))
+        if row is not None and self._on_forget is not None:
+            self._on_forget(row[0], store_name)
+
+    def get(self, store_name: str) -> Optional[StoreRecord]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM stores WHERE store_name = ?", (store_name,)).fetchone()
+        return _record(row) if row else None
+
+    def latest_for_session(self, session_id: str, owner: str) -> Optional[StoreRecord]:
+        """The most recently used ready store of a session, if it belongs to ``owner``."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM stores WHERE session_id = ? AND owner = ? AND ready = 1 "
+                "ORDER BY last_access DESC LIMIT 1",
+                (session_id, owner),
+            ).fetchone()
+        return _record(row) if row else None
+
+    def ready_for_session(self, session_id: str, owner: str) -> list[StoreRecord]:
+        """Every ready store of a session owned by ``owner``, most recently used first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM stores WHERE session_id = ? AND owner = ? AND ready = 1 ORDER BY last_access DESC",
+                (session_id, owner),
+            ).fetchall()
+        return [_record(row) for row in rows]
+
+    def reapable(
+        self,
+        idle_ttl: float = Config.STORE_IDLE_TTL,
+        orphan_ttl: float = Config.STORE_ORPHAN_TTL,
+        limit: int = Config.REAPER_BATCH_SIZE,
+        owners: Optional[Collection[str]] = None,
+    ) -> list[StoreRecord]:
+        """Stores idle for ``idle_ttl``, or never finished indexing within ``orphan_ttl``.
+
+        With ``owners``, only their stores are considered, so a batch is never
+        filled with stores nobody can delete yet.
+        """
+        now = self._clock()
+        owner_clause, owner_params = "", ()
+        if owners is not None:
+            owners = tuple(owners)
+            if not owners:
+                return []
+            owner_clause = f"AND owner IN ({', '.join('?' * len(owners))}) "
+            owner_params = owners
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM stores WHERE (last_access < ? OR (ready = 0 AND created_at < ?)) "
+                f"{owner_clause}ORDER BY last_access LIMIT ?",
+                (now - idle_ttl, now - orphan_ttl, *owner_params, limit),
+            ).fetchall()
+        return [_record(row) for row in rows]
+
+    def reapable_owners(
+        self, idle_ttl: float = Config.STORE_IDLE_TTL, orphan_ttl: float = Config.STORE_ORPHAN_TTL
+    ) -> list[str]:
+        """Owners with at least one store ``reapable`` would return."""
+        now = self._clock()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT owner FROM stores WHERE last_access < ? OR (ready = 0 AND created_at < ?)",
+                (now - idle_ttl, now - orphan_ttl),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM stores").fetchone()[0]
+
+
+def _record(row: tuple) -> StoreRecord:
+    store_name, owner, session_id, document_hash, filenames, size, ready, created_at, last_access = row
+    return StoreRecord(
+        store_name, owner, session_id, document_hash, json.loads(filenames), size, bool(ready), created_at, last_access
+    )
+
+
+class StoreReaper:
+    """Background thread that force-deletes idle and orphaned stores in batches.
+
+    Stores can only be deleted with their owner's key, so each batch uses the
+    owner's client from the ``ClientPool`` (or the server's own
+    ``GEMINI_API_KEY``); stores of owners with no live client wait until the
+    owner is active again.
+    """
+
+    def __init__(
+        self,
+        registry: StoreRegistry,
+        client_for: Callable[[str], Optional[genai.Client]],
+        on_deleted: Optional[Callable[[StoreRecord], None]] = None,
+        interval: float = Config.REAPER_INTERVAL,
+        max_workers: int = Config.REAPER_MAX_WORKERS,
+    ) -> None:
+        self._registry = registry
+        self._client_for = client_for
+        self._on_deleted = on_deleted
+        self._interval = interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="store-reaper")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StoreReaper":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="store-reaper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def reap_once(self) -> int:
+        """Delete one batch of reapable stores; return how many were removed."""
+        clients = {
+            owner: client
+            for owner in self._registry.reapable_owners()
+            if (client := self._client_for(owner)) is not None
+        }
+        records = self._registry.reapable(owners=clients)
+        return sum(self._executor.map(lambda record: self._delete(record, clients[record.owner]), records))
+
+    def _delete(self, record: StoreRecord, client: genai.Client) -> bool:
+        with scheduler.tenant("store-reaper", Priority.BACKGROUND):
+            try:
+                GeminiService.cleanup_store(client, record.store_name)
+            except GeminiServiceError:
+                if GeminiService.store_exists(client, record.store_name) is not False:
+                    return False  # still there, or unknown: retried next round
+        self._registry.forget(record.store_name)
+        if self._on_deleted is not None:
+            self._on_deleted(record)
+        telemetry.increment("app_stores_reaped_total", reason="orphan" if not record.ready else "idle")
+        return True
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.reap_once()
+            except Exception:
+                pass  # keep the reaper alive; the next round retries
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import re
 from dataclasses import dataclass
 from typing import Optional
 
@@ -8,17 +9,27 @@ import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 from app.core.config import Config
+from app.core.telemetry import traced
+from app.services.answer_cache import normalize_prompt
+from app.services.document_brief import DocumentBrief
+from app.services.ingestion import IngestionJob, JobStatus
+from app.services.page_index import PageLocator, PageMatch
 from app.utils.localization import TRANSLATIONS, get_text
+from app.utils.sources import SourceSet
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[\]#<>|~$])")
 
 
 @dataclass(slots=True)
 class SidebarEvent:
     language: str
-    uploaded_file: Optional[UploadedFile]
+    uploaded_files: list[UploadedFile]
     should_process_upload: bool
     clear_requested: bool
+    tags: list[str]
 
 
+@traced("ui.render_sidebar")
 def render_sidebar(model_options: list[str]) -> SidebarEvent:
     with st.sidebar:
         st.subheader(get_text("api_key_warning"))
@@ -67,20 +78,33 @@ def render_sidebar(model_options: list[str]) -> SidebarEvent:
         st.markdown("---")
         st.header(get_text("sidebar_header", language))
 
-        uploaded_file = st.file_uploader(get_text("choose_file", language), type=["pdf"])
+        uploaded_files = st.file_uploader(
+            get_text("choose_file", language),
+            type=["pdf"],
+            accept_multiple_files=True,
+        ) or []
+        tags_input = st.text_input(get_text("upload_tags", language), help=get_text("upload_tags_help", language))
+        tags = sorted({tag.strip() for tag in tags_input.split(",") if tag.strip()})
 
         should_process_upload = bool(
-            uploaded_file
+            uploaded_files
             and st.session_state.get("api_key")
             and (
-                st.session_state.get("store_name") is None
-                or uploaded_file.name != st.session_state.get("uploaded_filename")
+                (st.session_state.get("store_name") is None and st.session_state.get("ingestion_job") is None)
+                or sorted(f.name for f in uploaded_files) != st.session_state.get("requested_filenames")
             )
         )
 
         clear_requested = False
-        if st.session_state.get("store_name"):
-            st.info(get_text("current_pdf", language).format(st.session_state.get("uploaded_filename")))
+        if st.session_state.get("store_name") or st.session_state.get("ingestion_job"):
+            if st.session_state.get("store_name"):
+                st.info(get_text("current_pdf", language).format(", ".join(st.session_state.get("uploaded_filenames", []))))
+                st.toggle(
+                    get_text("search_all_stores", language),
+                    key="search_all_stores",
+                    help=get_text("search_all_stores_help", language),
+                )
+                _render_retrieval_filter(language)
             clear_requested = st.button(get_text("clear_button", language), key="clear_pdf_button")
 
         st.markdown(get_text("about_header", language))
@@ -88,31 +112,192 @@ def render_sidebar(model_options: list[str]) -> SidebarEvent:
 
     return SidebarEvent(
         language=language,
-        uploaded_file=uploaded_file,
+        uploaded_files=uploaded_files,
         should_process_upload=should_process_upload,
         clear_requested=clear_requested,
+        tags=tags,
     )
 
 
-def render_chat_history(history: list[dict], lang: str) -> None:
+def _render_retrieval_filter(language: str) -> None:
+    """Narrow retrieval to some of the current documents and/or tags."""
+    filenames = st.session_state.get("uploaded_filenames", [])
+    tags = st.session_state.get("document_tags", [])
+    if len(filenames) < 2 and not tags:
+        return
+    # Not keyed widgets: the options change whenever another store is activated.
+    if len(filenames) > 1:
+        st.session_state["filter_filenames"] = st.multiselect(
+            get_text("filter_documents", language),
+            filenames,
+            default=[name for name in st.session_state.get("filter_filenames", []) if name in filenames],
+        )
+    if tags:
+        st.session_state["filter_tags"] = st.multiselect(
+            get_text("filter_tags", language),
+            tags,
+            default=[tag for tag in st.session_state.get("filter_tags", []) if tag in tags],
+        )
+
+
+def render_ingestion_status(job: IngestionJob, lang: str) -> None:
+    label = get_text(f"ingestion_{job.status.value}", lang).format(", ".join(job.filenames))
+    if job.status is JobStatus.INDEXING:
+        st.progress(job.progress, text=f"{label} ({job.indexed}/{job.total})")
+    else:
+        st.info(label)
+
+
+@traced("ui.render_chat_history")
+def render_chat_history(history: list[dict], lang: str, locate: Optional[PageLocator] = None) -> None:
+    """Render the most recent messages; older ones are paginated behind a toggle."""
     if not history:
         return
-    for message in history:
-        role = message.get("role")
-        if not role:
-            continue
-        with st.chat_message(role):
-            st.markdown(message.get("content", ""))
-            if role == "assistant":
-                render_sources_section(message.get("sources"), lang)
+    window_start = max(0, len(history) - Config.HISTORY_RENDER_WINDOW)
+    if window_start:
+        _render_earlier_messages(history, window_start, lang, locate)
+    for index in range(window_start, len(history)):
+        _render_message(history[index], index, lang, locate)
+
+
+def _render_earlier_messages(
+    history: list[dict], window_start: int, lang: str, locate: Optional[PageLocator] = None
+) -> None:
+    if not st.toggle(get_text("show_earlier", lang).format(window_start), key="show_earlier_messages"):
+        return
+    page_size = Config.HISTORY_PAGE_SIZE
+    pages = max(1, -(-window_start // page_size))
+    # Page 1 is the page just before the live window, counting backwards.
+    page = 1
+    if pages > 1:
+        page = int(
+            st.number_input(
+                get_text("history_page", lang).format(pages),
+                min_value=1,
+                max_value=pages,
+                value=1,
+                key="history_page",
+            )
+        )
+    end = window_start - (page - 1) * page_size
+    for index in range(max(0, end - page_size), end):
+        _render_message(history[index], index, lang, locate)
+    st.divider()
 
 
-def render_sources_section(sources: Optional[list], lang: str) -> None:
+def _render_message(message: dict, index: int, lang: str, locate: Optional[PageLocator] = None) -> None:
+    role = message.get("role")
+    if not role:
+        return
+    with st.chat_message(role):
+        st.markdown(message.get("content", ""))
+        if role == "assistant":
+            render_sources_section(message.get("sources"), lang, key=str(index), locate=locate)
+
+
+def render_sources_section(
+    sources: Optional[SourceSet],
+    lang: str,
+    key: str = "latest",
+    locate: Optional[PageLocator] = None,
+) -> None:
+    """Show compact source labels; full chunk text and supports are only rendered on request.
+
+    With ``locate`` (see ``PageIndexStore.locator``), passages found in the
+    local page index show their page and the matching text in context.
+    """
     if not sources:
         return
     with st.expander(get_text("view_sources", lang)):
-        for source in sources:
-            if isinstance(source, (dict, list)):
-                st.json(source)
+        for label in sources.labels:
+            st.markdown(f"- {label}")
+        for number, chunk in enumerate(sources.chunks, start=1):
+            match = locate(chunk) if locate is not None and chunk.text else None
+            if match is None:
+                st.markdown(f"{number}. **{chunk.title or chunk.uri}** — {_preview(chunk.text)}")
             else:
-                st.markdown(f"- {source}")
+                title = chunk.title or match.document
+                st.markdown(f"{number}. **{title}**, {_pages(match, lang)} — {_excerpt(match)}")
+        if sources.chunks and st.toggle(
+            get_text("show_grounding", lang).format(len(sources.chunks) + len(sources.supports)),
+            key=f"show_grounding_{key}",
+        ):
+            for number, chunk in enumerate(sources.chunks, start=1):
+                st.markdown(f"**{number}. {chunk.title or chunk.uri}**")
+                st.text(chunk.text)
+            for support in sources.supports:
+                cited = ", ".join(str(i + 1) for i in support.chunk_indices)
+                confidence = f" ({support.confidence:.2f})" if support.confidence is not None else ""
+                st.caption(f"“{support.text}” → [{cited}]{confidence}")
+
+
+def render_document_brief(brief: DocumentBrief, history: list[dict], lang: str) -> None:
+    """Outline of the documents and a chip per prepared question not asked yet.
+
+    A clicked chip is queued in ``suggested_prompt`` and answered on the
+    rerun like a typed question.
+    """
+    if brief.outline and not history:
+        with st.expander(get_text("brief_outline", lang)):
+            st.markdown("\n".join(f"- {_escape(item)}" for item in brief.outline))
+    asked = {
+        prepared.prompt
+        for message in history
+        if message.get("role") == "user" and (prepared := brief.answer_for(message.get("content", "")))
+    }
+    pending = [prompt for prompt in brief.suggestions if prompt not in asked]
+    if not pending:
+        return
+    st.caption(get_text("brief_suggestions", lang))
+    per_row = 3
+    for row in range(0, len(pending), per_row):
+        for column, prompt in zip(st.columns(per_row), pending[row : row + per_row]):
+            column.button(prompt, key=f"suggestion_{normalize_prompt(prompt)}", on_click=_suggest, args=(prompt,))
+
+
+def _suggest(prompt: str) -> None:
+    st.session_state["suggested_prompt"] = prompt
+
+
+def render_debug_panel(turns: list[dict], lang: str) -> None:
+    """Sidebar breakdown of recent chat turns: time per span and token usage."""
+    if not turns:
+        return
+    with st.sidebar.expander(get_text("debug_panel", lang)):
+        for number, turn in enumerate(reversed(turns), start=1):
+            st.markdown(get_text("debug_turn", lang).format(number, turn["total"] * 1000))
+            st.dataframe(
+                [{"span": name, "ms": round(duration * 1000, 1)} for name, duration in turn["stages"]],
+                hide_index=True,
+            )
+            if turn["usage"]:
+                usage = ", ".join(f"{kind}: {count}" for kind, count in turn["usage"].items())
+                st.caption(get_text("debug_tokens", lang).format(usage))
+            cached, prompt = turn["usage"].get("cached", 0), turn["usage"].get("prompt", 0)
+            if cached and prompt:
+                st.caption(get_text("debug_cache_savings", lang).format(cached, prompt, cached / prompt))
+
+
+def _pages(match: PageMatch, lang: str) -> str:
+    first, last = match.pages[0], match.pages[-1]
+    if first == last:
+        return get_text("source_page", lang).format(first)
+    return get_text("source_pages", lang).format(first, last)
+
+
+def _excerpt(match: PageMatch) -> str:
+    if not match.highlight:
+        return ""
+    before, highlight, after = (_escape(part) for part in (match.before, match.highlight, match.after))
+    return f"{before} **{highlight}** {after}".strip()
+
+
+def _escape(text: str) -> str:
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def _preview(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) > Config.SOURCE_PREVIEW_CHARS:
+        text = text[: Config.SOURCE_PREVIEW_CHARS].rstrip() + "…"
+    return text
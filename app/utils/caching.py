@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from app.core.telemetry import telemetry
+
+
+@dataclass(slots=True)
+class CacheStats:
+    """Counts for one cache, also exported as ``app_cache_requests_total`` and ``app_cache_evictions_total``."""
+
+    name: str
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def hit(self) -> None:
+        self.hits += 1
+        telemetry.increment("app_cache_requests_total", cache=self.name, result="hit")
+
+    def miss(self) -> None:
+        self.misses += 1
+        telemetry.increment("app_cache_requests_total", cache=self.name, result="miss")
+
+    def evict(self, count: int = 1) -> None:
+        if count:
+            self.evictions += count
+            telemetry.increment("app_cache_evictions_total", count, cache=self.name)
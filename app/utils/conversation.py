@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Iterable, List, Sequence
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
 
 from google.genai import types
+from app.core.config import Config
+from app.core.exceptions import AppError
+from app.core.telemetry import traced
 from app.utils.localization import get_text
+from app.utils.sources import SourceSet
 
 
 def _as_iterable(value: Any) -> List[Any]:
@@ -14,16 +18,17 @@ def _as_iterable(value: Any) -> List[Any]:
     return [value]
 
 
-def parse_response(response: types.GenerateContentResponse | None) -> tuple[str, list[Any]]:
+@traced("parse_response")
+def parse_response(response: types.GenerateContentResponse | None) -> tuple[str, SourceSet]:
     if not response or not getattr(response, "candidates", None):
-        return "", []
+        return "", SourceSet()
 
     candidate = response.candidates[0]
     content = getattr(candidate, "content", None)
     parts = _as_iterable(getattr(content, "parts", None)) if content else []
 
     answer_fragments: list[str] = []
-    sources: list[Any] = []
+    sources = SourceSet()
 
     for part in parts:
         text_value = getattr(part, "text", None)
@@ -32,8 +37,8 @@ def parse_response(response: types.GenerateContentResponse | None) -> tuple[str,
         file_data = getattr(part, "file_data", None)
         if file_data:
             label = getattr(file_data, "display_name", None) or getattr(file_data, "file_uri", None) or getattr(file_data, "file_id", None)
-            if label and label not in sources:
-                sources.append(label)
+            if label:
+                sources.add_label(label)
 
     _append_citations(candidate, sources)
     _append_grounding(candidate, sources)
@@ -41,42 +46,242 @@ def parse_response(response: types.GenerateContentResponse | None) -> tuple[str,
     return "\n\n".join(answer_fragments).strip(), sources
 
 
-def build_conversation_contents(history: Sequence[dict[str, Any]]) -> list[types.Content]:
-    conversation: list[types.Content] = []
-    for message in history:
-        content = message.get("content")
-        role = message.get("role")
-        if not content or not role:
-            continue
-        api_role = "model" if role == "assistant" else "user"
-        conversation.append(
-            types.Content(role=api_role, parts=[types.Part(text=content)])
+def merge_answers(responses: Sequence[types.GenerateContentResponse | None]) -> tuple[str, SourceSet]:
+    """Combine the answers of a multi-store fan-out into one answer and one SourceSet.
+
+    Partial answers are ranked by relevance (their best grounding confidence,
+    then how many passages back them). Ungrounded answers are dropped when any
+    other partition found supporting passages. Sources are merged in the same
+    order, so duplicate passages keep their highest-ranked position.
+    """
+    parsed = [parse_response(response) for response in responses]
+    parsed = [(answer, sources) for answer, sources in parsed if answer]
+    if len(parsed) == 1:
+        return parsed[0]
+    grounded = [item for item in parsed if item[1].chunks]
+    ranked = sorted(grounded or parsed, key=lambda item: _relevance(item[1]), reverse=True)
+
+    merged = SourceSet()
+    for _, sources in ranked:
+        merged.merge(sources)
+    return "\n\n".join(dict.fromkeys(answer for answer, _ in ranked)), merged
+
+
+def _relevance(sources: SourceSet) -> tuple[float, int]:
+    confidences = [support.confidence for support in sources.supports if support.confidence is not None]
+    return max(confidences, default=0.0), len(sources.chunks)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for budgeting history."""
+    return max(1, len(text) // 4)
+
+
+def _message_content(message: dict[str, Any]) -> Optional[types.Content]:
+    content = message.get("content")
+    role = message.get("role")
+    if not content or not role:
+        return None
+    api_role = "model" if role == "assistant" else "user"
+    return types.Content(role=api_role, parts=[types.Part(text=content)])
+
+
+def _window_start(tokens: Sequence[int], contents: Sequence[Optional[types.Content]], budget: Optional[int]) -> int:
+    """Index of the oldest message that fits in the budget, starting on a user turn."""
+    if budget is None:
+        return 0
+    start = len(tokens)
+    used = 0
+    while start > 0 and (used + tokens[start - 1] <= budget or start == len(tokens)):
+        start -= 1
+        used += tokens[start]
+    while start < len(contents) - 1 and (contents[start] is None or contents[start].role != "user"):
+        start += 1
+    return start
+
+
+def build_conversation_contents(
+    history: Sequence[dict[str, Any]],
+    token_budget: Optional[int] = None,
+) -> list[types.Content]:
+    contents = [_message_content(message) for message in history]
+    tokens = [estimate_tokens(message.get("content") or "") if content else 0 for message, content in zip(history, contents)]
+    start = _window_start(tokens, contents, token_budget)
+    return [content for content in contents[start:] if content is not None]
+
+
+class ConversationWindow:
+    """Token-budgeted view of the chat history, built incrementally across reruns.
+
+    ``types.Content`` objects are created once per message and reused. Turns that
+    fall out of the budget can be folded into a rolling summary by an optional
+    ``summarizer(previous_summary, dropped_contents) -> str`` callback; the
+    summary is sent first and counts against the budget.
+    ``build(history, pin=True)`` keeps the window's previous start instead of
+    sliding, so a prefix held in a context cache stays the prefix.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = Config.HISTORY_TOKEN_BUDGET,
+        summarizer: Optional[Callable[[str, list[types.Content]], str]] = None,
+    ) -> None:
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self._reset()
+
+    def _reset(self) -> None:
+        self.summary = ""
+        self._messages: list[dict[str, Any]] = []
+        self._contents: list[Optional[types.Content]] = []
+        self._tokens: list[int] = []
+        self._summarized_upto = 0
+        self._start = 0
+
+    def build(self, history: Sequence[dict[str, Any]], pin: bool = False) -> list[types.Content]:
+        self._sync(history)
+        start = self._window_start(pin)
+
+        # A longer summary leaves less of the budget, which can drop more turns to fold in.
+        while self.summarizer is not None and start > self._summarized_upto:
+            dropped = [c for c in self._contents[self._summarized_upto:start] if c is not None]
+            try:
+                self.summary = self.summarizer(self.summary, dropped)
+            except AppError:
+                break  # keep the previous summary; the window itself is still valid
+            self._summarized_upto = start
+            start = self._window_start(pin)
+        self._start = start
+
+        window = [content for content in self._contents[start:] if content is not None]
+        if self.summary:
+            window.insert(0, types.Content(role="user", parts=[types.Part(text=self._summary_text())]))
+        return window
+
+    def _window_start(self, pin: bool) -> int:
+        """Oldest message in the budget left after the summary; never later than before with ``pin``."""
+        budget = self.token_budget
+        if budget is not None and self.summary:
+            budget = max(0, budget - estimate_tokens(self._summary_text()))
+        start = _window_start(self._tokens, self._contents, budget)
+        return min(start, self._start) if pin else start
+
+    def _summary_text(self) -> str:
+        return get_text("history_summary_prefix") + self.summary
+
+    def _sync(self, history: Sequence[dict[str, Any]]) -> None:
+        known = len(self._messages)
+        if known > len(history) or (known and history[known - 1] is not self._messages[-1]):
+            self._reset()  # history was cleared or replaced
+            known = 0
+        for message in history[known:]:
+            content = _message_content(message)
+            self._messages.append(message)
+            self._contents.append(content)
+            self._tokens.append(estimate_tokens(message.get("content") or "") if content else 0)
+
+
+class ResponseStream:
+    """Yield text deltas from a streamed response while keeping its chunks.
+
+    Grounding and citation metadata usually only arrive on the final chunks, so
+    once iteration finishes ``final_response`` folds everything back into a
+    single response that ``parse_response`` understands.
+    """
+
+    def __init__(self, chunks: Iterable[types.GenerateContentResponse] = ()) -> None:
+        self._chunks = chunks
+        self.chunks: list[types.GenerateContentResponse] = []
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self._chunks:
+            text = self.add(chunk)
+            if text:
+                yield text
+
+    def add(self, chunk: types.GenerateContentResponse) -> str:
+        """Record a chunk received by the caller (e.g. from an async stream) and return its text."""
+        self.chunks.append(chunk)
+        return _chunk_text(chunk)
+
+    def final_response(self) -> Optional[types.GenerateContentResponse]:
+        if not self.chunks:
+            return None
+
+        text = "".join(_chunk_text(chunk) for chunk in self.chunks)
+        grounding = None
+        citations: list[Any] = []
+        for chunk in self.chunks:
+            candidate = _first_candidate(chunk)
+            if candidate is None:
+                continue
+            grounding = getattr(candidate, "grounding_metadata", None) or grounding
+            citation_meta = getattr(candidate, "citation_metadata", None)
+            if citation_meta:
+                citations.extend(_as_iterable(getattr(citation_meta, "citations", None)))
+
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=[types.Part(text=text)]),
+                    grounding_metadata=grounding,
+                    citation_metadata=types.CitationMetadata(citations=citations) if citations else None,
+                )
+            ],
+            usage_metadata=getattr(self.chunks[-1], "usage_metadata", None),
         )
-    return conversation
 
 
-def _append_citations(candidate: types.Candidate, sources: list[Any]) -> None:
+def _first_candidate(response: types.GenerateContentResponse) -> Optional[types.Candidate]:
+    candidates = getattr(response, "candidates", None)
+    return candidates[0] if candidates else None
+
+
+def _chunk_text(chunk: types.GenerateContentResponse) -> str:
+    candidate = _first_candidate(chunk)
+    content = getattr(candidate, "content", None) if candidate else None
+    parts = _as_iterable(getattr(content, "parts", None)) if content else []
+    return "".join(getattr(part, "text", None) or "" for part in parts)
+
+
+def _append_citations(candidate: types.Candidate, sources: SourceSet) -> None:
     citation_meta = getattr(candidate, "citation_metadata", None)
     if not citation_meta:
         return
     citations = _as_iterable(getattr(citation_meta, "citations", None))
     for citation in citations:
         cited = getattr(citation, "uri", None) or getattr(citation, "title", None)
-        if cited and cited not in sources:
-            sources.append(cited)
+        if cited:
+            sources.add_label(cited)
 
 
-def _append_grounding(candidate: types.Candidate, sources: list[Any]) -> None:
+def _append_grounding(candidate: types.Candidate, sources: SourceSet) -> None:
     grounding_meta = getattr(candidate, "grounding_metadata", None)
     if not grounding_meta:
         return
     chunks = _as_iterable(getattr(grounding_meta, "grounding_chunks", None))
+    # Position in the response -> position in the deduplicated SourceSet.
+    remap: list[int] = []
     for chunk in chunks:
-        payload = chunk.to_json_dict() if hasattr(chunk, "to_json_dict") else chunk
-        if payload:
-            sources.append(payload)
+        context = getattr(chunk, "retrieved_context", None) or getattr(chunk, "web", None)
+        remap.append(
+            sources.add_chunk(
+                getattr(context, "title", None) or "",
+                getattr(context, "uri", None) or "",
+                getattr(context, "text", None) or "",
+            )
+        )
     supports = _as_iterable(getattr(grounding_meta, "grounding_supports", None))
     for support in supports:
-        payload = support.to_json_dict() if hasattr(support, "to_json_dict") else support
-        if payload:
-            sources.append(payload)
+        segment = getattr(support, "segment", None)
+        indices = tuple(
+            remap[i]
+            for i in _as_iterable(getattr(support, "grounding_chunk_indices", None))
+            if 0 <= i < len(remap)
+        )
+        scores = _as_iterable(getattr(support, "confidence_scores", None))
+        sources.add_support(
+            getattr(segment, "text", None) or "",
+            indices,
+            max(scores) if scores else None,
+        )
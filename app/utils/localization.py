@@ -16,10 +16,22 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "api_key_warning_text": "Your API key is stored only in your local session and is not sent to any server.",
         "api_key_required": "Please enter your API key to proceed.",
         "sidebar_header": "PDF Upload",
-        "choose_file": "Choose a PDF file",
+        "choose_file": "Choose one or more PDF files",
         "processing": "Processing file...",
         "upload_success": "✅ Uploaded successfully: {}",
-        "current_pdf": "📄 Current PDF: {}",
+        "ingestion_saved": "⏳ Queued for indexing: {}",
+        "ingestion_preprocessing": "🗜️ Optimizing: {}",
+        "ingestion_uploading": "⬆️ Uploading: {}",
+        "ingestion_indexing": "🔎 Indexing: {}",
+        "store_reattached": "🔗 Reopened your previous documents: {}",
+        "upload_reused": "♻️ Reused existing index for: {}",
+        "current_pdf": "📄 Current PDFs: {}",
+        "upload_tags": "Tags for these PDFs (optional)",
+        "upload_tags_help": "Comma-separated, e.g. finance, 2024. Questions can later be limited to tagged documents.",
+        "filter_documents": "Search only in",
+        "filter_tags": "Only documents tagged",
+        "search_all_stores": "Search all my documents",
+        "search_all_stores_help": "Also search every document set indexed earlier in this session.",
         "clear_button": "🗑️ Clear PDF and start over",
         "about_header": "### About",
         "about_text": "This app allows you to chat with your PDF documents using Google Gemini models. Upload a PDF and ask questions about its content!",
@@ -27,6 +39,20 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "chat_input": "Ask a question about your PDF...",
         "thinking": "🤔 Thinking...",
         "view_sources": "📚 View Sources",
+        "show_grounding": "Show raw grounding data ({} items)",
+        "source_page": "page {}",
+        "source_pages": "pages {}–{}",
+        "show_earlier": "Show {} earlier messages",
+        "history_page": "Page (1 = most recent of {})",
+        "cached_answer": "⚡ Served from answer cache",
+        "prepared_answer": "⚡ Prepared when the documents were indexed",
+        "brief_outline": "🗂️ Document outline",
+        "brief_suggestions": "Suggested questions",
+        "debug_panel": "🛠️ Debug: recent turns",
+        "debug_turn": "**Turn -{}** · {:.0f} ms",
+        "debug_tokens": "Tokens — {}",
+        "debug_cache_savings": "Context cache — {} of {} prompt tokens reused ({:.0%})",
+        "history_summary_prefix": "Summary of the earlier conversation:\n",
         "error_response": "Sorry, I could not generate a response. Please try again.",
         "footer": "Built with Streamlit and Google Gemini",
         "error_api_key": "GEMINI_API_KEY environment variable not set. Please set it to use the app.",
@@ -35,6 +61,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "error_create_store": "Error creating file search store: {}",
         "error_upload_store": "Error uploading file to search store: {}",
         "error_query": "Error querying file search: {}",
+        "server_busy": "⏳ The server is busy with other requests. Please ask again in a moment.",
         "error_cleanup": "Error during cleanup: {}",
     }
 }
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import sys
+from typing import Any, Optional
+
+
+def _intern(value: Optional[str]) -> str:
+    # Retrieved chunks repeat across turns; interning keeps one copy per process.
+    return sys.intern(value) if value else ""
+
+
+class SourceChunk:
+    """A retrieved passage, stored once per answer."""
+
+    __slots__ = ("title", "uri", "text")
+
+    def __init__(self, title: str = "", uri: str = "", text: str = "") -> None:
+        self.title = _intern(title)
+        self.uri = _intern(uri)
+        self.text = _intern(text)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return self.title, self.uri, self.text
+
+
+class SourceSupport:
+    """A span of the answer and the chunks (by index) that support it."""
+
+    __slots__ = ("text", "chunk_indices", "confidence")
+
+    def __init__(self, text: str, chunk_indices: tuple[int, ...], confidence: Optional[float] = None) -> None:
+        self.text = text
+        self.chunk_indices = chunk_indices
+        self.confidence = confidence
+
+
+class SourceSet:
+    """Deduplicated sources for one answer: citation labels, chunks and supports.
+
+    Labels and chunks are indexed by dict for O(1) dedup; supports refer to
+    chunks by position instead of repeating their text.
+    """
+
+    __slots__ = ("labels", "chunks", "supports", "_label_index", "_chunk_index")
+
+    def __init__(self) -> None:
+        self.labels: list[str] = []
+        self.chunks: list[SourceChunk] = []
+        self.supports: list[SourceSupport] = []
+        self._label_index: set[str] = set()
+        self._chunk_index: dict[tuple[str, str, str], int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.labels or self.chunks)
+
+    def __len__(self) -> int:
+        return len(self.labels) + len(self.chunks)
+
+    def add_label(self, label: str) -> None:
+        label = _intern(label)
+        if label not in self._label_index:
+            self._label_index.add(label)
+            self.labels.append(label)
+
+    def add_chunk(self, title: str = "", uri: str = "", text: str = "") -> int:
+        """Add a chunk if new and return its index."""
+        chunk = SourceChunk(title, uri, text)
+        index = self._chunk_index.get(chunk.key)
+        if index is None:
+            index = len(self.chunks)
+            self._chunk_index[chunk.key] = index
+            self.chunks.append(chunk)
+        return index
+
+    def add_support(self, text: str, chunk_indices: tuple[int, ...], confidence: Optional[float] = None) -> None:
+        self.supports.append(SourceSupport(text, chunk_indices, confidence))
+
+    def merge(self, other: "SourceSet") -> None:
+        """Fold another answer's sources in, remapping support indices."""
+        for label in other.labels:
+            self.add_label(label)
+        remap = [self.add_chunk(c.title, c.uri, c.text) for c in other.chunks]
+        for support in other.supports:
+            self.add_support(
+                support.text,
+                tuple(remap[i] for i in support.chunk_indices if i < len(remap)),
+                support.confidence,
+            )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "labels": list(self.labels),
+            "chunks": [[c.title, c.uri, c.text] for c in self.chunks],
+            "supports": [[s.text, list(s.chunk_indices), s.confidence] for s in self.supports],
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict[str, Any]) -> "SourceSet":
+        sources = cls()
+        for label in payload.get("labels", []):
+            sources.add_label(label)
+        for title, uri, text in payload.get("chunks", []):
+            sources.add_chunk(title, uri, text)
+        for text, indices, confidence in payload.get("supports", []):
+            sources.add_support(text, tuple(indices), confidence)
+        return sources
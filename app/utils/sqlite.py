@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    """Open a SQLite database that can be shared across Streamlit script threads."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
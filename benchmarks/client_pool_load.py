@@ -0,0 +1,100 @@
+"""Load test: per-request overhead with and without the shared client pool.
+
+Starts a local stub of the ``generateContent`` endpoint and drives it from
+several "sessions" (threads), either constructing a fresh ``genai.Client``
+per request (the old per-session behaviour after a rerun with a new key, or
+a new tab) or leasing clients from ``ClientPool``. Usage::
+
+    python -m benchmarks.client_pool_load --sessions 8 --requests 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.client_pool import ClientPool
+from app.services.gemini_service import GeminiService
+
+_RESPONSE = json.dumps(
+    {"candidates": [{"content": {"role": "model", "parts": [{"text": "ok"}]}}]}
+).encode("utf-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections: set[tuple[str, int]] = set()
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        with self.lock:
+            self.connections.add(self.client_address)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(_RESPONSE)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def _call(client, model: str) -> None:
+    client.models.generate_content(model=model, contents="ping")
+
+
+def run(base_url: str, sessions: int, requests: int, pooled: bool) -> tuple[list[float], float]:
+    pool = ClientPool(factory=lambda key, http: GeminiService.create_client(key, http, base_url=base_url))
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def session(index: int) -> None:
+        api_key = f"key-{index % 2}"
+        for _ in range(requests):
+            start = time.perf_counter()
+            if pooled:
+                client = pool.touch(api_key)
+            else:
+                client = GeminiService.create_client(api_key, base_url=base_url)
+            _call(client, "gemini-2.5-flash")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(session, range(sessions)))
+    return latencies, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'mode':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'connections':>13}")
+    for label, pooled in (("per-request", False), ("pooled", True)):
+        _StubHandler.connections.clear()
+        latencies, wall = run(base_url, args.sessions, args.requests, pooled)
+        latencies.sort()
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(
+            f"{label:<12}{statistics.mean(latencies) * 1000:>10.2f}"
+            f"{statistics.median(latencies) * 1000:>10.2f}{p95 * 1000:>10.2f}"
+            f"{len(latencies) / wall:>10.1f}{len(_StubHandler.connections):>13}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
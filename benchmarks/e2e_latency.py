@@ -0,0 +1,147 @@
+"""End-to-end latency of the upload → poll → query → cleanup flow.
+
+Drives ``GeminiService`` against the in-process fake backend, with one thread
+per concurrent session, and reports p50/p95/p99 per stage plus throughput.
+``--scale`` multiplies every fake latency, so ``--scale 0.1`` runs ten times
+faster with the same shape. The process-wide rate limits still apply at real
+time, so set ``RATE_LIMIT_ADMIN_RPM=0`` to measure a compressed run without
+them. Usage::
+
+    python -m benchmarks.e2e_latency --sessions 40 --concurrency 8 --scale 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import statistics
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields, replace
+
+from google.genai import types
+
+from app.core.exceptions import AppError
+from app.services.gemini_service import GeminiService
+from app.utils.conversation import ResponseStream, parse_response
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+STAGES = ("create_store", "upload_and_index", "query", "stream_first_token", "stream_total", "cleanup")
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def time(self, stage: str, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except AppError:
+            self.errors[stage] += 1
+            raise
+        self.timings[stage].append(time.perf_counter() - start)
+        return result
+
+
+def scaled(config: FakeBackendConfig, scale: float) -> FakeBackendConfig:
+    changes = {
+        f.name: Latency(getattr(config, f.name).median * scale, getattr(config, f.name).sigma)
+        for f in fields(config)
+        if isinstance(getattr(config, f.name), Latency)
+    }
+    return replace(config, **changes)
+
+
+def run_session(client: FakeGeminiClient, recorder: Recorder, files: int, queries: int) -> bool:
+    store_name = None
+    try:
+        store = recorder.time(
+            "create_store", GeminiService.create_file_search_store, client, GeminiService.build_store_name()
+        )
+        store_name = store.name
+        documents = [(io.BytesIO(b"%PDF-1.4 fake"), f"doc-{i}.pdf") for i in range(files)]
+        recorder.time("upload_and_index", GeminiService.upload_files_to_store, client, store_name, documents)
+        conversation = [types.Content(role="user", parts=[types.Part(text="What does the document say?")])]
+        for _ in range(queries):
+            response = recorder.time(
+                "query", GeminiService.query_file_search, client, conversation, store_name, "gemini-2.5-flash"
+            )
+            parse_response(response)
+            stream_query(client, recorder, conversation, store_name)
+        return True
+    except AppError:
+        return False
+    finally:
+        if store_name:
+            try:
+                recorder.time("cleanup", GeminiService.cleanup_store, client, store_name)
+            except AppError:
+                pass
+
+
+def stream_query(client, recorder: Recorder, conversation, store_name: str) -> None:
+    start = time.perf_counter()
+    stream = ResponseStream()
+    first = None
+    try:
+        for chunk in GeminiService.stream_file_search(client, conversation, store_name, "gemini-2.5-flash"):
+            if stream.add(chunk) and first is None:
+                first = time.perf_counter() - start
+    except AppError:
+        recorder.errors["stream_total"] += 1
+        raise
+    recorder.timings["stream_first_token"].append(first if first is not None else time.perf_counter() - start)
+    recorder.timings["stream_total"].append(time.perf_counter() - start)
+    parse_response(stream.final_response())
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--files", type=int, default=3, help="documents per session")
+    parser.add_argument("--queries", type=int, default=3, help="queries per session")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--scale", type=float, default=0.2, help="multiplier on every fake latency")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = scaled(FakeBackendConfig(failure_rate=args.failure_rate, seed=args.seed), args.scale)
+    client = FakeGeminiClient(config)
+    recorder = Recorder()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(
+            pool.map(lambda _: run_session(client, recorder, args.files, args.queries), range(args.sessions))
+        )
+    elapsed = time.perf_counter() - start
+
+    print(f"{'stage':<20}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for stage in STAGES:
+        values = recorder.timings.get(stage, [])
+        print(
+            f"{stage:<20}{len(values):>6}"
+            f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}{recorder.errors.get(stage, 0):>8}"
+        )
+    completed = sum(outcomes)
+    queries = len(recorder.timings["query"]) + len(recorder.timings["stream_total"])
+    print(
+        f"\n{completed}/{args.sessions} sessions in {elapsed:.2f}s: "
+        f"{completed / elapsed:.2f} sessions/s, {queries / elapsed:.2f} queries/s, "
+        f"{sum(client.stats.calls.values())} backend calls ({client.stats.failures} injected failures), "
+        f"{len(client.live_stores)} stores leaked"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""In-process fake of the subset of ``genai.Client`` this app uses.
+
+Implements ``file_search_stores.create/get/upload_to_file_search_store/delete``,
+``operations.get``, ``models.generate_content``/``generate_content_stream``,
+``caches`` and their ``aio`` counterparts, with configurable latency,
+failure and indexing-time distributions. Use it anywhere a client is
+expected::
+
+    client = FakeGeminiClient(FakeBackendConfig(failure_rate=0.02))
+    GeminiService.upload_files_to_store(client, store.name, files)
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from google.genai import errors, types
+
+
+@dataclass(frozen=True)
+class Latency:
+    """Log-normal latency in seconds, parameterised by its median."""
+
+    median: float
+    sigma: float = 0.3
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+@dataclass(frozen=True)
+class FakeBackendConfig:
+    create_store: Latency = Latency(0.15)
+    upload: Latency = Latency(0.4)
+    operations_get: Latency = Latency(0.05)
+    indexing: Latency = Latency(3.0, 0.6)
+    delete_store: Latency = Latency(0.1)
+    first_token: Latency = Latency(0.6)
+    generate: Latency = Latency(1.5, 0.4)
+    stream_chunks: int = 8
+    # Extra retrieval time per store named in one generate request
+    retrieval_per_store: float = 0.05
+    # Bytes per second of one uplink shared by all uploads (transfers queue
+    # FIFO); 0 makes upload time independent of size
+    upload_bandwidth: float = 0.0
+    failure_rate: float = 0.0
+    grounding_chunks: int = 4
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeBackendStats:
+    calls: dict[str, int] = field(default_factory=dict)
+    failures: int = 0
+
+    def count(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+
+class _Backend:
+    def __init__(self, config: FakeBackendConfig) -> None:
+        self.config = config
+        self.stats = FakeBackendStats()
+        self.stores: dict[str, types.FileSearchStore] = {}
+        # Store name -> (display_name, custom_metadata) of each uploaded document
+        self.documents: dict[str, list[tuple[str, dict[str, Any]]]] = {}
+        self.ready_at: dict[str, float] = {}
+        self.caches: dict[str, types.CachedContent] = {}
+        # Cache name -> the config it was created with (tools included)
+        self.cache_configs: dict[str, Any] = {}
+        self._rng = random.Random(config.seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._link_free_at = 0.0
+
+    def latency(self, model: Latency) -> float:
+        with self._lock:
+            return model.sample(self._rng)
+
+    def call(self, method: str, latency: Latency) -> float:
+        with self._lock:
+            self.stats.count(method)
+            failed = self._rng.random() < self.config.failure_rate
+            if failed:
+                self.stats.failures += 1
+        if failed:
+            raise errors.ServerError(
+                503, {"error": {"code": 503, "message": f"fake {method} unavailable", "status": "UNAVAILABLE"}}
+            )
+        return self.latency(latency)
+
+    def transmit(self, size: int) -> float:
+        """Queue ``size`` bytes on the shared uplink; return seconds until they are sent."""
+        with self._lock:
+            now = time.monotonic()
+            self._link_free_at = max(now, self._link_free_at) + size / self.config.upload_bandwidth
+            return self._link_free_at - now
+
+    def model_call(self, method: str, latency: Latency, config: Any) -> float:
+        """Like ``call``, plus retrieval time for every store the request searches."""
+        stores = _store_names(self.tools_config(config))
+        return self.call(method, latency) + self.config.retrieval_per_store * len(stores)
+
+    def tools_config(self, config: Any) -> Any:
+        """The config holding the request's tools: its cached content's, if it references one."""
+        return self.cache_configs.get(getattr(config, "cached_content", None) or "", config)
+
+    def next_id(self, prefix: str) -> str:
+        return f"{prefix}/fake-{next(self._ids)}"
+
+    def answer(
+        self, store_names: list[str], question: str, metadata_filter: Optional[str] = None
+    ) -> tuple[str, types.GroundingMetadata]:
+        documents = [
+            display_name
+            for name in store_names
+            for display_name, metadata in self.documents.get(name, [])
+            if _matches(metadata, metadata_filter)
+        ] or ["document.pdf"]
+        chunks = [
+            types.GroundingChunk(
+                retrieved_context=types.GroundingChunkRetrievedContext(
+                    title=documents[i % len(documents)],
+                    text=f"Passage {i} of {documents[i % len(documents)]} relevant to: {question}",
+                )
+            )
+            for i in range(self.config.grounding_chunks)
+        ]
+        supports = [
+            types.GroundingSupport(
+                segment=types.Segment(text=f"Claim {i}."),
+                grounding_chunk_indices=[i],
+                confidence_scores=[0.8],
+            )
+            for i in range(self.config.grounding_chunks)
+        ]
+        text = " ".join(f"Claim {i}." for i in range(self.config.grounding_chunks))
+        return text, types.GroundingMetadata(grounding_chunks=chunks, grounding_supports=supports)
+
+
+def _matches(metadata: dict[str, Any], metadata_filter: Optional[str]) -> bool:
+    """Evaluate the subset of AIP-160 the app emits: ANDed groups of ORed
+    ``key = "value"`` / ``key:"value"`` terms."""
+    if not metadata_filter:
+        return True
+    for group in metadata_filter.split(" AND "):
+        terms = [term.strip() for term in group.strip().strip("()").split(" OR ")]
+        if not any(_term_matches(metadata, term) for term in terms):
+            return False
+    return True
+
+
+def _term_matches(metadata: dict[str, Any], term: str) -> bool:
+    key, operator, raw = (term.partition(" = ") if " = " in term else term.partition(":"))
+    if not operator:
+        return False
+    value = json.loads(raw.strip())
+    actual = metadata.get(key.strip())
+    return value in actual if isinstance(actual, list) else actual == value
+
+
+def _metadata(config: Optional[dict]) -> dict[str, Any]:
+    values: dict[str, Any] = {}
+    for entry in (config or {}).get("custom_metadata", []):
+        if "string_list_value" in entry:
+            values[entry["key"]] = list(entry["string_list_value"]["values"])
+        else:
+            values[entry["key"]] = entry.get("string_value", entry.get("numeric_value"))
+    return values
+
+
+def _metadata_filter(config: Any) -> Optional[str]:
+    for tool in getattr(config, "tools", None) or []:
+        file_search = getattr(tool, "file_search", None)
+        if getattr(file_search, "metadata_filter", None):
+            return file_search.metadata_filter
+    return None
+
+
+def _question(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    last = contents[-1] if contents else None
+    parts = getattr(last, "parts", None) or []
+    return "".join(getattr(part, "text", "") or "" for part in parts)
+
+
+def _store_names(config: Any) -> list[str]:
+    names: list[str] = []
+    for tool in getattr(config, "tools", None) or []:
+        file_search = getattr(tool, "file_search", None)
+        names.extend(getattr(file_search, "file_search_store_names", None) or [])
+    return names
+
+
+def _file_size(file: Any) -> int:
+    if isinstance(file, str):
+        return os.path.getsize(file)
+    return len(file.getbuffer()) if hasattr(file, "getbuffer") else 0
+
+
+def _usage(prompt_tokens: int, cached_tokens: int = 0) -> types.GenerateContentResponseUsageMetadata:
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        cached_content_token_count=cached_tokens or None,
+        candidates_token_count=40,
+        total_token_count=prompt_tokens + 40,
+    )
+
+
+def _prompt_tokens(contents: Any) -> int:
+    if isinstance(contents, str):
+        return max(1, len(contents) // 4)
+    return sum(
+        max(1, len(getattr(part, "text", "") or "") // 4)
+        for content in contents or []
+        for part in getattr(content, "parts", None) or []
+    )
+
+
+class _FileSearchStores:
+    def __init__(self, backend: _Backend) -> None:
+        self._backend = backend
+
+    def create(self, config: Optional[dict] = None) -> types.FileSearchStore:
+        time.sleep(self._backend.call("file_search_stores.create", self._backend.config.create_store))
+        name = self._backend.next_id("fileSearchStores")
+        store = types.FileSearchStore(name=name, display_name=(config or {}).get("display_name"))
+        self._backend.stores[name] = store
+        self._backend.documents[name] = []
+        return store
+
+    def get(self, name: str, config: Optional[dict] = None) -> types.FileSearchStore:
+        time.sleep(self._backend.call("file_search_stores.get", self._backend.config.operations_get))
+        if name not in self._backend.stores:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+        return self._backend.stores[name]
+
+    def upload_to_file_search_store(
+        self, *, file_search_store_name: str, file: Any, config: Optional[dict] = None
+    ) -> types.UploadToFileSearchStoreOperation:
+        time.sleep(self._backend.call("file_search_stores.upload", self._backend.config.upload))
+        if self._backend.config.upload_bandwidth:
+            time.sleep(self._backend.transmit(_file_size(file)))
+        if file_search_store_name not in self._backend.stores:
+            raise errors.ClientError(404, {"error": {"code": 404, "message": "no store", "status": "NOT_FOUND"}})
+        display_name = (config or {}).get("display_name") or "document.pdf"
+        self._backend.documents[file_search_store_name].append((display_name, _metadata(config)))
+        name = self._backend.next_id(f"{file_search_store_name}/upload/operations")
+        self._backend.ready_at[name] = time.monotonic() + self._backend.latency(self._backend.config.indexing)
+        return types.UploadToFileSearchStoreOperation(name=name, done=False)
+
+    def delete(self, name: str, config: Optional[dict] = None) -> None:
+        time.sleep(self._backend.call("file_search_stores.delete", self._backend.config.delete_store))
+        self._backend.stores.pop(name, None)
+        self._backend.documents.pop(name, None)
+
+
+class _Operations:
+    def __init__(self, backend: _Backend) -> None:
+        self._backend = backend
+
+    def get(self, operation: Any, config: Optional[dict] = None) -> Any:
+        time.sleep(self._backend.call("operations.get", self._backend.config.operations_get))
+        done = time.monotonic() >= self._backend.ready_at.get(operation.name, 0.0)
+        return operation.model_copy(update={"done": done})
+
+
+class _Models:
+    def __init__(self, backend: _Backend) -> None:
+        self._backend = backend
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        time.sleep(self._backend.model_call("models.generate_content", self._backend.config.generate, config))
+        return self._response(contents, config)
+
+    def generate_content_stream(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> Iterator[types.GenerateContentResponse]:
+        time.sleep(self._backend.model_call("models.generate_content_stream", self._backend.config.first_token, config))
+        yield from self._chunks(contents, config, time.sleep)
+
+    def _response(self, contents: Any, config: Any) -> types.GenerateContentResponse:
+        cache_name = getattr(config, "cached_content", None) or ""
+        tools_config = self._backend.tools_config(config)
+        text, grounding = self._backend.answer(
+            _store_names(tools_config), _question(contents), _metadata_filter(tools_config)
+        )
+        cached = self._backend.caches.get(cache_name)
+        cached_tokens = cached.usage_metadata.total_token_count if cached and cached.usage_metadata else 0
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(role="model", parts=[types.Part(text=text)]),
+                    grounding_metadata=grounding,
+                )
+            ],
+            usage_metadata=_usage(_prompt_tokens(contents) + cached_tokens, cached_tokens),
+        )
+
+    def _chunks(self, contents: Any, config: Any, sleep: Any) -> Iterator[types.GenerateContentResponse]:
+        response = self._response(contents, config)
+        words = response.candidates[0].content.parts[0].text.split(" ")
+        count = max(1, self._backend.config.stream_chunks)
+        step = max(1, math.ceil(len(words) / count))
+        per_chunk = self._backend.latency(self._backend.config.generate) / count
+        for index in range(0, len(words), step):
+            sleep(per_chunk)
+            last = index + step >= len(words)
+            yield types.GenerateContentResponse(
+                candidates=[
+                    types.Candidate(
+                        content=types.Content(role="model", parts=[types.Part(text=" ".join(words[index:index + step]) + ("" if last else " "))]),
+                        grounding_metadata=response.candidates[0].grounding_metadata if last else None,
+                    )
+                ],
+                usage_metadata=response.usage_metadata if last else None,
+            )
+
+
+class _Caches:
+    def __init__(self, backend: _Backend) -> None:
+        self._backend = backend
+
+    def create(self, *, model: str, config: Any = None) -> types.CachedContent:
+        time.sleep(self._backend.call("caches.create", self._backend.config.create_store))
+        contents = getattr(config, "contents", None) if config is not None else None
+        tokens = _prompt_tokens(contents or [])
+        cache = types.CachedContent(
+            name=self._backend.next_id("cachedContents"),
+            model=model,
+            usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens),
+        )
+        self._backend.caches[cache.name] = cache
+        self._backend.cache_configs[cache.name] = config
+        return cache
+
+    def update(self, *, name: str, config: Any = None) -> types.CachedContent:
+        time.sleep(self._backend.call("caches.update", self._backend.config.operations_get))
+        return self._backend.caches[name]
+
+    def delete(self, *, name: str, config: Any = None) -> None:
+        time.sleep(self._backend.call("caches.delete", self._backend.config.delete_store))
+        self._backend.caches.pop(name, None)
+        self._backend.cache_configs.pop(name, None)
+
+
+class _AsyncModels:
+    def __init__(self, models: _Models) -> None:
+        self._models = models
+        self._backend = models._backend
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> types.GenerateContentResponse:
+        await asyncio.sleep(self._backend.model_call("models.generate_content", self._backend.config.generate, config))
+        return self._models._response(contents, config)
+
+    async def generate_content_stream(
+        self, *, model: str, contents: Any, config: Any = None
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        await asyncio.sleep(
+            self._backend.model_call("models.generate_content_stream", self._backend.config.first_token, config)
+        )
+        delays: list[float] = []
+        chunks = list(self._models._chunks(contents, config, delays.append))
+
+        async def stream() -> AsyncIterator[types.GenerateContentResponse]:
+            for delay, chunk in zip(delays, chunks):
+                await asyncio.sleep(delay)
+                yield chunk
+
+        return stream()
+
+
+class _AsyncFileSearchStores:
+    def __init__(self, stores: _FileSearchStores) -> None:
+        self._stores = stores
+
+    async def delete(self, name: str, config: Optional[dict] = None) -> None:
+        await asyncio.to_thread(self._stores.delete, name, config)
+
+
+class FakeGeminiClient:
+    """Drop-in stand-in for ``genai.Client`` backed by in-memory state."""
+
+    def __init__(self, config: FakeBackendConfig = FakeBackendConfig()) -> None:
+        self._backend = _Backend(config)
+        self.file_search_stores = _FileSearchStores(self._backend)
+        self.operations = _Operations(self._backend)
+        self.models = _Models(self._backend)
+        self.caches = _Caches(self._backend)
+        self.aio = _AsyncNamespace(self)
+
+    @property
+    def stats(self) -> FakeBackendStats:
+        return self._backend.stats
+
+    @property
+    def live_stores(self) -> list[str]:
+        return list(self._backend.stores)
+
+
+class _AsyncNamespace:
+    def __init__(self, client: FakeGeminiClient) -> None:
+        self.models = _AsyncModels(client.models)
+        self.file_search_stores = _AsyncFileSearchStores(client.file_search_stores)
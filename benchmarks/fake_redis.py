@@ -0,0 +1,134 @@
+"""Local stand-in for a Redis server, for running the ``redis`` session backend without one.
+
+Speaks RESP2 over TCP and implements the commands ``RedisSessionStore`` and
+``RespClient`` send (``PING``, ``AUTH``, ``SELECT``, ``HSET``, ``HGETALL``,
+``RPUSH``, ``LRANGE``, ``DEL``, ``EXPIRE``), with lazy key expiry. Counts
+commands and bytes received so benchmarks can compare write patterns::
+
+    server = FakeRedisServer().start()
+    store = RedisSessionStore(server.url)
+"""
+from __future__ import annotations
+
+import socketserver
+import threading
+import time
+from typing import Any, Optional
+
+
+class _Status(bytes):
+    """A simple-string reply such as ``+OK``, as opposed to a bulk string."""
+
+
+class FakeRedisServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None) -> None:
+        self.password = password
+        self.commands = 0
+        self.bytes_received = 0
+        self._data: dict[bytes, Any] = {}
+        self._expiry: dict[bytes, float] = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            disable_nagle_algorithm = True
+
+            def handle(self) -> None:
+                authenticated = server.password is None
+                while True:
+                    command = server._read_command(self.rfile)
+                    if command is None:
+                        return
+                    name = command[0].upper()
+                    if name == b"AUTH":
+                        authenticated = command[-1].decode() == server.password
+                        reply: Any = _Status(b"OK") if authenticated else Exception("WRONGPASS invalid password")
+                    elif not authenticated:
+                        reply = Exception("NOAUTH Authentication required.")
+                    else:
+                        reply = server._execute(name, command[1:])
+                    self.wfile.write(_encode(reply))
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _read_command(self, rfile: Any) -> Optional[list[bytes]]:
+        line = rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        received = len(line)
+        args = []
+        for _ in range(count):
+            header = rfile.readline()
+            size = int(header[1:-2])
+            args.append(rfile.read(size + 2)[:-2])
+            received += len(header) + size + 2
+        with self._lock:
+            self.commands += 1
+            self.bytes_received += received
+        return args
+
+    def _execute(self, name: bytes, args: list[bytes]) -> Any:
+        with self._lock:
+            for key in [key for key, deadline in self._expiry.items() if deadline <= time.time()]:
+                self._data.pop(key, None)
+                del self._expiry[key]
+            if name in (b"PING", b"SELECT"):
+                return _Status(b"PONG" if name == b"PING" else b"OK")
+            if name == b"HSET":
+                mapping = self._data.setdefault(args[0], {})
+                added = sum(1 for field in args[1::2] if field not in mapping)
+                mapping.update(zip(args[1::2], args[2::2]))
+                return added
+            if name == b"HGETALL":
+                return [item for pair in self._data.get(args[0], {}).items() for item in pair]
+            if name == b"RPUSH":
+                values = self._data.setdefault(args[0], [])
+                values.extend(args[1:])
+                return len(values)
+            if name == b"LRANGE":
+                values = self._data.get(args[0], [])
+                start, stop = int(args[1]), int(args[2])
+                return values[start : (stop + 1) or None]
+            if name == b"DEL":
+                removed = sum(1 for key in args if self._data.pop(key, None) is not None)
+                for key in args:
+                    self._expiry.pop(key, None)
+                return removed
+            if name == b"EXPIRE":
+                if args[0] not in self._data:
+                    return 0
+                self._expiry[args[0]] = time.time() + int(args[1])
+                return 1
+            return Exception(f"ERR unknown command '{name.decode()}'")
+
+
+def _encode(reply: Any) -> bytes:
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, _Status):
+        return b"+" + reply + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
@@ -0,0 +1,88 @@
+"""Query latency versus the number of stores searched.
+
+Creates N stores on the fake backend, then answers the same question three
+ways: one request per store in sequence, one request naming every store, and
+``GeminiService.query_stores`` fanning groups of ``--per-request`` stores
+out concurrently. Retrieval cost grows with the stores named in a request
+(``retrieval_per_store``), so the best split depends on the store count.
+Usage::
+
+    python -m benchmarks.multi_store --stores 1 2 5 10 20 --per-request 5 --fanout 4
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import time
+from typing import Callable
+
+from google.genai import types
+
+from app.services.gemini_service import GeminiService
+from app.utils.conversation import merge_answers
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+def timed(repeats: int, func: Callable[[], list]) -> tuple[float, int]:
+    """Median seconds over ``repeats`` runs, and the grounded passages of the last answer."""
+    durations = []
+    responses: list = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        responses = func()
+        durations.append(time.perf_counter() - start)
+    _, sources = merge_answers(responses)
+    return sorted(durations)[len(durations) // 2], len(sources.chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stores", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    parser.add_argument("--per-request", type=int, default=5, help="stores named in one request")
+    parser.add_argument("--fanout", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--retrieval-per-store", type=float, default=0.05)
+    parser.add_argument("--scale", type=float, default=0.2, help="multiplier on model latency")
+    args = parser.parse_args()
+
+    client = FakeGeminiClient(
+        FakeBackendConfig(
+            create_store=Latency(0.0),
+            upload=Latency(0.0),
+            indexing=Latency(0.0),
+            operations_get=Latency(0.0),
+            generate=Latency(1.5 * args.scale, 0.1),
+            retrieval_per_store=args.retrieval_per_store * args.scale,
+            seed=1,
+        )
+    )
+    conversation = [types.Content(role="user", parts=[types.Part(text="Summarise the findings.")])]
+    model = "gemini-2.5-flash"
+
+    print(f"{'stores':>6}{'sequential s':>14}{'one request s':>15}{'fan-out s':>11}{'groups':>8}{'passages':>10}")
+    for count in args.stores:
+        names = []
+        for i in range(count):
+            store = GeminiService.create_file_search_store(client, f"partition-{i}")
+            GeminiService.upload_files_to_store(client, store.name, [(io.BytesIO(b"%PDF-1.4 fake"), f"part-{i}.pdf")])
+            names.append(store.name)
+
+        sequential, _ = timed(
+            args.repeats,
+            lambda: [GeminiService.query_file_search(client, conversation, name, model) for name in names],
+        )
+        single, _ = timed(args.repeats, lambda: [GeminiService.query_file_search(client, conversation, names, model)])
+        fanned, passages = timed(
+            args.repeats,
+            lambda: GeminiService.query_stores(
+                client, conversation, names, model, max_concurrency=args.fanout, per_request=args.per_request
+            ),
+        )
+        groups = len(GeminiService.partition_stores(names, args.per_request))
+        print(f"{count:>6}{sequential:>14.2f}{single:>15.2f}{fanned:>11.2f}{groups:>8}{passages:>10}")
+        for name in names:
+            GeminiService.cleanup_store(client, name)
+
+
+if __name__ == "__main__":
+    main()
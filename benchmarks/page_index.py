@@ -0,0 +1,106 @@
+"""Resolving a grounding chunk to its page: the mapped page index versus scanning the page texts.
+
+Builds a synthetic document of ``--pages`` pages, writes its page index and
+resolves ``--lookups`` passages (some running over a page break) three
+ways: "scan" shingles every page at query time and picks the page sharing
+the most 3-grams with the passage, as a lookup without an index would;
+"index" is ``PageIndex.locate`` on a fresh mapping; "cached" repeats the
+same lookups, as a Streamlit rerun does. Reports build time, index size,
+mean milliseconds per lookup and how many lookups found the right page.
+Usage::
+
+    python -m benchmarks.page_index --pages 100 500 2000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Optional
+
+from app.services.page_index import DocumentPages, PageIndex, _shingles, _words, write_page_index
+
+
+def make_pages(count: int, rng: random.Random) -> list[str]:
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrst") for _ in range(rng.randint(3, 10))) for _ in range(8000)]
+    return [
+        f"Annual Report 2024 — page {number}\n" + " ".join(rng.choice(vocabulary) for _ in range(450))
+        for number in range(1, count + 1)
+    ]
+
+
+def make_passages(pages: list[str], count: int, rng: random.Random) -> list[tuple[int, str]]:
+    """(1-based page the passage starts on, passage text)."""
+    passages = []
+    for _ in range(count):
+        page = rng.randrange(len(pages) - 1)
+        words = pages[page].split()
+        start = rng.randrange(len(words) - 100)
+        text = words[start : start + 250]
+        if len(text) < 250:
+            text += pages[page + 1].split()[: 250 - len(text)]
+        passages.append((page + 1, " ".join(text)))
+    return passages
+
+
+def scanner(pages: list[str]) -> Callable[[str], Optional[int]]:
+    def locate(text: str) -> Optional[int]:
+        keys = set(_shingles(_words(text)))
+        best, best_overlap = None, 0
+        for number, page in enumerate(pages, start=1):
+            overlap = len(keys.intersection(_shingles(_words(page))))
+            if overlap > best_overlap:
+                best, best_overlap = number, overlap
+        return best
+
+    return locate
+
+
+def run(locate: Callable[[str], Optional[int]], passages: list[tuple[int, str]]) -> tuple[float, int]:
+    """Mean seconds per lookup and the number that found the starting page."""
+    correct = 0
+    start = time.perf_counter()
+    for page, text in passages:
+        correct += locate(text) == page
+    return (time.perf_counter() - start) / len(passages), correct
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--scan-lookups", type=int, default=10, help="The scan is slow; time fewer lookups")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    directory = tempfile.mkdtemp(prefix="page-index-bench-")
+    for count in args.pages:
+        pages = make_pages(count, rng)
+        passages = make_passages(pages, args.lookups, rng)
+        path = os.path.join(directory, f"{count}.pgidx")
+        start = time.perf_counter()
+        write_page_index(path, [DocumentPages("report.pdf", pages)])
+        build = time.perf_counter() - start
+        print(f"\n{count} pages: built in {build:.2f} s, {os.path.getsize(path) / 2**20:.1f} MiB")
+        print(f"{'method':<8} {'ms/lookup':>10} {'correct':>10}")
+
+        index = PageIndex(path)
+
+        def indexed(text: str) -> Optional[int]:
+            match = index.locate("report.pdf", text)
+            return match.pages[0] if match else None
+
+        results = {
+            "scan": run(scanner(pages), passages[: args.scan_lookups]),
+            "index": run(indexed, passages),
+            "cached": run(indexed, passages),
+        }
+        for name, (per_lookup, correct) in results.items():
+            total = args.scan_lookups if name == "scan" else len(passages)
+            print(f"{name:<8} {per_lookup * 1000:10.3f} {f'{correct}/{total}':>10}")
+
+
+if __name__ == "__main__":
+    main()
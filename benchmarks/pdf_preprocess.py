@@ -0,0 +1,91 @@
+"""Measure bytes saved and upload time gained by client-side PDF preprocessing.
+
+Generates scanned-style PDFs (one large photo per page), preprocesses them in
+the process pool and uploads original and processed files to the fake backend
+at a fixed bandwidth. Requires the ``pdf`` extra. Usage::
+
+    python -m benchmarks.pdf_preprocess --documents 4 --pages 40 --bandwidth-mbps 20
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageFilter
+
+from app.services.gemini_service import GeminiService
+from app.services.pdf_preprocessor import PreprocessOptions
+from app.services.pdf_service import PDFService
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+def scanned_pdf(pages: int, width: int, height: int, rng: random.Random) -> str:
+    """Write a PDF whose pages are high-quality JPEG scans."""
+    images = []
+    for _ in range(pages):
+        base = Image.effect_noise((width // 4, height // 4), 40).resize((width, height))
+        tint = Image.new("RGB", (width, height), tuple(rng.randrange(180, 255) for _ in range(3)))
+        images.append(Image.blend(tint, base.convert("RGB"), 0.35).filter(ImageFilter.SMOOTH))
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as handle:
+        images[0].save(handle, "PDF", save_all=True, append_images=images[1:], quality=95, resolution=300)
+    return handle.name
+
+
+def upload_time(items: list, bandwidth: float) -> float:
+    client = FakeGeminiClient(
+        FakeBackendConfig(upload=Latency(0.05), indexing=Latency(0.05), operations_get=Latency(0.01), upload_bandwidth=bandwidth)
+    )
+    store = GeminiService.create_file_search_store(client, "benchmark")
+    start = time.perf_counter()
+    GeminiService.upload_files_to_store(client, store.name, items)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--width", type=int, default=2480, help="scan width in pixels (A4 at 300 dpi)")
+    parser.add_argument("--height", type=int, default=3508)
+    parser.add_argument("--split-pages", type=int, default=10)
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0, help="simulated upload bandwidth")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    paths = [scanned_pdf(args.pages, args.width, args.height, rng) for _ in range(args.documents)]
+    files = [(path, f"scan-{i}.pdf") for i, path in enumerate(paths)]
+    options = PreprocessOptions(split_pages=args.split_pages)
+    bandwidth = args.bandwidth_mbps * 1e6 / 8
+
+    with PDFService.create_preprocess_pool(args.workers or os.cpu_count() or 2) as pool:
+        start = time.perf_counter()
+        prepared = PDFService.preprocess_files(files, pool, options)
+        preprocess_seconds = time.perf_counter() - start
+    try:
+        original_bytes = sum(doc.original_size for doc in prepared.documents)
+        processed_bytes = sum(doc.processed_size for doc in prepared.documents)
+        original_upload = upload_time(files, bandwidth)
+        processed_upload = upload_time(prepared.items, bandwidth)
+    finally:
+        PDFService.cleanup_local_files(paths)
+        PDFService.cleanup_local_files(prepared.temp_paths)
+
+    print(f"documents            {args.documents} x {args.pages} pages")
+    print(f"upload parts         {len(files)} -> {len(prepared.items)}")
+    print(f"images resampled     {sum(doc.images_resampled for doc in prepared.documents)}")
+    print(f"bytes                {original_bytes / 1e6:.1f} MB -> {processed_bytes / 1e6:.1f} MB "
+          f"({100 * (1 - processed_bytes / original_bytes):.0f}% saved)")
+    print(f"preprocessing        {preprocess_seconds:.2f}s")
+    print(f"upload + index       {original_upload:.2f}s -> {processed_upload:.2f}s")
+    print(f"end to end           {original_upload:.2f}s -> {preprocess_seconds + processed_upload:.2f}s")
+    errors = [doc.error for doc in prepared.documents if doc.error]
+    if errors:
+        print(f"errors               {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compare fixed-interval and adaptive operation polling against a fake operations API.
+
+Runs on a simulated clock, so it finishes instantly while modelling real
+indexing times. Detection lag counts from when an operation is done, or from
+when a serial loop first polls it if that is later; the time done operations
+wait for the loop to reach them is reported as queueing. Usage::
+
+    python -m benchmarks.poll_latency --operations 200 --seed 7
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+from dataclasses import dataclass, replace
+
+from app.services.operation_poller import BackoffPolicy, OperationPoller
+
+
+@dataclass(frozen=True)
+class FakeOperation:
+    name: str
+    ready_at: float
+    done: bool = False
+    error: None = None
+
+
+class SimulatedClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class FakeOperations:
+    """Minimal ``client.operations`` that completes each operation at ``ready_at``."""
+
+    def __init__(self, clock: SimulatedClock) -> None:
+        self._clock = clock
+        self.detected_at: dict[str, float] = {}
+
+    def get(self, operation: FakeOperation) -> FakeOperation:
+        if self._clock() < operation.ready_at:
+            return operation
+        self.detected_at.setdefault(operation.name, self._clock())
+        return replace(operation, done=True)
+
+
+class FakeClient:
+    def __init__(self, clock: SimulatedClock) -> None:
+        self.operations = FakeOperations(clock)
+
+
+@dataclass(frozen=True)
+class Result:
+    detect_lag: float  # mean time from an operation finishing (or being picked up, if later) to its detection
+    queueing: float  # mean time finished operations waited for a serial loop to reach them
+    wall: float
+    poll_calls: int
+
+
+def run(policy: BackoffPolicy, ready_times: list[float], seed: int, shared: bool) -> Result:
+    clock = SimulatedClock()
+    client = FakeClient(clock)
+    operations = [FakeOperation(f"op-{i}", ready) for i, ready in enumerate(ready_times)]
+    rng = random.Random(seed).random
+    poll_calls = 0
+    started = {op.name: 0.0 for op in operations}
+    if shared:
+        poller = OperationPoller(client, policy=policy, timeout=3600, clock=clock, sleep=clock.sleep, rng=rng)
+        poller.wait(operations)
+        poll_calls = poller.poll_calls
+    else:
+        # One poller per operation, waited on serially, as a single-file loop would.
+        for operation in operations:
+            started[operation.name] = clock()
+            poller = OperationPoller(client, policy=policy, timeout=3600, clock=clock, sleep=clock.sleep, rng=rng)
+            poller.wait([operation])
+            poll_calls += poller.poll_calls
+
+    queueing = [max(0.0, started[op.name] - op.ready_at) for op in operations]
+    lags = [
+        client.operations.detected_at[op.name] - op.ready_at - queued for op, queued in zip(operations, queueing)
+    ]
+    return Result(statistics.mean(lags), statistics.mean(queueing), clock(), poll_calls)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=100)
+    parser.add_argument("--mean-indexing", type=float, default=8.0, help="mean indexing time in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ready_times = [rng.expovariate(1 / args.mean_indexing) for _ in range(args.operations)]
+
+    fixed = BackoffPolicy(initial=2.0, multiplier=1.0, maximum=2.0, jitter=0.0)
+    adaptive = BackoffPolicy()
+    print(f"{'strategy':<28}{'detect lag (s)':>16}{'queueing (s)':>14}{'wall clock (s)':>16}{'poll calls':>12}")
+    for label, policy, shared in (
+        ("fixed 2s, serial", fixed, False),
+        ("adaptive, serial", adaptive, False),
+        ("fixed 2s, shared poller", fixed, True),
+        ("adaptive, shared poller", adaptive, True),
+    ):
+        result = run(policy, ready_times, args.seed, shared)
+        print(
+            f"{label:<28}{result.detect_lag:>16.3f}{result.queueing:>14.2f}"
+            f"{result.wall:>16.2f}{result.poll_calls:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
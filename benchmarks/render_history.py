@@ -0,0 +1,84 @@
+"""Benchmark Streamlit rerun time of the chat history against history length.
+
+Compares the windowed renderer in ``app.ui.components`` with the previous
+eager renderer (every message plus ``st.json`` of every grounding payload).
+Uses Streamlit's AppTest harness, so no browser is involved. Usage::
+
+    python -m benchmarks.render_history --lengths 10 50 200
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from app.utils.sources import SourceSet
+
+_SCRIPT = """
+import streamlit as st
+from app.ui.components import render_chat_history
+
+MODE = {mode!r}
+
+if MODE == "windowed":
+    render_chat_history(st.session_state["chat_history"], "en")
+else:
+    for message in st.session_state["chat_history"]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            if message.get("sources"):
+                with st.expander("Sources"):
+                    for source in message["sources"]:
+                        st.json(source)
+"""
+
+
+def synthetic_history(turns: int, typed: bool, chunks_per_answer: int = 5) -> list[dict]:
+    """Build a session; ``typed`` uses SourceSet, otherwise the old raw JSON payload list."""
+    history: list[dict] = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Question {turn} about the document?"})
+        texts = [f"Chunk {turn}-{i} " + "lorem ipsum " * 80 for i in range(chunks_per_answer)]
+        if typed:
+            sources = SourceSet()
+            for text in texts:
+                sources.add_support("supported span", (sources.add_chunk("report.pdf", "", text),))
+        else:
+            sources = [{"retrieved_context": {"title": "report.pdf", "text": text}} for text in texts]
+            sources += [
+                {"segment": {"start_index": 0, "end_index": 120, "text": "supported span"}, "grounding_chunk_indices": [i]}
+                for i in range(chunks_per_answer)
+            ]
+        history.append({"role": "assistant", "content": "An answer. " * 40, "sources": sources})
+    return history
+
+
+def measure(mode: str, turns: int, repeats: int) -> float:
+    app = AppTest.from_string(_SCRIPT.format(mode=mode), default_timeout=120)
+    app.session_state["chat_history"] = synthetic_history(turns, typed=mode == "windowed")
+    app.run()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 50, 100, 200], help="turns of history")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'turns':>6}{'eager ms':>12}{'windowed ms':>14}{'speedup':>10}")
+    for turns in args.lengths:
+        eager = measure("eager", turns, args.repeats)
+        windowed = measure("windowed", turns, args.repeats)
+        print(f"{turns:>6}{eager * 1000:>12.1f}{windowed * 1000:>14.1f}{eager / windowed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Per-turn cost of saving chat history: appending one turn versus rewriting it all.
+
+For each session state backend (memory, SQLite, and the Redis backend
+against the local ``FakeRedisServer``), plays a conversation of ``--turns``
+question/answer pairs with grounded sources and measures the time per turn
+and, for Redis, the bytes sent. "append" is what the app does
+(``append_turn``); "rewrite" stores the whole encoded history as one field
+after every turn, as a snapshot-based design would. Also reports the
+encoded size of the history against plain JSON. Usage::
+
+    python -m benchmarks.session_state --turns 10 50 200
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable
+
+from app.services.session_store import (
+    MemorySessionStore,
+    RedisSessionStore,
+    SQLiteSessionStore,
+    SessionStore,
+    encode_turn,
+)
+from app.utils.sources import SourceSet
+from benchmarks.fake_redis import FakeRedisServer
+
+
+def make_turns(count: int) -> list[dict[str, Any]]:
+    turns = []
+    for index in range(count):
+        sources = SourceSet()
+        for chunk in range(4):
+            sources.add_label(f"report-{chunk}.pdf")
+            text = f"Passage {index}.{chunk}: " + "revenue grew steadily " * 30
+            sources.add_chunk(f"report-{chunk}.pdf", "", text)
+        sources.add_support(f"Claim {index}.", (0, 1), 0.87)
+        turns.append({"role": "user", "content": f"Question {index} about the quarterly figures?"})
+        answer = f"Answer {index}. " + "The figures show growth. " * 20
+        turns.append({"role": "assistant", "content": answer, "sources": sources})
+    return turns
+
+
+def play(store: SessionStore, session_id: str, turns: list[dict[str, Any]], rewrite: bool) -> float:
+    """Mean seconds per saved turn."""
+    start = time.perf_counter()
+    for index, turn in enumerate(turns):
+        if rewrite:
+            history = [base64.b64encode(encode_turn(item)).decode("ascii") for item in turns[: index + 1]]
+            store.save_fields(session_id, {"chat_history": history})
+        else:
+            store.append_turn(session_id, turn)
+    return (time.perf_counter() - start) / len(turns)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    server = FakeRedisServer().start()
+    directory = tempfile.mkdtemp(prefix="session-state-bench-")
+    backends: dict[str, Callable[[], SessionStore]] = {
+        "memory": MemorySessionStore,
+        "sqlite": lambda: SQLiteSessionStore(os.path.join(directory, "sessions.sqlite3")),
+        "redis": lambda: RedisSessionStore(server.url),
+    }
+    try:
+        for pairs in args.turns:
+            turns = make_turns(pairs)
+            encoded = sum(len(encode_turn(turn)) for turn in turns)
+            plain = sum(
+                len(json.dumps({**turn, "sources": turn["sources"].to_dict()} if "sources" in turn else turn))
+                for turn in turns
+            )
+            print(f"\n{pairs} question/answer pairs: history {encoded / 1024:.0f} KiB encoded, {plain / 1024:.0f} KiB JSON")
+            print(f"{'backend':<8} {'mode':<8} {'ms/turn':>9} {'KiB sent/turn':>14}")
+            for name, factory in backends.items():
+                store = factory()
+                for mode in ("append", "rewrite"):
+                    sent = server.bytes_received
+                    per_turn = play(store, f"{name}-{mode}-{pairs}", turns, rewrite=mode == "rewrite")
+                    sent = (server.bytes_received - sent) / len(turns) / 1024
+                    kib = f"{sent:14.1f}" if name == "redis" else f"{'-':>14}"
+                    print(f"{name:<8} {mode:<8} {per_turn * 1000:9.3f} {kib}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Memory benchmark: per-session source storage for a synthetic 200-turn session.
+
+Builds grounded responses whose chunks are drawn from a fixed pool of
+document passages (as File Search does) and compares what the session keeps
+per answer: the previous list of raw ``to_json_dict()`` payloads versus the
+``SourceSet`` produced by ``parse_response``. Usage::
+
+    python -m benchmarks.source_memory --turns 200
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tracemalloc
+from typing import Any, Callable
+
+from google.genai import types
+
+from app.utils.conversation import parse_response
+
+
+def synthetic_response(rng: random.Random, passages: list[str], chunks_per_answer: int) -> types.GenerateContentResponse:
+    picked = rng.sample(range(len(passages)), chunks_per_answer)
+    # Decode-from-JSON fresh strings each time, like the SDK does.
+    chunks = [
+        types.GroundingChunk(
+            retrieved_context=types.GroundingChunkRetrievedContext(
+                title="annual-report.pdf", text="".join(list(passages[index]))
+            )
+        )
+        for index in picked
+    ]
+    supports = [
+        types.GroundingSupport(
+            segment=types.Segment(start_index=i * 80, end_index=i * 80 + 80, text=f"Claim number {i} in the answer."),
+            grounding_chunk_indices=[i, (i + 1) % chunks_per_answer],
+            confidence_scores=[0.9, 0.7],
+        )
+        for i in range(chunks_per_answer)
+    ]
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text="Answer text. " * 30)]),
+                grounding_metadata=types.GroundingMetadata(grounding_chunks=chunks, grounding_supports=supports),
+            )
+        ]
+    )
+
+
+def legacy_sources(response: types.GenerateContentResponse) -> list[Any]:
+    """The previous representation: every chunk and support as a raw JSON dict."""
+    metadata = response.candidates[0].grounding_metadata
+    sources: list[Any] = [chunk.to_json_dict() for chunk in metadata.grounding_chunks]
+    sources += [support.to_json_dict() for support in metadata.grounding_supports]
+    return sources
+
+
+def measure(responses: list[types.GenerateContentResponse], extract: Callable[[Any], Any]) -> int:
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    session = [extract(response) for response in responses]
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del session
+    return current - baseline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--passages", type=int, default=150, help="distinct passages in the document")
+    parser.add_argument("--chunks", type=int, default=6, help="grounding chunks per answer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    passages = [f"Passage {i}: " + " ".join(rng.choice(["revenue", "growth", "risk", "market", "cost"]) for _ in range(180)) for i in range(args.passages)]
+    responses = [synthetic_response(rng, passages, args.chunks) for _ in range(args.turns)]
+
+    legacy = measure(responses, legacy_sources)
+    typed = measure(responses, lambda response: parse_response(response)[1])
+    print(f"turns={args.turns} chunks/answer={args.chunks} distinct passages={args.passages}")
+    print(f"{'representation':<22}{'total KiB':>12}{'KiB/answer':>12}")
+    print(f"{'raw JSON payloads':<22}{legacy / 1024:>12.1f}{legacy / 1024 / args.turns:>12.2f}")
+    print(f"{'SourceSet':<22}{typed / 1024:>12.1f}{typed / 1024 / args.turns:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
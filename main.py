@@ -2,14 +2,50 @@ from __future__ import annotations
 
 import streamlit as st
 from dotenv import load_dotenv
+from google import genai
+from google.genai import types
 
 from app.core.config import Config
 from app.core.exceptions import GeminiServiceError, FileUploadError
-from app.core.state import append_chat_message, init_session_state, reset_uploaded_pdf_state
-from app.services.gemini_service import GeminiService
+from app.core.resources import (
+    get_answer_cache,
+    get_brief_store,
+    get_client_pool,
+    get_ingestion_queue,
+    get_page_index_store,
+    get_store_cache,
+    get_store_reaper,
+    get_store_registry,
+    get_telemetry,
+)
+from app.core.state import (
+    append_chat_message,
+    clear_chat_history,
+    ensure_session_id,
+    init_session_state,
+    reset_uploaded_pdf_state,
+    restore_session_state,
+    save_session_state,
+)
+from app.core.telemetry import TurnMetrics, traced
+from app.services.answer_cache import AnswerCache
+from app.services.context_cache import ContextCache
+from app.services.document_brief import DocumentBrief, PreparedAnswer
+from app.services.gemini_service import GeminiService, UploadSource
+from app.services.ingestion import JobStatus
+from app.services.page_index import PageLocator
 from app.services.pdf_service import PDFService
-from app.ui.components import SidebarEvent, render_chat_history, render_sidebar, render_sources_section
-from app.utils.conversation import build_conversation_contents, parse_response
+from app.services.scheduler import is_busy, scheduler
+from app.ui.components import (
+    SidebarEvent,
+    render_chat_history,
+    render_debug_panel,
+    render_document_brief,
+    render_ingestion_status,
+    render_sidebar,
+    render_sources_section,
+)
+from app.utils.conversation import ConversationWindow, ResponseStream, merge_answers, parse_response
 from app.utils.localization import get_text
 
 load_dotenv()
@@ -23,14 +59,30 @@ def main() -> None:
     )
 
     init_session_state()
+    ensure_session_id()
+    get_telemetry()
+    get_store_reaper()
+    try:
+        render_page()
+    finally:
+        # Also runs when a flow stops the script early with st.rerun().
+        save_session_state()
+
 
+def render_page() -> None:
     sidebar_event = render_sidebar(Config.MODEL_OPTIONS)
     lang = sidebar_event.language
+    api_key = st.session_state.get("api_key")
+    if restore_session_state(GeminiService.api_key_fingerprint(api_key) if api_key else None):
+        st.rerun()  # render the sidebar with the restored language and model
+    scheduler.bind(st.session_state["session_id"])
 
     handle_upload_flow(sidebar_event, lang)
+    handle_reattach(lang)
     if sidebar_event.clear_requested:
         handle_clear_flow(lang)
         return
+    handle_ingestion_status(lang)
 
     st.title(get_text("page_title", lang))
     st.subheader(get_text("main_title", lang))
@@ -39,20 +91,26 @@ def main() -> None:
     if not ensure_api_key(lang):
         return
 
-    if not st.session_state.get("store_name"):
+    if not st.session_state.get("store_name") and not st.session_state.get("ingestion_job"):
         st.info(get_text("upload_prompt", lang))
 
-    render_chat_history(st.session_state["chat_history"], lang)
+    render_chat_history(st.session_state["chat_history"], lang, page_locator())
     handle_chat_flow(lang)
+    brief = document_brief()
+    if brief is not None:
+        render_document_brief(brief, st.session_state["chat_history"], lang)
+    if Config.DEBUG_PANEL_ENABLED:
+        render_debug_panel(st.session_state["turn_metrics"], lang)
 
     st.markdown("---")
     st.caption(get_text("footer", lang))
 
 
+@traced("flow.upload")
 def handle_upload_flow(sidebar_event: SidebarEvent, lang: str) -> None:
-    uploaded_file = sidebar_event.uploaded_file
-    if not sidebar_event.should_process_upload or not uploaded_file:
-        if uploaded_file and not st.session_state.get("api_key"):
+    uploaded_files = sidebar_event.uploaded_files
+    if not sidebar_event.should_process_upload or not uploaded_files:
+        if uploaded_files and not st.session_state.get("api_key"):
             st.info(get_text("api_key_required", lang))
         return
 
@@ -61,48 +119,132 @@ def handle_upload_flow(sidebar_event: SidebarEvent, lang: str) -> None:
         st.info(get_text("api_key_required", lang))
         return
 
-    existing_store = st.session_state.get("store_name")
-    existing_client = st.session_state.get("client")
-    if existing_store and existing_client:
-        safe_cleanup_remote_store(existing_client, existing_store, lang, bubble_up=False)
-    PDFService.cleanup_local_file(st.session_state.get("uploaded_path"))
+    # Previous stores stay alive in the upload cache so switching back to an
+    # earlier document set is instant; the cache evicts and deletes them later.
+    filenames = sorted(uploaded_file.name for uploaded_file in uploaded_files)
+    st.session_state["requested_filenames"] = filenames
 
     with st.spinner(get_text("processing", lang)):
-        try:
-            saved_path = PDFService.save_uploaded_file(uploaded_file)
-        except FileUploadError as exc:
-            st.error(get_text("error_save_file", lang).format(exc))
+        client = ensure_session_client(api_key)
+
+        # Either hash the in-memory buffers and upload them directly, or stream
+        # them to temp files and hash in the same pass (preprocessing needs files).
+        saved_paths: list[str] = []
+        digests: list[str] = []
+        if Config.UPLOAD_FROM_MEMORY and not PDFService.preprocessing_enabled():
+            sources: list[UploadSource] = list(uploaded_files)
+            digests = [PDFService.compute_sha256(uploaded_file) for uploaded_file in uploaded_files]
+        else:
+            try:
+                for uploaded_file in uploaded_files:
+                    saved = PDFService.save_and_hash(uploaded_file)
+                    saved_paths.append(saved.path)
+                    digests.append(saved.sha256)
+            except FileUploadError as exc:
+                PDFService.cleanup_local_files(saved_paths)
+                st.error(get_text("error_save_file", lang).format(exc))
+                return
+            sources = list(saved_paths)
+
+        owner = GeminiService.api_key_fingerprint(api_key)
+        tags = sidebar_event.tags
+        # Tags are stored with the documents, so the same PDFs tagged
+        # differently are indexed separately.
+        corpus_hash = PDFService.combine_hashes(digests + [f"tags:{','.join(tags)}"] if tags else digests)
+        # Whatever is still indexing belongs to the previous selection.
+        queue = get_ingestion_queue()
+        queue.cancel(st.session_state.get("ingestion_job"))
+        st.session_state["ingestion_job"] = None
+        cached_store = get_store_cache().lookup(client, owner, corpus_hash)
+        if cached_store:
+            PDFService.cleanup_local_files(saved_paths)
+            activate_store(cached_store, corpus_hash, filenames, tags)
+            st.success(get_text("upload_reused", lang).format(", ".join(filenames)))
             return
 
-        client = GeminiService.ensure_client(
-            api_key,
-            st.session_state.get("client"),
-            st.session_state.get("client_api_key"),
+        st.session_state["ingestion_job"] = queue.submit(
+            client,
+            owner,
+            corpus_hash,
+            [
+                (source, uploaded_file.name, GeminiService.build_document_metadata(uploaded_file.name, digest, tags))
+                for source, uploaded_file, digest in zip(sources, uploaded_files, digests)
+            ],
+            saved_paths,
+            session_id=st.session_state["session_id"],
+            model=st.session_state["model"],
         )
-        st.session_state["client"] = client
-        st.session_state["client_api_key"] = api_key
-        store_name = GeminiService.build_store_name()
-
-        try:
-            store = GeminiService.create_file_search_store(client, store_name)
-        except GeminiServiceError as exc:
-            PDFService.cleanup_local_file(saved_path)
-            st.error(get_text("error_create_store", lang).format(exc))
-            return
+        st.session_state["pending_tags"] = tags
 
-        try:
-            GeminiService.upload_file_to_store(client, store.name, saved_path, uploaded_file.name)
-        except GeminiServiceError as exc:
-            PDFService.cleanup_local_file(saved_path)
-            safe_cleanup_remote_store(client, store.name, lang, bubble_up=False)
-            st.error(get_text("error_upload_store", lang).format(exc))
-            return
 
-        st.session_state["store_name"] = store.name
-        st.session_state["uploaded_filename"] = uploaded_file.name
-        st.session_state["uploaded_path"] = saved_path
-        st.session_state["chat_history"] = []
-        st.success(get_text("upload_success", lang).format(uploaded_file.name))
+def handle_reattach(lang: str) -> None:
+    """On a fresh session, reopen the store this session id last used instead of re-indexing."""
+    api_key = st.session_state.get("api_key")
+    if st.session_state.get("reattach_checked") or not api_key:
+        return
+    st.session_state["reattach_checked"] = True
+    if st.session_state.get("ingestion_job"):
+        return
+    store_name = st.session_state.get("store_name")
+    if store_name:
+        # Usually restored from the session state backend; the reaper may have deleted it since.
+        # Anything but a confirmed 404 keeps the store: it may only be unreachable right now.
+        if GeminiService.store_exists(ensure_session_client(api_key), store_name) is False:
+            get_store_registry().forget(store_name)
+            reset_uploaded_pdf_state()
+        return
+
+    registry = get_store_registry()
+    record = registry.latest_for_session(st.session_state["session_id"], GeminiService.api_key_fingerprint(api_key))
+    if record is None:
+        return
+    client = ensure_session_client(api_key)
+    exists = GeminiService.store_exists(client, record.store_name)
+    if exists is False:
+        registry.forget(record.store_name)
+    if not exists:
+        return
+    activate_store(record.store_name, record.document_hash, sorted(record.filenames))
+    st.session_state["requested_filenames"] = sorted(record.filenames)
+    st.info(get_text("store_reattached", lang).format(", ".join(sorted(record.filenames))))
+
+
+@traced("flow.ingestion_status")
+def handle_ingestion_status(lang: str) -> None:
+    job = get_ingestion_queue().get(st.session_state.get("ingestion_job"))
+    if job is None:
+        return
+    if job.status is JobStatus.DONE:
+        activate_store(job.store_name, job.document_hash, sorted(job.filenames), st.session_state["pending_tags"])
+        st.session_state["ingestion_job"] = None
+        st.success(get_text("upload_success", lang).format(", ".join(sorted(job.filenames))))
+        for warning in job.warnings:
+            st.warning(get_text("error_pdf_extract", lang).format(warning))
+    elif job.status is JobStatus.FAILED:
+        # Shown once; dropping the job lets the same files be uploaded again.
+        st.session_state["ingestion_job"] = None
+        st.error(get_text("error_upload_store", lang).format(job.error))
+    else:
+        ingestion_status_fragment(lang)
+
+
+@st.fragment(run_every=Config.INGESTION_STATUS_REFRESH)
+def ingestion_status_fragment(lang: str) -> None:
+    job = get_ingestion_queue().get(st.session_state.get("ingestion_job"))
+    if job is None or job.status.finished:
+        st.rerun()
+    render_ingestion_status(job, lang)
+
+
+def activate_store(store_name: str, document_hash: str, filenames: list[str], tags: list[str] | None = None) -> None:
+    get_store_registry().touch(store_name, st.session_state["session_id"])
+    st.session_state["store_name"] = store_name
+    st.session_state["document_hash"] = document_hash
+    st.session_state["uploaded_filenames"] = filenames
+    st.session_state["document_tags"] = tags or []
+    st.session_state["filter_filenames"] = []
+    st.session_state["filter_tags"] = []
+    clear_chat_history()
 
 
 def handle_clear_flow(lang: str) -> None:
@@ -110,13 +252,22 @@ def handle_clear_flow(lang: str) -> None:
     store_name = st.session_state.get("store_name")
     if client and store_name:
         safe_cleanup_remote_store(client, store_name, lang)
-    PDFService.cleanup_local_file(st.session_state.get("uploaded_path"))
+        api_key = st.session_state.get("client_api_key")
+        if api_key:
+            get_store_cache().invalidate(GeminiService.api_key_fingerprint(api_key), store_name)
+        get_store_registry().forget(store_name)
+    get_ingestion_queue().cancel(st.session_state.get("ingestion_job"))
+    context_cache = st.session_state.get("context_cache")
+    if context_cache is not None:
+        context_cache.clear(client)
     reset_uploaded_pdf_state()
     st.rerun()
 
 
 def handle_chat_flow(lang: str) -> None:
-    prompt = st.chat_input(get_text("chat_input", lang))
+    """Answer the prompt typed into the chat input, or the suggested question clicked."""
+    prompt = st.chat_input(get_text("chat_input", lang)) or st.session_state["suggested_prompt"]
+    st.session_state["suggested_prompt"] = None
     if not prompt:
         return
 
@@ -128,29 +279,215 @@ def handle_chat_flow(lang: str) -> None:
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    conversation = build_conversation_contents(st.session_state["chat_history"])
+    registry = get_store_registry()
+    for store_name in query_store_names():
+        registry.touch(store_name)
+    with get_telemetry().collect() as turn:
+        answer_prompt(prompt, lang)
+    record_turn_metrics(turn)
+
+
+@traced("flow.chat")
+def answer_prompt(prompt: str, lang: str) -> None:
+    store_names = query_store_names()
+    metadata_filter = GeminiService.build_metadata_filter(
+        st.session_state["filter_filenames"], st.session_state["filter_tags"]
+    )
+    context_cache = get_context_cache() if len(GeminiService.partition_stores(store_names)) == 1 else None
+    scope = (st.session_state["model"], tuple(store_names), metadata_filter)
+    window = build_conversation_window()
+    # While its prefix is cached, the window keeps it instead of sliding past it.
+    conversation = window.build(
+        st.session_state["chat_history"], pin=context_cache is not None and context_cache.holds(scope)
+    )
+    cache_key = build_answer_cache_key(prompt, conversation, store_names, metadata_filter)
+    cached_prefix = context_cache.prefix_for(st.session_state["client"], conversation, scope) if context_cache else None
+    cached = get_answer_cache().get(cache_key) if cache_key else None
+    prepared = prepared_answer(prompt, store_names, metadata_filter) if not cached else None
+    locate = page_locator()
 
     with st.chat_message("assistant"):
-        with st.spinner(get_text("thinking", lang)):
-            try:
-                response = GeminiService.query_file_search(
+        if cached or prepared:
+            answer, sources = cached or (prepared.answer, prepared.sources)
+            st.markdown(answer)
+            st.caption(get_text("cached_answer" if cached else "prepared_answer", lang))
+            render_sources_section(sources, lang, key=str(len(st.session_state["chat_history"])), locate=locate)
+            append_chat_message("assistant", answer, sources)
+            return
+
+        # Stores that fit in one request stream; larger fan-outs are merged first.
+        if Config.STREAM_RESPONSES and len(GeminiService.partition_stores(store_names)) == 1:
+            stream = ResponseStream(
+                GeminiService.stream_file_search(
                     st.session_state["client"],
                     conversation,
-                    st.session_state["store_name"],
+                    store_names,
                     st.session_state["model"],
+                    metadata_filter,
+                    cached_prefix,
                 )
+            )
+            try:
+                st.write_stream(stream)
             except GeminiServiceError as exc:
-                st.error(get_text("error_query", lang).format(exc))
+                show_query_error(exc, lang)
                 append_chat_message("assistant", get_text("error_response", lang))
                 return
 
+            response = stream.final_response()
+            get_telemetry().record_usage(getattr(response, "usage_metadata", None))
             answer, sources = parse_response(response)
+            if answer and cache_key:
+                get_answer_cache().put(cache_key, answer, sources)
             if not answer:
                 answer = get_text("error_response", lang)
-            st.markdown(answer)
-            render_sources_section(sources, lang)
+                st.markdown(answer)
+            render_sources_section(sources, lang, key=str(len(st.session_state["chat_history"])), locate=locate)
+        else:
+            with st.spinner(get_text("thinking", lang)):
+                try:
+                    responses = GeminiService.query_stores(
+                        st.session_state["client"],
+                        conversation,
+                        store_names,
+                        st.session_state["model"],
+                        metadata_filter=metadata_filter,
+                        cached_prefix=cached_prefix,
+                    )
+                except GeminiServiceError as exc:
+                    show_query_error(exc, lang)
+                    append_chat_message("assistant", get_text("error_response", lang))
+                    return
+
+                for response in responses:
+                    get_telemetry().record_usage(response.usage_metadata)
+                answer, sources = merge_answers(responses)
+                if answer and cache_key:
+                    get_answer_cache().put(cache_key, answer, sources)
+                if not answer:
+                    answer = get_text("error_response", lang)
+                st.markdown(answer)
+                render_sources_section(sources, lang, key=str(len(st.session_state["chat_history"])), locate=locate)
 
     append_chat_message("assistant", answer, sources)
+    if context_cache is not None and answer != get_text("error_response", lang):
+        # The next turn's window starts with this turn's prompt and answer.
+        answered = conversation + [types.Content(role="model", parts=[types.Part(text=answer)])]
+        context_cache.update(
+            st.session_state["client"],
+            answered,
+            scope,
+            st.session_state["model"],
+            store_names,
+            metadata_filter,
+            rebase=lambda: window.build(st.session_state["chat_history"]),
+        )
+
+
+def show_query_error(exc: GeminiServiceError, lang: str) -> None:
+    if is_busy(exc):
+        st.warning(get_text("server_busy", lang))
+    else:
+        st.error(get_text("error_query", lang).format(exc))
+
+
+def record_turn_metrics(turn: TurnMetrics) -> None:
+    """Keep a compact per-turn latency breakdown for the debug panel."""
+    if not Config.DEBUG_PANEL_ENABLED:
+        return
+    total = next((span.duration for span in turn.spans if span.name == "flow.chat"), 0.0)
+    stages = [(span.name, span.duration) for span in turn.spans if span.name != "flow.chat"]
+    history = st.session_state["turn_metrics"]
+    history.append({"total": total, "stages": stages, "usage": dict(turn.usage)})
+    del history[:-Config.DEBUG_PANEL_TURNS]
+
+
+def query_store_names() -> list[str]:
+    """The active store, plus the session's other ready stores when searching all documents."""
+    store_name = st.session_state["store_name"]
+    if not st.session_state.get("search_all_stores"):
+        return [store_name]
+    owner = GeminiService.api_key_fingerprint(st.session_state["api_key"])
+    records = get_store_registry().ready_for_session(st.session_state["session_id"], owner)
+    return [store_name] + [record.store_name for record in records if record.store_name != store_name]
+
+
+def page_locator() -> PageLocator:
+    """Resolve sources to pages using the local indexes of the documents being searched."""
+    document_hashes = [st.session_state.get("document_hash")]
+    if st.session_state.get("store_name") and st.session_state.get("search_all_stores"):
+        registry = get_store_registry()
+        document_hashes += [record.document_hash for name in query_store_names() if (record := registry.get(name))]
+    return get_page_index_store().locator(document_hashes)
+
+
+def document_brief() -> DocumentBrief | None:
+    """The active documents' brief for the session's model, requested in the background if missing."""
+    document_hash = st.session_state.get("document_hash")
+    store_name = st.session_state.get("store_name")
+    if not Config.DOCUMENT_BRIEF_ENABLED or not document_hash or not store_name:
+        return None
+    model = st.session_state["model"]
+    owner = GeminiService.api_key_fingerprint(st.session_state["api_key"])
+    brief = get_brief_store().get(owner, document_hash, model)
+    # Once per session: a brief that failed is not retried on every rerun.
+    if brief is None and (document_hash, model) not in st.session_state["briefs_requested"]:
+        st.session_state["briefs_requested"].add((document_hash, model))
+        get_ingestion_queue().prepare_brief(
+            st.session_state["client"], st.session_state["session_id"], owner, document_hash, store_name, model
+        )
+    return brief
+
+
+def prepared_answer(prompt: str, store_names: list[str], metadata_filter: str | None) -> PreparedAnswer | None:
+    """The brief's answer to ``prompt`` when the question covers exactly the brief's documents.
+
+    Prepared questions are self-contained, so unlike cached answers they are
+    served at any point in the conversation.
+    """
+    if len(store_names) > 1 or metadata_filter:
+        return None
+    brief = document_brief()
+    return brief.answer_for(prompt) if brief else None
+
+
+def build_answer_cache_key(
+    prompt: str,
+    conversation: list,
+    store_names: list[str],
+    metadata_filter: str | None = None,
+) -> str | None:
+    document_hash = st.session_state.get("document_hash")
+    if not Config.ANSWER_CACHE_ENABLED or not document_hash:
+        return None
+    if len(store_names) > 1:
+        registry = get_store_registry()
+        hashes = [record.document_hash for name in store_names if (record := registry.get(name))]
+        document_hash = PDFService.combine_hashes(set(hashes) | {document_hash})
+    history = conversation[:-1] if Config.ANSWER_CACHE_INCLUDE_HISTORY else None
+    return AnswerCache.make_key(document_hash, st.session_state["model"], prompt, history, metadata_filter)
+
+
+def get_context_cache() -> ContextCache | None:
+    if not Config.CONTEXT_CACHE_ENABLED:
+        return None
+    if st.session_state.get("context_cache") is None:
+        st.session_state["context_cache"] = ContextCache()
+    return st.session_state["context_cache"]
+
+
+def build_conversation_window() -> ConversationWindow:
+    window = st.session_state.get("conversation_window")
+    if window is None:
+        window = ConversationWindow()
+        st.session_state["conversation_window"] = window
+    if Config.HISTORY_SUMMARY_ENABLED:
+        client = st.session_state["client"]
+        model = st.session_state["model"]
+        window.summarizer = lambda summary, turns: GeminiService.summarize_conversation(
+            client, model, summary, turns
+        )
+    return window
 
 
 def ensure_api_key(lang: str) -> bool:
@@ -159,18 +496,28 @@ def ensure_api_key(lang: str) -> bool:
         st.warning(get_text("api_key_required", lang))
         return False
     try:
-        st.session_state["client"] = GeminiService.ensure_client(
-            api_key,
-            st.session_state.get("client"),
-            st.session_state.get("client_api_key"),
-        )
-        st.session_state["client_api_key"] = api_key
+        ensure_session_client(api_key)
     except Exception:
         st.error(get_text("error_api_key", lang))
         return False
     return True
 
 
+def ensure_session_client(api_key: str) -> genai.Client:
+    """Lease this session's client from the process-wide pool."""
+    pool = get_client_pool()
+    previous_key = st.session_state.get("client_api_key")
+    if previous_key == api_key:
+        client = pool.touch(api_key)
+    else:
+        if previous_key:
+            pool.release(previous_key)
+        client = pool.acquire(api_key)
+    st.session_state["client"] = client
+    st.session_state["client_api_key"] = api_key
+    return client
+
+
 def safe_cleanup_remote_store(client, store_name: str, lang: str | None, bubble_up: bool = True) -> None:
     try:
         GeminiService.cleanup_store(client, store_name)
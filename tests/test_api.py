@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+
+pytest.importorskip("fastapi", reason="needs the api extra")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.api.server import ApiServices, create_app  # noqa: E402
+from app.services.client_pool import ClientPool  # noqa: E402
+from app.services.gemini_service import GeminiService  # noqa: E402
+from app.services.ingestion import IngestionQueue  # noqa: E402
+from app.services.scheduler import _current_tenant  # noqa: E402
+from app.services.store_cache import StoreCache  # noqa: E402
+from app.services.store_registry import StoreRegistry  # noqa: E402
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency  # noqa: E402
+
+HEADERS = {"X-Gemini-Api-Key": "test-key"}
+PDF = b"%PDF-1.4\n% test document\n%%EOF\n"
+
+
+@pytest.fixture
+def backend() -> FakeGeminiClient:
+    instant = Latency(0)
+    return FakeGeminiClient(
+        FakeBackendConfig(
+            create_store=instant,
+            upload=instant,
+            operations_get=instant,
+            indexing=instant,
+            delete_store=instant,
+            first_token=instant,
+            generate=instant,
+            retrieval_per_store=0,
+        )
+    )
+
+
+@pytest.fixture
+def api(tmp_path, backend: FakeGeminiClient) -> TestClient:
+    registry = StoreRegistry(str(tmp_path / "stores.db"))
+    store_cache = StoreCache(str(tmp_path / "cache.db"), registry=registry)
+    services = ApiServices(
+        ClientPool(factory=lambda _key, _http: backend),
+        store_cache,
+        IngestionQueue(store_cache, registry=registry),
+        registry,
+    )
+    return TestClient(create_app(services))
+
+
+def upload(api: TestClient, tags: tuple[str, ...] = ()) -> dict:
+    response = api.post(
+        "/stores", headers=HEADERS, files=[("files", ("report.pdf", PDF, "application/pdf"))], data={"tags": list(tags)}
+    )
+    assert response.status_code == 202
+    return response.json()
+
+
+def wait_for_store(api: TestClient, job_id: str) -> str:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = api.get(f"/jobs/{job_id}", headers=HEADERS).json()
+        if job["status"] in ("done", "failed"):
+            assert job["status"] == "done", job["error"]
+            return job["store_name"]
+        time.sleep(0.05)
+    raise AssertionError("ingestion did not finish")
+
+
+def events(body: str) -> list[tuple[str, dict]]:
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((lines["event"], json.loads(lines["data"])))
+    return parsed
+
+
+def test_upload_is_indexed_and_then_reused(api: TestClient, backend: FakeGeminiClient) -> None:
+    first = upload(api)
+    store_name = wait_for_store(api, first["job_id"])
+
+    assert store_name in backend.live_stores
+    second = upload(api)
+    assert second == {"store_name": store_name, "document_hash": first["document_hash"], "reused": True}
+
+
+
+def test_upload_calls_queue_as_the_key_owner(api: TestClient, backend: FakeGeminiClient) -> None:
+    store_name = wait_for_store(api, upload(api)["job_id"])
+    tenants = []
+    get_store = backend.file_search_stores.get
+
+    def record_tenant(*args, **kwargs):
+        tenants.append(_current_tenant.get().id)
+        return get_store(*args, **kwargs)
+
+    backend.file_search_stores.get = record_tenant
+    assert upload(api)["store_name"] == store_name  # the cache hit checks the store still exists
+
+    assert tenants == [GeminiService.api_key_fingerprint(HEADERS["X-Gemini-Api-Key"])]
+
+def test_jobs_are_private_to_their_key(api: TestClient) -> None:
+    job_id = upload(api)["job_id"]
+
+    assert api.get(f"/jobs/{job_id}", headers={"X-Gemini-Api-Key": "other-key"}).status_code == 404
+    assert api.get("/jobs/unknown", headers=HEADERS).status_code == 404
+
+
+def test_query_answers_from_the_store(api: TestClient) -> None:
+    store_name = wait_for_store(api, upload(api)["job_id"])
+
+    response = api.post("/query", headers=HEADERS, json={"store_name": store_name, "question": "What is in it?"})
+
+    assert response.status_code == 200
+    assert response.json()["answer"]
+    assert response.json()["sources"]["chunks"]
+    assert api.post("/query", headers=HEADERS, json={"question": "no store"}).status_code == 422
+
+
+def test_query_stream_sends_deltas_then_done(api: TestClient) -> None:
+    store_name = wait_for_store(api, upload(api)["job_id"])
+
+    response = api.post("/query/stream", headers=HEADERS, json={"store_name": store_name, "question": "Summary?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    parsed = events(response.text)
+    kinds = [kind for kind, _ in parsed]
+    assert kinds[-1] == "done" and set(kinds[:-1]) == {"delta"}
+    assert "".join(payload["text"] for _, payload in parsed[:-1]) == parsed[-1][1]["answer"]
+
+
+def test_delete_removes_the_store_and_its_cache_entry(api: TestClient, backend: FakeGeminiClient) -> None:
+    first = upload(api)
+    store_name = wait_for_store(api, first["job_id"])
+
+    assert api.delete(f"/stores/{store_name}", headers=HEADERS).status_code == 204
+    assert store_name not in backend.live_stores
+    assert upload(api)["reused"] is False
+
+
+def test_metrics_are_served_in_prometheus_format(api: TestClient) -> None:
+    wait_for_store(api, upload(api)["job_id"])
+
+    response = api.get("/metrics")
+
+    assert response.status_code == 200
+    assert "# TYPE app_cache_requests_total counter" in response.text
+    assert 'app_cache_requests_total{cache="store",result="miss"}' in response.text
+
+
+def test_missing_api_key_is_rejected(api: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    assert api.post("/query", json={"store_name": "s", "question": "q"}).status_code == 401
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import contextvars
+import json
+
+import pytest
+
+from app.batch import cli
+from app.services.gemini_service import GeminiService
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+def test_resume_keeps_one_record_per_question(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    instant = Latency(0)
+    client = FakeGeminiClient(FakeBackendConfig(create_store=instant, generate=instant, retrieval_per_store=0))
+    store = client.file_search_stores.create()
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(GeminiService, "create_client", staticmethod(lambda *_args, **_kwargs: client))
+
+    questions = tmp_path / "qa.jsonl"
+    questions.write_text("".join(json.dumps({"id": f"q{n}", "question": f"Question {n}?"}) + "\n" for n in (1, 2, 3)))
+    output = tmp_path / "answers.jsonl"
+    output.write_text(
+        json.dumps({"id": "q1", "answer": "kept"}) + "\n"
+        + json.dumps({"id": "q2", "error": "503 UNAVAILABLE"}) + "\n"
+        + '{"id": "q3", "answ'  # cut short by the interruption
+    )
+
+    argv = ["--store", store.name, "--questions", str(questions), "--output", str(output)]
+    # main() binds its context to the batch tenant; keep that out of other tests.
+    context = contextvars.copy_context()
+    assert context.run(cli.main, argv) == 0
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(record["id"] for record in records) == ["q1", "q2", "q3"]
+    assert not any("error" in record for record in records)
+    assert records[0] == {"id": "q1", "answer": "kept"}
+    assert context.run(cli.main, argv) == 0
+    assert len(output.read_text().splitlines()) == 3
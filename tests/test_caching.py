@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import re
+
+from app.core.telemetry import telemetry
+from app.services.answer_cache import AnswerCache
+from app.utils.sources import SourceSet
+
+
+def metric(name: str, **labels: str) -> float:
+    wanted = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    match = re.search(rf"^{name}\{{{re.escape(wanted)}\}} (\S+)$", telemetry.render_prometheus(), re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_cache_stats_are_exported_as_prometheus_counters(tmp_path) -> None:
+    clock = [0.0]
+    cache = AnswerCache(str(tmp_path / "answers.db"), ttl_seconds=10, clock=lambda: clock[0])
+    before = {
+        result: metric("app_cache_requests_total", cache="answer", result=result) for result in ("hit", "miss")
+    }
+    evictions = metric("app_cache_evictions_total", cache="answer")
+
+    cache.get("key")
+    cache.put("key", "answer", SourceSet())
+    cache.get("key")
+    clock[0] = 20
+    cache.get("key")
+
+    assert metric("app_cache_requests_total", cache="answer", result="hit") == before["hit"] + 1
+    assert metric("app_cache_requests_total", cache="answer", result="miss") == before["miss"] + 2
+    assert metric("app_cache_evictions_total", cache="answer") == evictions + 1
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 2, 1)
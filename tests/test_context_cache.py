@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from google.genai import types
+
+from app.services.context_cache import ContextCache
+from app.utils.conversation import ConversationWindow, estimate_tokens
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+BUDGET = 8000
+MIN_TOKENS = 4096
+SCOPE = ("model", ("fileSearchStores/a",), None)
+
+
+def chat(turns: int) -> tuple[FakeGeminiClient, int, int]:
+    """Run ``turns`` turns the way ``answer_prompt`` does; return the client, cache hits and largest request."""
+    instant = Latency(0)
+    client = FakeGeminiClient(FakeBackendConfig(create_store=instant, operations_get=instant, delete_store=instant))
+    window = ConversationWindow(token_budget=BUDGET)
+    cache = ContextCache(min_tokens=MIN_TOKENS)
+    history: list[dict] = []
+    hits = largest = 0
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"question {turn} " + "q" * 800})
+        conversation = window.build(history, pin=cache.holds(SCOPE))
+        hits += cache.prefix_for(client, conversation, SCOPE) is not None
+        largest = max(largest, sum(estimate_tokens(content.parts[0].text) for content in conversation))
+        answer = f"answer {turn} " + "a" * 3200
+        history.append({"role": "assistant", "content": answer})
+        answered = conversation + [types.Content(role="model", parts=[types.Part(text=answer)])]
+        cache.update(client, answered, SCOPE, "model", ["fileSearchStores/a"], rebase=lambda: window.build(history))
+    return client, hits, largest
+
+
+def test_cached_prefix_survives_the_window_sliding() -> None:
+    client, hits, largest = chat(30)
+
+    # Unpinned, the window slides the cached prefix away on most turns past the budget.
+    assert hits >= 24
+    assert client.stats.calls["caches.create"] <= 6
+    # Pinned windows may run over the budget only by the uncached tail that triggers a new entry.
+    assert largest <= BUDGET + MIN_TOKENS
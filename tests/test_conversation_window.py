@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+from google.genai import types
+
+from app.core.exceptions import GeminiServiceError
+from app.utils.conversation import ConversationWindow, build_conversation_contents, estimate_tokens
+
+
+def message(role: str, tokens: int) -> dict:
+    return {"role": role, "content": f"{role[0]}{tokens:03d}" * tokens}  # 4 characters per token
+
+
+def conversation(sizes: list[int]) -> list[dict]:
+    return [message("user" if index % 2 == 0 else "assistant", size) for index, size in enumerate(sizes)]
+
+
+def text(content: types.Content) -> str:
+    return "".join(part.text for part in content.parts)
+
+
+def tokens(window: list[types.Content]) -> int:
+    return sum(estimate_tokens(text(content)) for content in window)
+
+
+def test_newest_turn_is_sent_even_when_it_exceeds_the_budget() -> None:
+    history = conversation([10, 10, 500])
+
+    assert [text(content) for content in build_conversation_contents(history, 100)] == [history[-1]["content"]]
+    assert [text(content) for content in ConversationWindow(100).build(history)] == [history[-1]["content"]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_window_is_the_newest_suffix_that_fits_the_budget(seed: int) -> None:
+    rng = random.Random(seed)
+    history = conversation([rng.randint(1, 60) for _ in range(rng.randint(1, 30))])
+    budget = rng.randint(20, 300)
+
+    window = build_conversation_contents(history, budget)
+
+    assert [text(content) for content in window] == [m["content"] for m in history[len(history) - len(window) :]]
+    assert tokens(window) <= budget or len(window) == 1
+    assert window[0].role == "user" or len(window) == 1
+    assert [text(content) for content in ConversationWindow(budget).build(history)] == [text(c) for c in window]
+
+
+def test_pinned_window_keeps_its_turns_until_unpinned() -> None:
+    history = conversation([25, 25, 25, 25])
+    window = ConversationWindow(100)
+    assert len(window.build(history)) == 4
+
+    history += conversation([25, 25])
+    assert len(window.build(history, pin=True)) == 6  # over budget, but the cached prefix stays the prefix
+    assert len(window.build(history + conversation([25, 25]), pin=True)) == 8
+
+    unpinned = window.build(history + conversation([25, 25]))
+    assert len(unpinned) == 4
+    assert tokens(unpinned) <= 100
+
+
+def test_summary_counts_against_the_budget_and_covers_every_dropped_turn() -> None:
+    summarized: list[str] = []
+
+    def summarize(previous: str, turns: list[types.Content]) -> str:
+        summarized.extend(text(content) for content in turns)
+        return "x" * 4 * min(40, 8 * len(summarized))  # grows with what it covers
+
+    window = ConversationWindow(120, summarizer=summarize)
+    history: list[dict] = []
+    for size in [20, 30, 20, 30, 20, 30, 20, 30, 20, 30]:
+        history.append(message("user" if len(history) % 2 == 0 else "assistant", size))
+        built = window.build(history)
+
+        assert tokens(built) <= 120 or len(built) <= 2
+        sent = [text(content) for content in built[1:]] if window.summary else [text(c) for c in built]
+        assert summarized + sent == [m["content"] for m in history]  # each turn exactly once
+        assert text(built[-1]) == history[-1]["content"]
+
+
+def test_failed_summary_keeps_the_previous_one_and_is_retried() -> None:
+    calls: list[int] = []
+
+    def summarize(previous: str, turns: list[types.Content]) -> str:
+        calls.append(len(turns))
+        if len(calls) == 2:
+            raise GeminiServiceError("unavailable")
+        return f"summary {len(calls)}"
+
+    window = ConversationWindow(60, summarizer=summarize)
+    history = conversation([30, 30, 30])
+    window.build(history)
+    assert window.summary == "summary 1"
+
+    history += conversation([30, 30])
+    window.build(history)
+    assert window.summary == "summary 1"
+    window.build(history)
+    assert window.summary == "summary 3"
+    assert calls[1] == calls[2]  # the retry covers the same turns
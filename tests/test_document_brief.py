@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+
+from app.core.config import Config
+from app.services import ingestion
+from app.services.document_brief import BriefStore, DocumentBrief, parse_plan
+from app.services.ingestion import IngestionJob, IngestionQueue, JobStatus
+from app.services.store_cache import StoreCache
+from app.services.store_registry import StoreRegistry
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+def test_forgetting_a_store_keeps_other_owners_briefs_of_the_same_document(tmp_path) -> None:
+    briefs = BriefStore(str(tmp_path / "briefs.db"))
+    registry = StoreRegistry(str(tmp_path / "stores.db"), on_forget=briefs.forget_store)
+    for owner in ("alice", "bob"):
+        registry.register(f"fileSearchStores/{owner}", owner, "same-pdf", ["report.pdf"])
+        briefs.put(owner, "same-pdf", "model", DocumentBrief(f"fileSearchStores/{owner}", [f"{owner}'s outline"]))
+
+    registry.forget("fileSearchStores/alice")
+
+    assert briefs.get("alice", "same-pdf", "model") is None
+    assert briefs.get("bob", "same-pdf", "model").outline == ["bob's outline"]
+
+
+def test_plan_keeps_one_question_per_normalized_prompt() -> None:
+    outline, questions = parse_plan(
+        '{"outline": ["Intro", "intro"], '
+        '"questions": ["What is the budget?", "what is  the budget", "What is the BUDGET!", "Who wrote it?"]}'
+    )
+
+    assert outline == ["Intro", "intro"]
+    assert questions == ["What is the budget?", "Who wrote it?"]
+
+
+def test_uploads_do_not_wait_behind_briefs(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(Config, "DOCUMENT_BRIEF_ENABLED", True)
+    release = threading.Event()
+
+    def slow_brief(_client, store_name: str, _model: str) -> DocumentBrief:
+        release.wait(30)
+        return DocumentBrief(store_name, ["outline"])
+
+    monkeypatch.setattr(ingestion, "prepare_brief", slow_brief)
+    instant = Latency(0)
+    client = FakeGeminiClient(
+        FakeBackendConfig(create_store=instant, upload=instant, operations_get=instant, indexing=instant)
+    )
+    registry = StoreRegistry(str(tmp_path / "stores.db"))
+    briefs = BriefStore(str(tmp_path / "briefs.db"))
+    store_cache = StoreCache(str(tmp_path / "cache.db"), registry=registry)
+    queue = IngestionQueue(store_cache, max_concurrent_jobs=1, registry=registry, briefs=briefs)
+
+    def ingest(document: str) -> IngestionJob:
+        upload = (io.BytesIO(b"%PDF-1.4\n%%EOF\n"), f"{document}.pdf", None)
+        job_id = queue.submit(client, "owner", document, [upload], model="model")
+        deadline = time.monotonic() + 5
+        while not (job := queue.get(job_id)).status.finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return job
+
+    try:
+        assert ingest("first").status is JobStatus.DONE  # its brief is now being prepared
+        assert ingest("second").status is JobStatus.DONE
+        assert not briefs.has("owner", "first", "model")
+    finally:
+        release.set()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from google.genai import types
+
+from app.services.gemini_service import GeminiService
+from app.utils.conversation import parse_response
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+@pytest.mark.parametrize(
+    "filenames, tags, expected",
+    [
+        ((), (), None),
+        (["a.pdf"], [], 'filename = "a.pdf"'),
+        (["a.pdf", "b.pdf"], [], 'filename = "a.pdf" OR filename = "b.pdf"'),
+        ([], ["finance"], 'tags:"finance"'),
+        (["a.pdf"], ["finance", "2024"], '(filename = "a.pdf") AND (tags:"finance" OR tags:"2024")'),
+    ],
+)
+def test_filter_selects_any_filename_and_any_tag(filenames, tags, expected) -> None:
+    assert GeminiService.build_metadata_filter(filenames, tags) == expected
+
+
+def test_filter_values_are_quoted_and_escaped() -> None:
+    metadata_filter = GeminiService.build_metadata_filter(['board "final" \\ v2.pdf', "résumé.pdf"], ["a OR b"])
+
+    assert metadata_filter == (
+        '(filename = "board \\"final\\" \\\\ v2.pdf" OR filename = "résumé.pdf") AND (tags:"a OR b")'
+    )
+
+
+def test_filter_narrows_the_grounding_chunks() -> None:
+    instant = Latency(0)
+    client = FakeGeminiClient(FakeBackendConfig(create_store=instant, upload=instant, generate=instant))
+    store = client.file_search_stores.create().name
+    for filename, tags in (("q1.pdf", ["finance"]), ("q2.pdf", ["finance", "draft"]), ("notes.pdf", ["draft"])):
+        metadata = GeminiService.build_document_metadata(filename, filename, tags)
+        GeminiService.start_upload(client, store, io.BytesIO(b"%PDF-1.4"), filename, metadata)
+    question = [types.Content(role="user", parts=[types.Part(text="Totals?")])]
+
+    def titles(metadata_filter) -> set[str]:
+        response = GeminiService.query_file_search(client, question, store, "model", metadata_filter)
+        return {chunk.title for chunk in parse_response(response)[1].chunks}
+
+    assert titles(None) == {"q1.pdf", "q2.pdf", "notes.pdf"}
+    assert titles(GeminiService.build_metadata_filter(tags=["finance"])) == {"q1.pdf", "q2.pdf"}
+    assert titles(GeminiService.build_metadata_filter(["q2.pdf", "notes.pdf"], ["finance"])) == {"q2.pdf"}
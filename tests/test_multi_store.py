@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from google.genai import errors, types
+
+from app.core.exceptions import GeminiServiceError
+from app.services.gemini_service import GeminiService
+from app.utils.conversation import merge_answers
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+QUESTION = [types.Content(role="user", parts=[types.Part(text="What changed?")])]
+
+
+@pytest.fixture
+def client() -> FakeGeminiClient:
+    instant = Latency(0)
+    return FakeGeminiClient(
+        FakeBackendConfig(create_store=instant, upload=instant, generate=instant, retrieval_per_store=0)
+    )
+
+
+def create_stores(client: FakeGeminiClient, count: int) -> list[str]:
+    names = []
+    for number in range(count):
+        name = client.file_search_stores.create().name
+        client.file_search_stores.upload_to_file_search_store(
+            file_search_store_name=name, file=b"", config={"display_name": f"doc-{number}.pdf"}
+        )
+        names.append(name)
+    return names
+
+
+def failing_for(client: FakeGeminiClient, store_name: str) -> None:
+    """Reject every request that searches ``store_name``, sync or async (a 400 is not retried)."""
+    generate, agenerate = client.models.generate_content, client.aio.models.generate_content
+
+    def check(config) -> None:
+        if store_name in config.tools[0].file_search.file_search_store_names:
+            raise errors.ClientError(400, {"error": {"code": 400, "message": "bad store", "status": "INVALID"}})
+
+    def generate_content(*, model, contents, config=None):
+        check(config)
+        return generate(model=model, contents=contents, config=config)
+
+    async def agenerate_content(*, model, contents, config=None):
+        check(config)
+        return await agenerate(model=model, contents=contents, config=config)
+
+    client.models.generate_content = generate_content
+    client.aio.models.generate_content = agenerate_content
+
+
+def grounded(text: str, passages: list[str], confidence: float) -> types.GenerateContentResponse:
+    chunks = [
+        types.GroundingChunk(retrieved_context=types.GroundingChunkRetrievedContext(title="doc.pdf", text=passage))
+        for passage in passages
+    ]
+    supports = [
+        types.GroundingSupport(
+            segment=types.Segment(text=text), grounding_chunk_indices=[index], confidence_scores=[confidence]
+        )
+        for index in range(len(passages))
+    ]
+    return types.GenerateContentResponse(
+        candidates=[
+            types.Candidate(
+                content=types.Content(role="model", parts=[types.Part(text=text)]),
+                grounding_metadata=types.GroundingMetadata(grounding_chunks=chunks, grounding_supports=supports),
+            )
+        ]
+    )
+
+
+def test_partition_stores_dedupes_and_splits_in_order() -> None:
+    assert GeminiService.partition_stores(["a", "b", "a", "c", "d", "e"], per_request=2) == [
+        ["a", "b"],
+        ["c", "d"],
+        ["e"],
+    ]
+    assert GeminiService.partition_stores(["a", "b"], per_request=0) == [["a"], ["b"]]
+    assert GeminiService.partition_stores([], per_request=5) == []
+
+
+def test_query_stores_sends_one_request_per_group(client: FakeGeminiClient) -> None:
+    stores = create_stores(client, 5)
+
+    responses = GeminiService.query_stores(client, QUESTION, stores, "model", per_request=2)
+
+    assert client.stats.calls["models.generate_content"] == 3
+    titles = [
+        {chunk.retrieved_context.title for chunk in response.candidates[0].grounding_metadata.grounding_chunks}
+        for response in responses
+    ]
+    assert titles == [{"doc-0.pdf", "doc-1.pdf"}, {"doc-2.pdf", "doc-3.pdf"}, {"doc-4.pdf"}]
+
+
+def test_one_failing_group_leaves_the_others_answering(client: FakeGeminiClient) -> None:
+    stores = create_stores(client, 3)
+    failing_for(client, stores[1])
+
+    responses = GeminiService.query_stores(client, QUESTION, stores, "model", per_request=1)
+    answer, sources = merge_answers(responses)
+
+    assert len(responses) == 2
+    assert answer
+    assert {chunk.title for chunk in sources.chunks} == {"doc-0.pdf", "doc-2.pdf"}
+    async_responses = asyncio.run(GeminiService.aquery_stores(client, QUESTION, stores, "model", per_request=1))
+    assert len(async_responses) == 2
+
+
+def test_query_stores_raises_when_every_group_fails(client: FakeGeminiClient) -> None:
+    stores = create_stores(client, 2)
+    failing_for(client, stores[0])
+    failing_for(client, stores[1])
+
+    with pytest.raises(GeminiServiceError):
+        GeminiService.query_stores(client, QUESTION, stores, "model", per_request=1)
+
+
+def test_merge_answers_ranks_by_confidence_and_keeps_each_passage_once() -> None:
+    weak = grounded("Costs rose.", ["passage a", "shared passage"], 0.3)
+    strong = grounded("Revenue grew.", ["shared passage", "passage c"], 0.9)
+    ungrounded = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text="Not found.")]))]
+    )
+
+    answer, sources = merge_answers([weak, None, ungrounded, strong])
+
+    assert answer == "Revenue grew.\n\nCosts rose."
+    assert [chunk.text for chunk in sources.chunks] == ["shared passage", "passage c", "passage a"]
+    # Supports point at the merged chunks: the weak answer's shared passage is index 0, not 1.
+    assert [(support.text, support.chunk_indices) for support in sources.supports] == [
+        ("Revenue grew.", (0,)),
+        ("Revenue grew.", (1,)),
+        ("Costs rose.", (2,)),
+        ("Costs rose.", (0,)),
+    ]
+
+
+def test_merge_answers_keeps_ungrounded_answers_when_nothing_was_grounded() -> None:
+    first = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text="Maybe A.")]))]
+    )
+    second = types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text="Maybe B.")]))]
+    )
+
+    answer, sources = merge_answers([first, second])
+
+    assert answer == "Maybe A.\n\nMaybe B."
+    assert not sources.chunks
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import os
+
+from app.services.page_index import DocumentPages, PageIndexStore
+
+
+def test_index_opens_when_its_access_time_cannot_be_updated(tmp_path, monkeypatch) -> None:
+    store = PageIndexStore(str(tmp_path))
+    pages = ["Quarterly revenue grew by twelve percent.", "Operating costs fell in the second half."]
+    store.write("hash", [DocumentPages("report.pdf", pages)])
+
+    def read_only(*_args, **_kwargs):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(os, "utime", read_only)
+    index = store.get("hash")
+
+    assert index is not None
+    assert index.locate("report.pdf", "Operating costs fell in the second half").pages == (2,)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services import pdf_preprocessor
+from app.services.pdf_service import PDFService
+
+pytestmark = pytest.mark.skipif(not pdf_preprocessor.AVAILABLE, reason="needs the pdf extra")
+
+
+def text_pdf(pages: list[str]) -> bytes:
+    """A minimal PDF with one line of Helvetica text per page."""
+    count = len(pages)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 40 800 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), count)
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    return out + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+
+def test_in_memory_uploads_are_parsed_without_the_process_pool() -> None:
+    def no_pool() -> ThreadPoolExecutor:
+        raise AssertionError("in-memory uploads must not be sent to the pool")
+
+    upload = io.BytesIO(text_pdf(["first page", "second page"]))
+    pages = PDFService.extract_document_pages([(upload, "a.pdf", None)], [], no_pool)
+
+    assert [page.strip() for page in pages[0].page_texts] == ["first page", "second page"]
+
+
+def test_files_on_disk_are_parsed_in_the_pool(tmp_path) -> None:
+    path = tmp_path / "b.pdf"
+    path.write_bytes(text_pdf(["on disk"]))
+    calls = []
+
+    def pool() -> ThreadPoolExecutor:
+        calls.append(1)
+        return ThreadPoolExecutor(1)
+
+    pages = PDFService.extract_document_pages([(str(path), "b.pdf", None)], [], pool)
+
+    assert [page.strip() for page in pages[0].page_texts] == ["on disk"]
+    assert calls == [1]
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from app.core.exceptions import CircuitOpenError, SchedulerBusyError
+from app.services.request_policy import CircuitBreaker, RequestPolicy, RetryPolicy
+from app.services.scheduler import FairScheduler
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def api_error(code: int) -> errors.APIError:
+    return errors.APIError(code, {"error": {"code": code, "message": "test", "status": "TEST"}})
+
+
+def make_policy(clock: Clock) -> tuple[RequestPolicy, CircuitBreaker]:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    policy = RequestPolicy(
+        retry=RetryPolicy(attempts=1),
+        rate_limits={},
+        fallbacks={},
+        hedge_delay=0,
+        breaker_factory=lambda: breaker,
+        sleep=lambda _: None,
+        scheduler=None,
+    )
+    return policy, breaker
+
+
+def fail(exc: Exception):
+    def call(_model: str):
+        raise exc
+
+    return call
+
+
+def open_breaker(policy: RequestPolicy, clock: Clock) -> None:
+    with pytest.raises(errors.APIError):
+        policy.call_model("model", fail(api_error(503)))
+    with pytest.raises(CircuitOpenError):
+        policy.call_model("model", lambda _: "unreachable")
+    clock.now += 11
+
+
+@pytest.mark.parametrize(
+    "error, state",
+    [
+        (api_error(400), "closed"),  # the model answered: the request was bad, the model is up
+        (SchedulerBusyError("busy"), "open"),  # never reached the model: wait another window
+        (ValueError("bug"), "open"),
+    ],
+)
+def test_probe_that_raises_a_non_retryable_error_is_settled(error: Exception, state: str) -> None:
+    clock = Clock()
+    policy, breaker = make_policy(clock)
+    open_breaker(policy, clock)
+
+    with pytest.raises(type(error)):
+        policy.call_model("model", fail(error))
+
+    assert breaker.state == state
+    clock.now += 11
+    assert policy.call_model("model", lambda _: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_probe_success_and_failure_are_recorded() -> None:
+    clock = Clock()
+    policy, breaker = make_policy(clock)
+    open_breaker(policy, clock)
+
+    with pytest.raises(errors.APIError):
+        policy.call_model("model", fail(api_error(503)))
+    assert breaker.state == "open"
+
+    clock.now += 11
+    assert policy.call_model("model", lambda _: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_busy_scheduler_does_not_open_a_closed_breaker() -> None:
+    policy, breaker = make_policy(Clock())
+    for _ in range(3):
+        with pytest.raises(SchedulerBusyError):
+            policy.call_model("model", fail(SchedulerBusyError("busy")))
+    assert breaker.state == "closed"
+
+
+def test_async_probe_is_cleared_after_a_non_retryable_error() -> None:
+    clock = Clock()
+    policy, breaker = make_policy(clock)
+    open_breaker(policy, clock)
+
+    async def busy(_model: str) -> str:
+        raise SchedulerBusyError("busy")
+
+    async def ok(_model: str) -> str:
+        return "ok"
+
+    with pytest.raises(SchedulerBusyError):
+        asyncio.run(policy.acall_model("model", busy))
+    clock.now += 11
+    assert asyncio.run(policy.acall_model("model", ok)) == "ok"
+    assert breaker.state == "closed"
+
+
+def make_streaming_policy() -> tuple[RequestPolicy, FairScheduler]:
+    scheduler = FairScheduler(max_concurrent=2)
+    policy = RequestPolicy(
+        retry=RetryPolicy(attempts=1), rate_limits={}, fallbacks={}, hedge_delay=0, scheduler=scheduler
+    )
+    return policy, scheduler
+
+
+def test_stream_holds_its_scheduler_slot_until_exhausted() -> None:
+    policy, scheduler = make_streaming_policy()
+    stream = policy.stream_model("model", lambda _: iter(["a", "b", "c"]))
+
+    assert next(stream) == "a"
+    assert scheduler.in_flight == 1
+    assert next(stream) == "b"
+    assert scheduler.in_flight == 1
+    assert list(stream) == ["c"]
+    assert scheduler.in_flight == 0
+
+
+def test_stream_releases_its_slot_when_closed_or_failing() -> None:
+    policy, scheduler = make_streaming_policy()
+    stream = policy.stream_model("model", lambda _: iter(["a", "b"]))
+    next(stream)
+    stream.close()
+    assert scheduler.in_flight == 0
+
+    def broken(_model: str):
+        yield "a"
+        raise RuntimeError("connection reset")
+
+    stream = policy.stream_model("model", broken)
+    next(stream)
+    with pytest.raises(RuntimeError):
+        next(stream)
+    assert scheduler.in_flight == 0
+
+
+def test_async_stream_holds_its_scheduler_slot_until_exhausted() -> None:
+    policy, scheduler = make_streaming_policy()
+
+    async def chunks():
+        for chunk in ("a", "b"):
+            yield chunk
+
+    async def open_stream(_model: str):
+        return chunks()
+
+    async def consume() -> list[tuple[str, int]]:
+        seen = []
+        async for chunk in policy.astream_model("model", open_stream):
+            seen.append((chunk, scheduler.in_flight))
+        return seen
+
+    assert asyncio.run(consume()) == [("a", 1), ("b", 1)]
+    assert scheduler.in_flight == 0
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import uuid
+
+from streamlit.testing.v1 import AppTest
+
+
+def session_app(owner: str, store_name: str | None) -> None:
+    import streamlit as st
+
+    from app.core.state import ensure_session_id, init_session_state, restore_session_state, save_session_state
+
+    init_session_state()
+    ensure_session_id()
+    restore_session_state(owner)
+    if store_name:
+        st.session_state["store_name"] = store_name
+    save_session_state()
+
+
+def open_session(session_id: str, owner: str, store_name: str | None = None) -> AppTest:
+    app = AppTest.from_function(session_app, args=(owner, store_name))
+    app.query_params["session"] = session_id
+    return app.run()
+
+
+def test_session_is_restored_for_its_owner_only() -> None:
+    session_id = uuid.uuid4().hex
+    open_session(session_id, "owner-a", "fileSearchStores/a")
+
+    other = open_session(session_id, "owner-b")
+    assert other.session_state["store_name"] is None
+    assert other.session_state["session_id"] != session_id
+
+    same = open_session(session_id, "owner-a")
+    assert same.session_state["store_name"] == "fileSearchStores/a"
+    assert same.session_state["session_id"] == session_id
+
+
+def test_nothing_is_saved_before_an_owner_is_known() -> None:
+    session_id = uuid.uuid4().hex
+    open_session(session_id, "", "fileSearchStores/anonymous")
+
+    assert open_session(session_id, "owner-a").session_state["store_name"] is None
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import socket
+import threading
+from typing import BinaryIO, Iterator
+
+import pytest
+
+from app.core.exceptions import SessionStateError
+from app.services.session_store import RedisSessionStore, RespClient
+from benchmarks.fake_redis import FakeRedisServer
+
+
+class ScriptedServer:
+    """Answers the n-th connection with the n-th list of raw replies, one per command, then closes it."""
+
+    def __init__(self, *connections: list[bytes]) -> None:
+        self.commands: list[list[bytes]] = []
+        self.closed = threading.Semaphore(0)
+        self._listener = socket.create_server(("127.0.0.1", 0))
+        self._thread = threading.Thread(target=self._serve, args=(list(connections),), daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return "redis://127.0.0.1:%d" % self._listener.getsockname()[1]
+
+    def _serve(self, connections: list[list[bytes]]) -> None:
+        for replies in connections:
+            conn, _ = self._listener.accept()
+            with conn, conn.makefile("rb") as reader:
+                for reply in replies:
+                    self.commands.append(_read_command(reader))
+                    conn.sendall(reply)
+            self.closed.release()
+        self._listener.close()
+
+
+def _read_command(reader: BinaryIO) -> list[bytes]:
+    count = int(reader.readline()[1:-2])
+    args = []
+    for _ in range(count):
+        size = int(reader.readline()[1:-2])
+        args.append(reader.read(size + 2)[:-2])
+    return args
+
+
+@pytest.fixture
+def redis() -> Iterator[FakeRedisServer]:
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+def test_error_reply_raises_and_the_next_call_reconnects(redis: FakeRedisServer) -> None:
+    client = RespClient(redis.url)
+    with pytest.raises(SessionStateError, match="unknown command 'NOPE'"):
+        client.execute(("PING",), ("NOPE",))
+    assert client.execute(("PING",)) == [b"PONG"]
+
+
+def test_nil_and_nested_replies_are_decoded() -> None:
+    server = ScriptedServer([b"$-1\r\n", b"*-1\r\n", b"*3\r\n$1\r\na\r\n$-1\r\n*1\r\n:7\r\n", b"$0\r\n\r\n"])
+    client = RespClient(server.url)
+    assert client.execute(("GET", "k"), ("BLPOP", "k", 1), ("MIXED",), ("GET", "empty")) == [
+        None,
+        None,
+        [b"a", None, [7]],
+        b"",
+    ]
+
+
+def test_connection_closed_by_the_server_while_idle_is_replaced() -> None:
+    server = ScriptedServer([b"+PONG\r\n"], [b"+PONG\r\n"])
+    client = RespClient(server.url)
+    assert client.execute(("PING",)) == [b"PONG"]
+    assert server.closed.acquire(timeout=5)
+
+    assert client.execute(("PING",)) == [b"PONG"]
+    assert len(server.commands) == 2
+
+
+def test_connection_closed_mid_reply_fails_without_resending() -> None:
+    server = ScriptedServer([b"$5\r\nab"], [b":1\r\n"])
+    client = RespClient(server.url)
+    with pytest.raises(SessionStateError, match="closed mid-reply"):
+        client.execute(("GET", "k"))
+    assert server.commands == [[b"GET", b"k"]]
+
+    assert client.execute(("DEL", "k")) == [1]
+
+
+def test_password_and_database_are_sent_on_connect() -> None:
+    server = FakeRedisServer(password="s3cret").start()
+    try:
+        host, port = server.url.rsplit("@", 1)[1].split("/")[0].split(":")
+        assert RespClient(f"redis://:s3cret@{host}:{port}/2").execute(("PING",)) == [b"PONG"]
+        assert server.commands == 3  # AUTH, SELECT, PING
+
+        with pytest.raises(SessionStateError, match="WRONGPASS"):
+            RespClient(f"redis://:wrong@{host}:{port}").execute(("PING",))
+    finally:
+        server.stop()
+
+
+def test_unreachable_server_raises_session_state_error() -> None:
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        port = listener.getsockname()[1]
+    with pytest.raises(SessionStateError):
+        RespClient(f"redis://127.0.0.1:{port}", timeout=1).execute(("PING",))
+
+
+def test_redis_session_store_round_trip(redis: FakeRedisServer) -> None:
+    store = RedisSessionStore(redis.url)
+    store.save_fields("s1", {"store_name": "fileSearchStores/a", "filter_tags": ["x"]})
+    store.append_turn("s1", {"role": "user", "content": "hi"})
+    store.append_turn("s1", {"role": "assistant", "content": "hello " * 200})
+
+    snapshot = store.load("s1")
+    assert snapshot.fields == {"store_name": "fileSearchStores/a", "filter_tags": ["x"]}
+    assert [turn["content"] for turn in snapshot.history] == ["hi", "hello " * 200]
+
+    store.clear_history("s1")
+    assert store.load("s1").history == []
+    assert store.load("missing").fields == {}
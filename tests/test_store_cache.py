@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from google.genai import errors
+
+from app.services.store_cache import StoreCache
+from app.services.store_registry import StoreRegistry
+from benchmarks.fake_gemini import FakeBackendConfig, FakeGeminiClient, Latency
+
+
+def test_eviction_counts_queries_recorded_in_the_registry(tmp_path) -> None:
+    instant = Latency(0)
+    client = FakeGeminiClient(FakeBackendConfig(create_store=instant, operations_get=instant, delete_store=instant))
+    clock = [0.0]
+    registry = StoreRegistry(str(tmp_path / "stores.db"), clock=lambda: clock[0])
+    cache = StoreCache(
+        str(tmp_path / "cache.db"), ttl_seconds=100, max_entries=2, clock=lambda: clock[0], registry=registry
+    )
+    stores = {}
+    for document in ("a", "b"):
+        clock[0] += 1
+        stores[document] = client.file_search_stores.create().name
+        registry.register(stores[document], "owner", document, [f"{document}.pdf"])
+        cache.remember(client, "owner", document, stores[document])
+
+    clock[0] += 50
+    registry.touch(stores["a"])  # "a" is queried; "b" is not
+    clock[0] += 1
+    stores["c"] = client.file_search_stores.create().name
+    cache.remember(client, "owner", "c", stores["c"])
+
+    assert client.live_stores == [stores["a"], stores["c"]]
+    clock[0] += 60  # "a" was last queried 61s ago, uploaded 112s ago
+    assert cache.lookup(client, "owner", "a") == stores["a"]
+
+
+def test_store_that_failed_to_delete_stays_cached_and_registered(tmp_path) -> None:
+    instant = Latency(0)
+    client = FakeGeminiClient(FakeBackendConfig(create_store=instant, operations_get=instant, delete_store=instant))
+    clock = [0.0]
+    registry = StoreRegistry(str(tmp_path / "stores.db"), clock=lambda: clock[0])
+    cache = StoreCache(str(tmp_path / "cache.db"), ttl_seconds=10, clock=lambda: clock[0], registry=registry)
+    store = client.file_search_stores.create().name
+    registry.register(store, "owner", "a", ["a.pdf"])
+    cache.remember(client, "owner", "a", store)
+
+    delete = client.file_search_stores.delete
+
+    def denied(*_args, **_kwargs):  # not retried, unlike 429/5xx, and not proof the store is gone
+        raise errors.APIError(403, {"error": {"code": 403, "message": "test", "status": "PERMISSION_DENIED"}})
+
+    client.file_search_stores.delete = denied
+    clock[0] = 100
+    assert cache.lookup(client, "owner", "b") is None
+    assert registry.get(store) is not None
+    assert client.live_stores == [store]
+
+    client.file_search_stores.delete = delete
+    assert cache.lookup(client, "owner", "b") is None
+    assert registry.get(store) is None
+    assert client.live_stores == []
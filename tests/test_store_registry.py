@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+from google.genai import errors
+
+from app.core.config import Config
+from app.services.gemini_service import GeminiService
+from app.services.store_registry import StoreReaper, StoreRegistry
+from benchmarks.fake_gemini import FakeGeminiClient
+
+
+def api_error(code: int) -> errors.APIError:
+    return errors.APIError(code, {"error": {"code": code, "message": "test", "status": "TEST"}})
+
+
+def unreachable(client: FakeGeminiClient, code: int = 403) -> FakeGeminiClient:
+    """Make every store call on ``client`` fail with ``code``, as for a revoked or throttled key."""
+
+    def fail(*_args, **_kwargs):
+        raise api_error(code)
+
+    client.file_search_stores.get = fail
+    client.file_search_stores.delete = fail
+    return client
+
+
+def test_store_exists_only_reports_a_missing_store_on_404() -> None:
+    client = FakeGeminiClient()
+    store = client.file_search_stores.create()
+
+    assert GeminiService.store_exists(client, store.name) is True
+    assert GeminiService.store_exists(client, "fileSearchStores/gone") is False
+    assert GeminiService.store_exists(unreachable(client), store.name) is None
+
+
+@pytest.mark.parametrize("reachable, forgotten", [(True, True), (False, False)])
+def test_reaper_only_forgets_stores_it_deleted_or_found_gone(tmp_path, reachable: bool, forgotten: bool) -> None:
+    clock = [0.0]
+    registry = StoreRegistry(str(tmp_path / "stores.db"), clock=lambda: clock[0])
+    client = FakeGeminiClient()
+    store = client.file_search_stores.create()
+    registry.register(store.name, "owner", "hash", ["a.pdf"])
+    registry.mark_ready(store.name, 1)
+    clock[0] = 10**9
+    if not reachable:
+        unreachable(client)
+
+    assert StoreReaper(registry, lambda _owner: client).reap_once() == int(forgotten)
+    assert (registry.get(store.name) is None) is forgotten
+
+
+
+def test_stores_of_owners_without_a_client_do_not_block_the_batch(tmp_path) -> None:
+    clock = [0.0]
+    registry = StoreRegistry(str(tmp_path / "stores.db"), clock=lambda: clock[0])
+    client = FakeGeminiClient()
+    for number in range(Config.REAPER_BATCH_SIZE + 1):  # older than every other store, owner never returns
+        registry.register(f"fileSearchStores/away-{number}", "away", "hash", ["a.pdf"])
+    clock[0] = 1.0
+    store = client.file_search_stores.create()
+    registry.register(store.name, "active", "hash", ["b.pdf"])
+    clock[0] = 10**9
+
+    reaper = StoreReaper(registry, lambda owner: client if owner == "active" else None)
+    assert reaper.reap_once() == 1
+    assert registry.get(store.name) is None
+    assert reaper.reap_once() == 0
+    assert len(registry) == Config.REAPER_BATCH_SIZE + 1